@@ -0,0 +1,72 @@
+import time
+import socket
+import argparse
+
+from utils.Globals import PacketTypes
+from utils.networking.UDPHandler import UDPPacket
+from benchmarks.harness import TrackerProcess, SimClient, user_credentials
+
+# Run from the project root with: python3 -m benchmarks.flood_bench
+#
+# Floods each server engine with bursts of LAP requests from many authenticated
+# clients and counts how many replies come back per second.
+
+def flood(server_port: int, num_clients: int, burst: int, duration: float) -> tuple[float, int]:
+    clients: list[SimClient] = [
+        SimClient(server_port, *user_credentials(index), timeout=0.05) for index in range(num_clients)
+    ]
+    for client in clients:
+        client.authenticate()
+
+    requests: list[bytes] = [client.create_packet(PacketTypes.LAP, "") for client in clients]
+    sent: int = 0
+    received: int = 0
+
+    start: float = time.perf_counter()
+    deadline: float = start + duration
+    while time.perf_counter() < deadline:
+        for client, request in zip(clients, requests):
+            for _ in range(burst):
+                client.socket.sendto(request, client.server_address)
+            sent += burst
+
+        for client in clients:
+            # Keep heartbeats going so sessions don't expire mid-run
+            client.heartbeat()
+            try:
+                for _ in range(burst):
+                    client.socket.recv(UDPPacket.UDP_PACKET_SIZE)
+                    received += 1
+            except socket.timeout:
+                continue
+
+    elapsed: float = time.perf_counter() - start
+    for client in clients:
+        client.close()
+
+    return (received / elapsed, sent - received)
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, default=50)
+    parser.add_argument("--burst", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=5.0)
+    parser.add_argument("--rcvbuf", type=int, default=4 * 1024 * 1024)
+    args = parser.parse_args()
+
+    # Same socket buffers for both so only the I/O loop differs
+    buffers: list[str] = ["--rcvbuf", str(args.rcvbuf), "--sndbuf", str(args.rcvbuf)]
+    configurations: list[tuple[str, list[str]]] = [
+        ("blocking", ["--engine", "blocking", *buffers]),
+        ("batched", ["--engine", "batched", *buffers]),
+    ]
+
+    print(f"{'engine':>10} {'replies/s':>12} {'dropped':>9}")
+    for name, server_args in configurations:
+        with TrackerProcess(server_args, num_users=args.clients) as tracker:
+            throughput, dropped = flood(tracker.port, args.clients, args.burst, args.duration)
+
+        print(f"{name:>10} {throughput:>12.0f} {dropped:>9}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+import os
+import sys
+import time
+import signal
+import socket
+import tempfile
+import subprocess
+
+from utils.Globals import Env, PacketTypes
+from utils.networking.UDPHandler import UDPPacketHandling, UDPPacket
+
+# Shared pieces for the benchmarks that drive a real server.py over loopback
+
+SERVER_PATH: str = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "server.py")
+
+def find_free_port() -> int:
+    probe = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    probe.bind((Env.SERVER_IP, 0))
+    port: int = probe.getsockname()[1]
+    probe.close()
+
+    return port
+
+def user_credentials(index: int) -> tuple[str, str]:
+    return (f"user{index}", f"password{index}")
+
+class SimClient:
+    def __init__(self, server_port: int, username: str, password: str, timeout: float = 2.0) -> None:
+        self.server_address = (Env.SERVER_IP, server_port)
+        self.username = username
+        self.password = password
+
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.bind((Env.CLIENT_IP, 0))
+        self.socket.settimeout(timeout)
+        self.address = self.socket.getsockname()
+
+    def create_packet(self, message_type: int, payload: str) -> bytes:
+        return UDPPacketHandling.create_udp_packet(
+            self.address[0], self.server_address[0], self.address[1], self.server_address[1],
+            message_type, payload.encode("utf-8")
+        )
+
+    def send(self, message_type: int, payload: str = "") -> None:
+        self.socket.sendto(self.create_packet(message_type, payload), self.server_address)
+
+    def request(self, message_type: int, payload: str = "") -> tuple[int, float]:
+        # Returns (response type, latency in seconds), raises socket.timeout on loss
+        start: float = time.perf_counter()
+        self.send(message_type, payload)
+        response: bytes = self.socket.recv(UDPPacket.UDP_PACKET_SIZE)
+
+        return (UDPPacketHandling.get_message_type(response), time.perf_counter() - start)
+
+    def authenticate(self, listening_port: int = 1) -> bool:
+        response_type, _ = self.request(PacketTypes.AUTH, f"{self.username},{self.password},{listening_port}")
+        return response_type == PacketTypes.OK
+
+    def heartbeat(self) -> None:
+        self.send(PacketTypes.HBT, self.username)
+
+    def close(self) -> None:
+        self.socket.close()
+
+class TrackerProcess:
+    # Starts server.py in a scratch directory with a generated credentials.txt.
+    # The server looks for credentials under "../", so it runs one level down.
+    def __init__(self, server_args: list[str] = [], num_users: int = 1000, quiet: bool = True) -> None:
+        self.server_args = server_args
+        self.num_users = num_users
+        self.quiet = quiet
+        self.port: int = find_free_port()
+        self.process: subprocess.Popen = None
+        self.directory: tempfile.TemporaryDirectory = None
+
+    def __enter__(self) -> "TrackerProcess":
+        self.directory = tempfile.TemporaryDirectory(prefix="bittrickle-bench-")
+        run_directory: str = os.path.join(self.directory.name, "run")
+        os.mkdir(run_directory)
+
+        with open(os.path.join(self.directory.name, "credentials.txt"), "w") as credentials:
+            for index in range(self.num_users):
+                username, password = user_credentials(index)
+                credentials.write(f"{username} {password}\n")
+
+        self.process = subprocess.Popen(
+            [sys.executable, SERVER_PATH, str(self.port), *self.server_args],
+            cwd=run_directory,
+            stdout=subprocess.DEVNULL if self.quiet else None,
+            stderr=None,
+            # Own process group so worker processes get cleaned up with it
+            start_new_session=True
+        )
+        self.wait_until_ready()
+
+        return self
+
+    def wait_until_ready(self, timeout: float = 10.0) -> None:
+        # An unauthenticated LAP gets an ERR back once the server is listening
+        probe = SimClient(self.port, "", "", timeout=0.2)
+        deadline: float = time.monotonic() + timeout
+        try:
+            while time.monotonic() < deadline:
+                try:
+                    probe.request(PacketTypes.LAP)
+                    return
+                except (socket.timeout, ConnectionRefusedError):
+                    continue
+        finally:
+            probe.close()
+
+        raise Exception("Server did not start in time")
+
+    def __exit__(self, *exc) -> None:
+        try:
+            os.killpg(self.process.pid, signal.SIGINT)
+            self.process.wait(timeout=5)
+        except (ProcessLookupError, subprocess.TimeoutExpired):
+            try:
+                os.killpg(self.process.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+        finally:
+            self.directory.cleanup()
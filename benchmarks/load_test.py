@@ -0,0 +1,396 @@
+import sys
+import json
+import time
+import heapq
+import random
+import shlex
+import socket
+import argparse
+import selectors
+
+from utils.Globals import PacketTypes, Sessions
+from utils.networking.UDPHandler import UDPPacket, UDPPacketHandling
+from benchmarks.harness import TrackerProcess, SimClient, user_credentials
+
+# Run from the project root with: python3 -m benchmarks.load_test
+#
+# Starts a tracker and drives it with lots of simulated clients from one selectors
+# loop. Every client authenticates, heartbeats every 2 seconds like the real client
+# and sends a weighted mix of requests, one at a time, so replies never need
+# matching up. At the end it prints throughput, p50/p99/p999 per message type,
+# timeouts and any sessions that expired even though their heartbeats went out on
+# time. Give it thresholds and it exits with 1 when they're broken, e.g.
+#
+#   python3 -m benchmarks.load_test --clients 2000 --rate 3000 --max-p99-ms 50 --max-expired 0
+
+HEARTBEAT_INTERVAL: float = Sessions.HEARTBEAT_INTERVAL
+DEFAULT_MIX: str = "PUB=2,UNP=1,LAP=2,LPF=2,SCH=4,GET=4"
+
+# Authenticated requests that only fail if the session is gone. A GET can also fail
+# because nobody active has the file, so its ERRs are only counted as errors.
+SESSION_ONLY_FAILURES: set[int] = {
+    PacketTypes.PUB, PacketTypes.UNP, PacketTypes.LAP, PacketTypes.LPF, PacketTypes.SCH
+}
+
+SEARCH_TERMS: list[str] = ["load", "seed", ".bin", "_1", "42", "missing_zzz"]
+
+def parse_mix(text: str) -> dict[int, int]:
+    # "PUB=2,SCH=4" -> {PUB: 2, SCH: 4}
+    mix: dict[int, int] = dict()
+    for item in text.split(","):
+        name, _, weight = item.partition("=")
+        message_type: int | None = PacketTypes.get_type(name.strip().upper())
+        if message_type == None or message_type not in SESSION_ONLY_FAILURES | {PacketTypes.GET}:
+            raise argparse.ArgumentTypeError(f"can't put {name} in the mix")
+
+        mix[message_type] = int(weight)
+
+    return mix
+
+def get_percentile(latencies: list[float], percentile: float) -> float:
+    # Nearest rank, latencies must already be sorted
+    if len(latencies) <= 0:
+        return 0
+
+    return latencies[min(len(latencies) - 1, int(percentile * len(latencies)))]
+
+class LoadClient:
+    def __init__(self, index: int, server_port: int, timeout: float) -> None:
+        self.index = index
+        self.sim: SimClient = SimClient(server_port, *user_credentials(index), timeout=timeout)
+        self.published: list[str] = []
+        self.counter: int = 0
+
+        # (message type, time sent) of the request waiting on a reply
+        self.pending: tuple[int, float] | None = None
+        self.payload: str = ""
+        self.last_heartbeat: float = 0
+
+class LoadStats:
+    def __init__(self) -> None:
+        self.latencies: dict[int, list[float]] = dict()
+        self.sent: dict[int, int] = dict()
+        self.timeouts: dict[int, int] = dict()
+        self.errors: dict[int, int] = dict()
+        self.expired: int = 0
+        self.expired_late_heartbeat: int = 0
+        self.heartbeats: int = 0
+        self.late_heartbeats: int = 0
+        self.max_heartbeat_lag: float = 0
+
+    def count(self, counter: dict[int, int], message_type: int) -> None:
+        counter[message_type] = counter.get(message_type, 0) + 1
+
+class LoadTest:
+    def __init__(
+        self, server_port: int, num_clients: int, rate: float, mix: dict[int, int],
+        timeout: float, seed: int
+    ) -> None:
+        self.rng = random.Random(seed)
+        self.timeout = timeout
+        self.stats: LoadStats = LoadStats()
+
+        self.clients: list[LoadClient] = [LoadClient(index, server_port, timeout) for index in range(num_clients)]
+        self.types: list[int] = list(mix.keys())
+        self.weights: list[int] = list(mix.values())
+
+        # Each client's mean gap between requests, so all of them together send `rate` per second
+        self.mean_gap: float = num_clients / rate
+
+        # (when, sequence, is a heartbeat, client index), the sequence just breaks ties
+        self.events: list[tuple[float, int, bool, int]] = []
+        self.sequence: int = 0
+
+        self.selector = selectors.DefaultSelector()
+
+    def schedule(self, when: float, heartbeat: bool, client: LoadClient) -> None:
+        self.sequence += 1
+        heapq.heappush(self.events, (when, self.sequence, heartbeat, client.index))
+
+    def set_up(self, batch_size: int = 50) -> None:
+        # Authenticate and publish one seed file each, in batches so the server's
+        # socket buffer doesn't overflow before the test has even started
+        for start in range(0, len(self.clients), batch_size):
+            batch: list[LoadClient] = self.clients[start:start + batch_size]
+            for client in batch:
+                if client.sim.authenticate() != True:
+                    raise Exception(f"{client.sim.username} couldn't authenticate")
+
+                client.last_heartbeat = time.perf_counter()
+                filename: str = f"seed{client.index}.bin"
+                client.sim.request(PacketTypes.PUB, filename)
+                client.published.append(filename)
+
+            # Setting up thousands of clients takes a while, keep the early ones alive
+            now: float = time.perf_counter()
+            for client in self.clients[:start + batch_size]:
+                if now - client.last_heartbeat >= HEARTBEAT_INTERVAL:
+                    client.sim.heartbeat()
+                    client.last_heartbeat = now
+
+        for client in self.clients:
+            client.sim.socket.setblocking(False)
+            self.selector.register(client.sim.socket, selectors.EVENT_READ, client)
+
+    def create_payload(self, client: LoadClient, message_type: int) -> tuple[int, str]:
+        match message_type:
+            case PacketTypes.PUB:
+                client.counter += 1
+                filename: str = f"load{client.index}_{client.counter}.bin"
+                return (message_type, filename)
+            case PacketTypes.UNP:
+                # The seed stays up so GETs have something to find, with nothing else
+                # to unpublish this turns into a PUB
+                if len(client.published) <= 1:
+                    return self.create_payload(client, PacketTypes.PUB)
+                return (message_type, client.published[self.rng.randrange(1, len(client.published))])
+            case PacketTypes.SCH:
+                return (message_type, self.rng.choice(SEARCH_TERMS))
+            case PacketTypes.GET:
+                other: LoadClient = self.rng.choice(self.clients)
+                return (message_type, self.rng.choice(other.published))
+            case _:
+                return (message_type, "")
+
+    def send_request(self, client: LoadClient, now: float) -> None:
+        message_type: int = self.rng.choices(self.types, self.weights)[0]
+        message_type, payload = self.create_payload(client, message_type)
+
+        client.pending = (message_type, now)
+        client.payload = payload
+        self.stats.count(self.stats.sent, message_type)
+        client.sim.send(message_type, payload)
+
+    def send_heartbeat(self, client: LoadClient, scheduled: float, now: float) -> None:
+        # A loop that's fallen behind sends heartbeats late, and a session that expires
+        # because of that is the load generator's fault rather than the server's
+        lag: float = now - scheduled
+        self.stats.max_heartbeat_lag = max(self.stats.max_heartbeat_lag, lag)
+        if lag > Sessions.INACTIVE_TIMEOUT - HEARTBEAT_INTERVAL:
+            self.stats.late_heartbeats += 1
+
+        self.stats.heartbeats += 1
+        client.last_heartbeat = now
+        client.sim.heartbeat()
+
+    def receive_replies(self, client: LoadClient, now: float) -> None:
+        while True:
+            try:
+                response: bytes = client.sim.socket.recv(UDPPacket.UDP_PACKET_SIZE)
+            except (BlockingIOError, InterruptedError):
+                return
+
+            # No request pending means this is a straggler for one that already timed out
+            if client.pending == None:
+                continue
+
+            message_type, sent_at = client.pending
+            client.pending = None
+            response_type: int = UDPPacketHandling.get_message_type(response)
+
+            if response_type == PacketTypes.ERR:
+                self.stats.count(self.stats.errors, message_type)
+                if message_type in SESSION_ONLY_FAILURES:
+                    self.handle_expired(client, sent_at)
+                    continue
+            else:
+                self.stats.latencies.setdefault(message_type, []).append(now - sent_at)
+
+                if message_type == PacketTypes.PUB:
+                    client.published.append(client.payload)
+                elif message_type == PacketTypes.UNP and client.payload in client.published:
+                    client.published.remove(client.payload)
+
+            self.schedule(now + self.rng.expovariate(1 / self.mean_gap), False, client)
+
+    def handle_expired(self, client: LoadClient, sent_at: float) -> None:
+        if sent_at - client.last_heartbeat > Sessions.INACTIVE_TIMEOUT:
+            self.stats.expired_late_heartbeat += 1
+        else:
+            self.stats.expired += 1
+
+        # Log straight back in, the reply comes back through the loop like any other
+        client.pending = (PacketTypes.AUTH, time.perf_counter())
+        client.payload = ""
+        self.stats.count(self.stats.sent, PacketTypes.AUTH)
+        client.sim.send(PacketTypes.AUTH, f"{client.sim.username},{client.sim.password},1")
+
+    def check_timeouts(self, now: float) -> None:
+        for client in self.clients:
+            if client.pending == None or now - client.pending[1] < self.timeout:
+                continue
+
+            self.stats.count(self.stats.timeouts, client.pending[0])
+            client.pending = None
+            self.schedule(now + self.rng.expovariate(1 / self.mean_gap), False, client)
+
+    def run(self, duration: float) -> float:
+        start: float = time.perf_counter()
+        for client in self.clients:
+            # Heartbeats carry on from set up, which already spread them out
+            self.schedule(max(start, client.last_heartbeat + HEARTBEAT_INTERVAL), True, client)
+            self.schedule(start + self.rng.expovariate(1 / self.mean_gap), False, client)
+
+        deadline: float = start + duration
+        next_sweep: float = start + self.timeout / 4
+        now: float = start
+
+        while now < deadline:
+            wait: float = 0.01
+            if len(self.events) > 0:
+                wait = min(wait, max(0, self.events[0][0] - now))
+
+            for key, _ in self.selector.select(wait):
+                self.receive_replies(key.data, time.perf_counter())
+
+            now = time.perf_counter()
+            while len(self.events) > 0 and self.events[0][0] <= now:
+                when, _, heartbeat, index = heapq.heappop(self.events)
+                client: LoadClient = self.clients[index]
+
+                if heartbeat:
+                    self.send_heartbeat(client, when, now)
+                    self.schedule(when + HEARTBEAT_INTERVAL, True, client)
+                elif client.pending == None:
+                    self.send_request(client, now)
+
+            if now >= next_sweep:
+                self.check_timeouts(now)
+                next_sweep = now + self.timeout / 4
+
+        return time.perf_counter() - start
+
+    def count_lost_sessions(self) -> int:
+        # One last LAP from everyone, anybody who gets an ERR lost their session
+        # somewhere along the way without us noticing
+        lost: int = 0
+        for client in self.clients:
+            # Anything still in flight from the run, the socket is still non-blocking here
+            try:
+                while True:
+                    client.sim.socket.recv(UDPPacket.UDP_PACKET_SIZE)
+            except (BlockingIOError, InterruptedError):
+                pass
+            client.sim.socket.settimeout(self.timeout)
+
+            try:
+                response_type, _ = client.sim.request(PacketTypes.LAP)
+            except socket.timeout:
+                continue
+
+            if response_type == PacketTypes.ERR:
+                lost += 1
+
+        return lost
+
+    def close(self) -> None:
+        self.selector.close()
+        for client in self.clients:
+            client.sim.close()
+
+def report(stats: LoadStats, elapsed: float, lost_sessions: int) -> dict:
+    results: dict = {"elapsed_s": elapsed, "types": dict()}
+
+    print(f"\n{'type':>6} {'sent':>8} {'ok':>8} {'req/s':>9} {'p50 ms':>8} {'p99 ms':>8} {'p999 ms':>8} {'timeouts':>9} {'errors':>7}")
+    for message_type in sorted(stats.sent.keys()):
+        latencies: list[float] = sorted(stats.latencies.get(message_type, []))
+        row: dict = {
+            "sent": stats.sent[message_type],
+            "ok": len(latencies),
+            "per_second": len(latencies) / elapsed,
+            "p50_ms": get_percentile(latencies, 0.5) * 1e3,
+            "p99_ms": get_percentile(latencies, 0.99) * 1e3,
+            "p999_ms": get_percentile(latencies, 0.999) * 1e3,
+            "timeouts": stats.timeouts.get(message_type, 0),
+            "errors": stats.errors.get(message_type, 0)
+        }
+        results["types"][PacketTypes.get_name(message_type)] = row
+
+        print(
+            f"{PacketTypes.get_name(message_type):>6} {row['sent']:>8} {row['ok']:>8} {row['per_second']:>9.1f} "
+            f"{row['p50_ms']:>8.2f} {row['p99_ms']:>8.2f} {row['p999_ms']:>8.2f} {row['timeouts']:>9} {row['errors']:>7}"
+        )
+
+    sent: int = sum(stats.sent.values())
+    answered: int = sum(len(latencies) for latencies in stats.latencies.values()) + sum(stats.errors.values())
+    timeouts: int = sum(stats.timeouts.values())
+    results.update({
+        "throughput": answered / elapsed,
+        "sent": sent,
+        "timeouts": timeouts,
+        "timeout_rate": timeouts / max(sent, 1),
+        "expired": stats.expired,
+        "expired_late_heartbeat": stats.expired_late_heartbeat,
+        "lost_sessions": lost_sessions,
+        "heartbeats": stats.heartbeats,
+        "late_heartbeats": stats.late_heartbeats,
+        "max_heartbeat_lag_ms": stats.max_heartbeat_lag * 1e3
+    })
+
+    print(f"\nthroughput: {results['throughput']:.1f} replies/s over {elapsed:.1f}s")
+    print(f"timed out: {timeouts} of {sent} ({results['timeout_rate'] * 100:.2f}%)")
+    print(f"heartbeats: {stats.heartbeats} sent, {stats.late_heartbeats} late, worst lag {results['max_heartbeat_lag_ms']:.1f} ms")
+    print(f"unexpected expiries: {stats.expired} (plus {stats.expired_late_heartbeat} after late heartbeats)")
+    print(f"sessions lost by the end: {lost_sessions}")
+
+    return results
+
+def check_thresholds(results: dict, args) -> list[str]:
+    failures: list[str] = []
+
+    if args.max_p99_ms != None:
+        for name, row in results["types"].items():
+            if row["p99_ms"] > args.max_p99_ms:
+                failures.append(f"{name} p99 {row['p99_ms']:.2f} ms > {args.max_p99_ms} ms")
+    if args.max_timeout_rate != None and results["timeout_rate"] > args.max_timeout_rate:
+        failures.append(f"timeout rate {results['timeout_rate']:.4f} > {args.max_timeout_rate}")
+    if args.max_expired != None and results["expired"] + results["lost_sessions"] > args.max_expired:
+        failures.append(f"{results['expired'] + results['lost_sessions']} sessions expired > {args.max_expired}")
+    if args.min_throughput != None and results["throughput"] < args.min_throughput:
+        failures.append(f"throughput {results['throughput']:.1f}/s < {args.min_throughput}/s")
+
+    return failures
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, default=1000)
+    parser.add_argument("--rate", type=float, default=1000, help="requests per second across all clients")
+    parser.add_argument("--duration", type=float, default=30.0)
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix(DEFAULT_MIX))
+    parser.add_argument("--timeout", type=float, default=1.0, help="seconds before a request counts as lost")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--server-args", default="--log-level off", help="passed through to server.py")
+    parser.add_argument("--json", help="also write the results here")
+
+    # Release gates, any that are given and broken make the exit status 1
+    parser.add_argument("--max-p99-ms", type=float)
+    parser.add_argument("--max-timeout-rate", type=float)
+    parser.add_argument("--max-expired", type=int)
+    parser.add_argument("--min-throughput", type=float)
+    args = parser.parse_args()
+
+    with TrackerProcess(shlex.split(args.server_args), num_users=args.clients) as tracker:
+        test: LoadTest = LoadTest(tracker.port, args.clients, args.rate, args.mix, args.timeout, args.seed)
+        try:
+            print(f"Setting up {args.clients} clients...")
+            test.set_up()
+            print(f"Running for {args.duration:.0f}s at {args.rate:.0f} requests/s")
+            elapsed: float = test.run(args.duration)
+            lost_sessions: int = test.count_lost_sessions()
+        finally:
+            test.close()
+
+    results: dict = report(test.stats, elapsed, lost_sessions)
+    failures: list[str] = check_thresholds(results, args)
+    results["failures"] = failures
+
+    if args.json != None:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if len(failures) > 0:
+        print("\nFAILED:\n  " + "\n  ".join(failures))
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,322 @@
+import os
+import sys
+import json
+import random
+import timeit
+import argparse
+import tempfile
+import platform
+import tracemalloc
+from typing import Callable
+
+from utils.Globals import Env, PacketTypes, Sessions, BatchStatus
+from utils.networking.UDPHandler import *
+from utils.server.UserFilesHandler import UserFilesHandler
+from utils.server.UserSessionsHandler import UserSessionsHandler
+from benchmarks.search_bench import make_filename
+
+# Run from the project root with: python3 -m benchmarks.micro
+#
+# Times the hot primitives on their own: building and checksumming packets, every
+# get_data, and the file and session registries at several catalog sizes. For each
+# one it records ops/sec (best of a few autoranged runs) and, with tracemalloc, the
+# peak bytes one call allocates, how many blocks it allocates that are still alive
+# when it returns (its result included), and the bytes and blocks still held per
+# call after many calls.
+#
+# benchmarks/baseline.json is a committed run to compare against:
+#
+#   python3 -m benchmarks.micro --baseline benchmarks/baseline.json
+#
+# which prints each result against the baseline, and exits with 1 if anything got
+# slower than --tolerance allows. Timings depend on the machine, so after a change
+# that's meant to move them, or on a new machine, refresh it with
+#
+#   python3 -m benchmarks.micro --save-baseline benchmarks/baseline.json
+
+SRC: tuple[str, int] = (Env.CLIENT_IP, 50000)
+DST: tuple[str, int] = (Env.SERVER_IP, 60000)
+
+MANIFEST: FileManifestData = FileManifestData(size=123456789, chunk_size=1048576, root="ab" * 32)
+
+# Registries are filled with this many users, so each user has a handful of files
+NUM_USERS: int = 1000
+
+# Benchmark name -> the call to time
+Benchmarks = dict[str, Callable[[], object]]
+
+def create(message_type: int, payload: bytes) -> bytes:
+    return UDPPacketCodec.encode(SRC[0], DST[0], SRC[1], DST[1], message_type, payload)
+
+def get_codec_benchmarks() -> Benchmarks:
+    small: bytes = b"lecture_notes1234.pdf"
+    large: bytes = bytes(random.Random(0).getrandbits(8) for _ in range(1024))
+    large_packet: bytes = create(PacketTypes.PUB, large)
+
+    # Batches as full as pub -r / unp -r would send them
+    pub_batch: list[str] = UDPBatchPacket.split_batches(
+        [UDPBpubPacket.create_item(f"{index}_{small.decode()}", MANIFEST) for index in range(100)]
+    )[0]
+    unp_batch: list[str] = UDPBatchPacket.split_batches([f"{index}_{small.decode()}" for index in range(200)])[0]
+
+    # One realistic packet for every get_data (and the reply parsers the client uses)
+    parsers: dict[str, tuple[Callable, bytes]] = {
+        "UDPAuthPacket": (UDPAuthPacket.get_data, create(PacketTypes.AUTH, b"user1,password1,50001")),
+        "UDPHbtPacket": (UDPHbtPacket.get_data, create(PacketTypes.HBT, b"user1,2,5")),
+        "UDPPubPacket": (UDPPubPacket.get_data, create(
+            PacketTypes.PUB, ",".join([small.decode()] + UDPPubPacket.manifest_to_args(MANIFEST)).encode()
+        )),
+        "UDPUnpPacket": (UDPUnpPacket.get_data, create(PacketTypes.UNP, small)),
+        "UDPGetPacket": (UDPGetPacket.get_data, create(PacketTypes.GET, small)),
+        "UDPGetPacket.reply": (UDPGetPacket.get_reply_data, create(
+            PacketTypes.OK, UDPGetPacket.create_reply_payload(SRC, MANIFEST)
+        )),
+        "UDPSchPacket": (UDPSchPacket.get_data, create(PacketTypes.SCH, b"notes")),
+        "UDPSwmPacket": (UDPSwmPacket.get_data, create(PacketTypes.SWM, small + b",4")),
+        "UDPSwmPacket.reply": (UDPSwmPacket.get_reply_data, create(
+            PacketTypes.OK, UDPSwmPacket.create_reply_payload([SRC] * 4, MANIFEST)
+        )),
+        "UDPPagePacket": (UDPPagePacket.get_data, create(
+            PacketTypes.PAGE, UDPPagePacket.create_payload(7, 0, True, 500, [f"user{index}" for index in range(50)])
+        )),
+        "UDPNxtPacket": (UDPNxtPacket.get_data, create(PacketTypes.NXT, b"7,1")),
+        "UDPBpubPacket": (UDPBpubPacket.get_data, UDPBpubPacket.create_packet(
+            SRC[0], DST[0], SRC[1], DST[1], pub_batch
+        )),
+        "UDPBunpPacket": (UDPBunpPacket.get_data, UDPBunpPacket.create_packet(
+            SRC[0], DST[0], SRC[1], DST[1], unp_batch
+        )),
+        "UDPBatchPacket.reply": (UDPBatchPacket.get_reply_data, create(
+            PacketTypes.OK, UDPBatchPacket.create_reply_payload([BatchStatus.OK] * len(unp_batch))
+        )),
+    }
+
+    benchmarks: Benchmarks = {
+        "codec.create_udp_packet": lambda: UDPPacketHandling.create_udp_packet(
+            SRC[0], DST[0], SRC[1], DST[1], PacketTypes.GET, small
+        ),
+        "codec.get_checksum_1k": lambda: UDPPacketHandling.get_checksum(SRC[0], DST[0], large_packet),
+        "codec.verify_checksum_1k": lambda: UDPPacketHandling.verify_checksum(large_packet, DST[0]),
+    }
+
+    for name, (parse, packet) in parsers.items():
+        benchmarks[f"codec.get_data.{name}"] = (lambda parse, packet: lambda: parse(packet))(parse, packet)
+
+    return benchmarks
+
+def fill_files(size: int) -> tuple[UserFilesHandler, list[str]]:
+    rng = random.Random(size)
+    files_handler = UserFilesHandler()
+    filenames: list[str] = [f"{index}_{make_filename(rng)}" for index in range(size)]
+
+    for index, filename in enumerate(filenames):
+        files_handler.add_file(f"user{index % NUM_USERS}", filename, MANIFEST)
+
+    return (files_handler, filenames)
+
+def get_files_benchmarks(size: int) -> Benchmarks:
+    files_handler, filenames = fill_files(size)
+    rng = random.Random(1)
+    picks: list[str] = [rng.choice(filenames) for _ in range(1024)]
+    turn: list[int] = [0]
+
+    def pick() -> str:
+        turn[0] = (turn[0] + 1) & 1023
+        return picks[turn[0]]
+
+    def add_remove() -> None:
+        # A pair, so the catalog stays the same size however many times it runs
+        files_handler.add_file("newcomer", "brand_new_file.txt", MANIFEST)
+        files_handler.remove_file("newcomer", "brand_new_file.txt")
+
+    return {
+        f"files.add_remove[n={size}]": add_remove,
+        f"files.is_sharer[n={size}]": lambda: files_handler.is_sharer(pick(), "user1"),
+        f"files.get_file_sharers[n={size}]": lambda: files_handler.get_file_sharers(pick()),
+        f"files.get_manifest[n={size}]": lambda: files_handler.get_manifest(pick(), "user1"),
+        f"files.get_shared_by[n={size}]": lambda: files_handler.get_shared_by("user1"),
+        f"files.get_matching_rare[n={size}]": lambda: files_handler.get_matching("season31"),
+        f"files.get_matching_common[n={size}]": lambda: files_handler.get_matching("report"),
+    }
+
+def fill_sessions(size: int) -> UserSessionsHandler:
+    # The handler looks for credentials.txt under "../", so it's built somewhere
+    # empty and given its credentials directly
+    previous: str = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix="bittrickle-micro-") as directory:
+        os.mkdir(os.path.join(directory, "run"))
+        os.chdir(os.path.join(directory, "run"))
+        try:
+            users_handler = UserSessionsHandler()
+        finally:
+            os.chdir(previous)
+
+    users_handler.authenticator.credentials = {f"user{index}": f"password{index}" for index in range(size)}
+    users_handler.authenticator.credentials["newcomer"] = "password"
+
+    for index in range(size):
+        users_handler.generate_session(
+            f"user{index}", f"password{index}", 1, (Env.CLIENT_IP, 10000 + index)
+        )
+
+    return users_handler
+
+def get_sessions_benchmarks(size: int) -> Benchmarks:
+    users_handler: UserSessionsHandler = fill_sessions(size)
+    rng = random.Random(2)
+    picks: list[int] = [rng.randrange(size) for _ in range(1024)]
+    turn: list[int] = [0]
+
+    def pick() -> int:
+        turn[0] = (turn[0] + 1) & 1023
+        return picks[turn[0]]
+
+    def login_logout() -> None:
+        users_handler.generate_session("newcomer", "password", 1, ("127.0.0.2", 1))
+        users_handler.remove_session("newcomer")
+
+    sharers: list[str] = [f"user{index}" for index in picks[:5]]
+
+    return {
+        f"sessions.login_logout[n={size}]": login_logout,
+        f"sessions.renew_session[n={size}]": lambda: users_handler.renew_session(f"user{pick()}", 1, 2),
+        f"sessions.renew_from_address[n={size}]": lambda: users_handler.renew_from_address(
+            (Env.CLIENT_IP, 10000 + pick()), 1, 2
+        ),
+        f"sessions.get_active_user[n={size}]": lambda: users_handler.get_active_user(
+            (Env.CLIENT_IP, 10000 + pick())
+        ),
+        f"sessions.get_sharer_candidates_5[n={size}]": lambda: users_handler.get_sharer_candidates(sharers),
+        f"sessions.remove_expired_sessions[n={size}]": users_handler.remove_expired_sessions,
+        f"sessions.get_active_users[n={size}]": users_handler.get_active_users,
+    }
+
+def measure_speed(function: Callable[[], object], repeat: int) -> float:
+    # autorange picks a loop count that takes at least 0.2s, then the best of a
+    # few runs of that is the least disturbed one
+    timer = timeit.Timer(function)
+    number, _ = timer.autorange()
+
+    return number / min(timer.repeat(repeat=repeat, number=number))
+
+def count_new_blocks(before: tracemalloc.Snapshot, after: tracemalloc.Snapshot) -> int:
+    # Blocks allocated between the snapshots that are still alive, not counting
+    # tracemalloc's own
+    ignore: list[tracemalloc.Filter] = [tracemalloc.Filter(False, tracemalloc.__file__)]
+    statistics: list[tracemalloc.StatisticDiff] = after.filter_traces(ignore).compare_to(
+        before.filter_traces(ignore), "filename"
+    )
+
+    return sum(statistic.count_diff for statistic in statistics)
+
+def measure_memory(function: Callable[[], object], calls: int = 100) -> dict[str, float]:
+    # Registries are built before tracing starts, so snapshots only hold what the calls allocate
+    function()
+
+    tracemalloc.start()
+    try:
+        first: tracemalloc.Snapshot = tracemalloc.take_snapshot()
+        before, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        result: object = function()
+        _, peak = tracemalloc.get_traced_memory()
+        alloc_blocks: int = count_new_blocks(first, tracemalloc.take_snapshot())
+        del result
+
+        first = tracemalloc.take_snapshot()
+        before_many, _ = tracemalloc.get_traced_memory()
+        for _ in range(calls):
+            function()
+        after_many, _ = tracemalloc.get_traced_memory()
+        retained_blocks: int = count_new_blocks(first, tracemalloc.take_snapshot())
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "peak_bytes": max(0, peak - before),
+        "alloc_blocks": max(0, alloc_blocks),
+        "retained_bytes": max(0, after_many - before_many) / calls,
+        "retained_blocks": max(0, retained_blocks) / calls
+    }
+
+def run_benchmarks(benchmarks: Benchmarks, repeat: int, results: dict[str, dict]) -> None:
+    for name, function in benchmarks.items():
+        ops: float = measure_speed(function, repeat)
+        # Slow ones get fewer calls under tracemalloc, so a second or so each
+        memory: dict[str, float] = measure_memory(function, max(3, min(100, int(ops))))
+        results[name] = {"ops_per_sec": ops, **memory}
+
+        print(
+            f"{name:<52} {ops:>14,.0f} {memory['peak_bytes']:>10.0f} {memory['alloc_blocks']:>7.0f} "
+            f"{memory['retained_bytes']:>10.1f} {memory['retained_blocks']:>9.2f}",
+            flush=True
+        )
+
+def compare(results: dict[str, dict], baseline: dict[str, dict], tolerance: float) -> list[str]:
+    print(f"\n{'benchmark':<52} {'baseline/s':>14} {'now/s':>14} {'change':>8}")
+
+    regressions: list[str] = []
+    for name, result in results.items():
+        previous: dict | None = baseline.get(name)
+        if previous == None:
+            print(f"{name:<52} {'-':>14} {result['ops_per_sec']:>14,.0f} {'new':>8}")
+            continue
+
+        change: float = result["ops_per_sec"] / previous["ops_per_sec"] - 1
+        flag: str = ""
+        if change < -tolerance:
+            flag = "  SLOWER"
+            regressions.append(name)
+
+        print(f"{name:<52} {previous['ops_per_sec']:>14,.0f} {result['ops_per_sec']:>14,.0f} {change * 100:>+7.1f}%{flag}")
+
+    return regressions
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000, 1_000_000])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--groups", nargs="+", choices=["codec", "files", "sessions"], default=["codec", "files", "sessions"])
+    parser.add_argument("--json", help="write the results here")
+    parser.add_argument("--save-baseline", help="write the results here to compare later runs against")
+    parser.add_argument("--baseline", help="compare against a file written by --save-baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="slowdown allowed before it's a regression")
+    args = parser.parse_args()
+
+    # Nothing should expire while it's being timed
+    Sessions.INACTIVE_TIMEOUT = 10 ** 9
+
+    results: dict[str, dict] = dict()
+    print(f"{'benchmark':<52} {'ops/sec':>14} {'peak B':>10} {'blocks':>7} {'kept B':>10} {'kept blk':>9}")
+
+    if "codec" in args.groups:
+        run_benchmarks(get_codec_benchmarks(), args.repeat, results)
+
+    for size in args.sizes:
+        # Built one at a time, and let go before the next, so the biggest sizes fit in memory
+        if "files" in args.groups:
+            run_benchmarks(get_files_benchmarks(size), args.repeat, results)
+        if "sessions" in args.groups:
+            run_benchmarks(get_sessions_benchmarks(size), args.repeat, results)
+
+    output: dict = {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "results": results
+    }
+    for path in (args.json, args.save_baseline):
+        if path != None:
+            with open(path, "w") as f:
+                json.dump(output, f, indent=2)
+
+    if args.baseline != None:
+        with open(args.baseline) as f:
+            baseline: dict[str, dict] = json.load(f)["results"]
+
+        regressions: list[str] = compare(results, baseline, args.tolerance)
+        if len(regressions) > 0:
+            print(f"\n{len(regressions)} slower than the baseline by more than {args.tolerance * 100:.0f}%")
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+import time
+import random
+import string
+import argparse
+
+from utils.server.UserFilesHandler import UserFilesHandler
+
+# Run from the project root with: python3 -m benchmarks.search_bench
+#
+# Compares SCH lookups through the trigram index against a plain scan of every
+# filename (what get_matching used to do), and checks they find the same files.
+
+WORDS: list[str] = [
+    "album", "backup", "chapter", "draft", "episode", "final", "holiday", "invoice",
+    "lecture", "notes", "photo", "project", "recording", "report", "season", "track"
+]
+EXTENSIONS: list[str] = ["txt", "mp3", "mp4", "pdf", "jpg", "zip", "docx"]
+QUERIES: list[str] = ["re", "report", "season3", "final_draft", "1234", "zzz_missing", ".pdf"]
+
+def make_filename(rng: random.Random) -> str:
+    words: list[str] = rng.sample(WORDS, 2)
+    suffix: str = "".join(rng.choices(string.digits, k=rng.randint(1, 6)))
+    return f"{words[0]}_{words[1]}{suffix}.{rng.choice(EXTENSIONS)}"
+
+def scan(files_handler: UserFilesHandler, substring: str) -> list[str]:
+    return [filename for filename in files_handler.shared_files.keys() if substring in filename]
+
+def time_per_query(function, iterations: int) -> float:
+    start: float = time.perf_counter()
+    for _ in range(iterations):
+        function()
+
+    return (time.perf_counter() - start) / iterations
+
+def run(catalog_size: int, iterations: int) -> None:
+    rng = random.Random(catalog_size)
+    files_handler = UserFilesHandler()
+
+    start: float = time.perf_counter()
+    for index in range(catalog_size):
+        try:
+            files_handler.add_file(f"user{index % 100}", make_filename(rng))
+        except Exception:
+            continue
+    build: float = time.perf_counter() - start
+
+    print(f"\n{len(files_handler.shared_files)} filenames (built in {build:.1f}s)")
+    print(f"{'query':>14} {'matches':>8} {'scan ms':>10} {'index ms':>10} {'speedup':>8}")
+    for query in QUERIES:
+        expected: list[str] = scan(files_handler, query)
+        actual: list[str] = files_handler.get_matching(query)
+        assert expected == actual, query
+
+        scan_time: float = time_per_query(lambda: scan(files_handler, query), iterations)
+        index_time: float = time_per_query(lambda: files_handler.get_matching(query), iterations)
+        print(
+            f"{query:>14} {len(expected):>8} {scan_time * 1e3:>10.3f} "
+            f"{index_time * 1e3:>10.3f} {scan_time / index_time:>7.1f}x"
+        )
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--iterations", type=int, default=5)
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        run(size, args.iterations)
+
+if __name__ == "__main__":
+    main()
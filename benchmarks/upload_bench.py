@@ -0,0 +1,108 @@
+import os
+import time
+import socket
+import argparse
+import tempfile
+import threading
+
+from utils.Globals import Env, Uploads
+from utils.networking.TCPHandler import PeerProtocol
+from utils.networking.ClientServerConnector import ClientNetworkHandler
+
+# Run from the project root with: python3 -m benchmarks.upload_bench
+#
+# Serves files of increasing size over loopback through ClientNetworkHandler.new_client
+# and times how long the downloader takes to drain them, once per upload mode.
+
+MiB: int = 1024 * 1024
+
+def create_file(directory: str, size: int) -> str:
+    filename: str = f"upload_{size}.bin"
+
+    # Random data so nothing along the way can cheat on zeros
+    block: bytes = os.urandom(MiB)
+    with open(os.path.join(directory, filename), "wb") as f:
+        for start in range(0, size, MiB):
+            f.write(block[:min(MiB, size - start)])
+
+    return filename
+
+def serve(listening_socket: socket.socket) -> None:
+    while True:
+        try:
+            connection, _ = listening_socket.accept()
+        except OSError:
+            return
+
+        ClientNetworkHandler.new_client(connection)
+
+def download(address: tuple[str, int], filename: str) -> int:
+    buffer: memoryview = memoryview(bytearray(MiB))
+    received: int = 0
+
+    with socket.create_connection(address) as connection:
+        connection.sendall(PeerProtocol.create_request(filename))
+        while True:
+            read: int = connection.recv_into(buffer)
+            if not read:
+                return received
+
+            received += read
+
+def time_upload(address: tuple[str, int], filename: str, size: int, repeats: int) -> float:
+    # Best of the repeats, the first one also warms the page cache
+    best: float = float("inf")
+    for _ in range(repeats):
+        start: float = time.perf_counter()
+        received: int = download(address, filename)
+        best = min(best, time.perf_counter() - start)
+
+        if received != size:
+            raise RuntimeError(f"Expected {size} bytes of {filename}, got {received}")
+
+    return best
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[1, 16, 128, 1024],
+        help="file sizes to serve, in MiB"
+    )
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    # The original 1 KiB read/send loop, then the buffered fallback, then sendfile
+    modes: list[tuple[str, bool, int]] = [
+        ("1KiB chunks", False, 1024),
+        (f"{Uploads.CHUNK_SIZE // 1024}KiB chunks", False, Uploads.CHUNK_SIZE),
+        ("sendfile", True, Uploads.CHUNK_SIZE),
+    ]
+
+    with tempfile.TemporaryDirectory() as directory:
+        files: list[tuple[str, int]] = [(create_file(directory, size * MiB), size * MiB) for size in args.sizes]
+
+        # new_client looks for files under the working directory
+        previous_directory: str = os.getcwd()
+        os.chdir(directory)
+
+        listening_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        listening_socket.bind((Env.CLIENT_IP, 0))
+        listening_socket.listen()
+        threading.Thread(target=serve, args=(listening_socket,), daemon=True).start()
+        address: tuple[str, int] = listening_socket.getsockname()
+
+        try:
+            print(f"{'mode':>14} {'size':>10} {'seconds':>9} {'MiB/s':>9}")
+            for name, use_sendfile, chunk_size in modes:
+                ClientNetworkHandler.use_sendfile = use_sendfile
+                ClientNetworkHandler.upload_chunk_size = chunk_size
+
+                for filename, size in files:
+                    elapsed: float = time_upload(address, filename, size, args.repeats)
+                    print(f"{name:>14} {size // MiB:>7}MiB {elapsed:>9.3f} {size / MiB / elapsed:>9.0f}")
+        finally:
+            listening_socket.close()
+            os.chdir(previous_directory)
+
+if __name__ == "__main__":
+    main()
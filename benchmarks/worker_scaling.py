@@ -0,0 +1,94 @@
+import time
+import socket
+import argparse
+import multiprocessing
+
+from utils.Globals import PacketTypes
+from benchmarks.harness import TrackerProcess, SimClient, user_credentials
+
+# Run from the project root with: python3 -m benchmarks.worker_scaling --max-workers 8
+#
+# Starts the server with 1, 2, 4 ... max workers and drives it with closed-loop
+# load processes, each running several clients through AUTH, HBT, PUB and SCH.
+# Every worker count, 1 included, runs with the registry in its own process, so
+# the points are like for like. Load generators need cores too, so the curve is
+# only meaningful on a host with at least twice as many cores as the largest
+# worker count.
+
+def drive_load(server_port: int, first_user: int, num_clients: int, duration: float, results) -> None:
+    clients: list[SimClient] = []
+    completed: int = 0
+    timeouts: int = 0
+
+    for index in range(first_user, first_user + num_clients):
+        client = SimClient(server_port, *user_credentials(index), timeout=1.0)
+        try:
+            if client.authenticate():
+                completed += 1
+                clients.append(client)
+        except socket.timeout:
+            timeouts += 1
+
+    deadline: float = time.monotonic() + duration
+    iteration: int = 0
+    while time.monotonic() < deadline and clients:
+        for client in clients:
+            try:
+                client.heartbeat()
+                client.request(PacketTypes.PUB, f"{client.username}-file{iteration}")
+                client.request(PacketTypes.SCH, f"file{iteration % 10}")
+                completed += 3
+            except socket.timeout:
+                timeouts += 1
+
+        iteration += 1
+
+    results.put((completed, timeouts))
+
+def measure(num_workers: int, load_processes: int, clients_per_process: int, duration: float) -> tuple[float, int]:
+    server_args: list[str] = ["--workers", str(num_workers), "--shared-registry"]
+    with TrackerProcess(server_args, num_users=load_processes * clients_per_process) as tracker:
+        results = multiprocessing.Queue()
+        drivers: list[multiprocessing.Process] = [
+            multiprocessing.Process(
+                target=drive_load,
+                args=(tracker.port, index * clients_per_process, clients_per_process, duration, results)
+            )
+            for index in range(load_processes)
+        ]
+
+        start: float = time.perf_counter()
+        for driver in drivers:
+            driver.start()
+
+        totals: list[tuple[int, int]] = [results.get() for _ in drivers]
+        elapsed: float = time.perf_counter() - start
+
+        for driver in drivers:
+            driver.join()
+
+    return (sum(total[0] for total in totals) / elapsed, sum(total[1] for total in totals))
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--max-workers", type=int, default=multiprocessing.cpu_count())
+    parser.add_argument("--load-processes", type=int, default=multiprocessing.cpu_count())
+    parser.add_argument("--clients", type=int, default=20, help="clients per load process")
+    parser.add_argument("--duration", type=float, default=5.0)
+    args = parser.parse_args()
+
+    worker_counts: list[int] = []
+    count: int = 1
+    while count <= args.max_workers:
+        worker_counts.append(count)
+        count *= 2
+
+    baseline: float = None
+    print(f"{'workers':>8} {'req/s':>12} {'speedup':>8} {'timeouts':>9}")
+    for num_workers in worker_counts:
+        throughput, timeouts = measure(num_workers, args.load_processes, args.clients, args.duration)
+        baseline = baseline or throughput
+        print(f"{num_workers:>8} {throughput:>12.0f} {throughput / baseline:>7.2f}x {timeouts:>9}")
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,10 @@
 import sys
-import socket
 
 from utils.client.CommandHandler import CommandHandler
 from utils.networking.ClientServerConnector import ClientNetworkHandler
+from utils.networking.ClientTransport import ClientTransport
+from utils.client.FilesHandler import FilesHandler
+from utils.client.Manifest import ManifestCache
 from utils.Globals import Env
 
 # Constants
@@ -15,14 +17,20 @@ server_ip: str = Env.SERVER_IP
 server_port: int = int(sys.argv[1])
             
 def main():
-    client_server_socket: socket = ClientNetworkHandler.connect_to_server(server_port)
+    # Index what we can share once up front, it's kept fresh from then on
+    FilesHandler.build_index()
 
-    print(f"Welcome to BitTrickle!\nAvailable commands are: get, lap, lpf, pub, sch, unp, xit")
+    # Manifests hashed in earlier runs, so re-publishing doesn't hash everything again
+    ManifestCache.load()
+
+    transport: ClientTransport = ClientNetworkHandler.connect_to_server(server_port)
+
+    print(f"Welcome to BitTrickle!\nAvailable commands are: get, lap, lpf, pub, sch, sts, unp, xit")
 
     while True:
         try:
             command: list[str] = CommandHandler.get_command()
-            CommandHandler.execute_command(command, client_server_socket, (server_ip, server_port))
+            CommandHandler.execute_command(command, transport)
         except Exception as e:
             print(e)
             continue
@@ -1,62 +1,118 @@
 import sys
-import socket
+import argparse
 
 from utils.Globals import Env, PacketTypes
-from utils.networking.UDPHandler import UDPPacketHandling, UDPPacket
 from utils.server import ServerPacketHandler
-from utils.Exceptions import *
-from utils.server.UserSessionsHandler import UserSessionsHandler
-from utils.server.UserFilesHandler import UserFilesHandler
-from utils.server.Logger import NetworkLogger
+from utils.server.Registry import Registry
+from utils.server.ServerEngines import ServerEngines, BatchedServerEngine
+from utils.server.ServerWorkers import ServerWorkerPool
+from utils.server.ResponseCache import ResponseCache
+from utils.server.SharerSelection import SharerSelection
+from utils.server.Logger import NetworkLogger, LogLevel
+from utils.server.ServerMetrics import ServerMetrics
 
-# Constants
-server_port: int = int(sys.argv[1])
-if sys.argv.__len__() != 2 or sys.argv[1].isnumeric() != True:
-    print(f"Cannot run. Proper usage: python3 server.py <server_port>")
-    exit()
+def parse_args() -> argparse.Namespace:
+    if sys.argv.__len__() < 2 or sys.argv[1].isnumeric() != True:
+        print(f"Cannot run. Proper usage: python3 server.py <server_port> [--engine blocking|asyncio|batched] [--workers N]")
+        exit()
+
+    parser = argparse.ArgumentParser(prog="server.py")
+    parser.add_argument("server_port", type=int)
+    parser.add_argument(
+        "--engine", choices=list(ServerEngines.ENGINES.keys()), default="blocking",
+        help="blocking recv loop (default), asyncio datagram endpoint, or batched non-blocking I/O"
+    )
+    parser.add_argument(
+        "--workers", type=int, default=1,
+        help="number of worker processes sharing the port with SO_REUSEPORT (default 1)"
+    )
+    parser.add_argument(
+        "--shared-registry", action="store_true",
+        help="keep the registry in its own process even with one worker, like it is with more"
+    )
+    parser.add_argument(
+        "--batch-size", type=int, default=BatchedServerEngine.DEFAULT_BATCH_SIZE,
+        help="datagrams drained per batch by the batched engine"
+    )
+    parser.add_argument(
+        "--cache-size", type=int, default=ResponseCache.DEFAULT_CAPACITY,
+        help="number of LAP/LPF/SCH results kept in the response cache, 0 to disable"
+    )
+    parser.add_argument(
+        "--sharer-policy", choices=list(SharerSelection.POLICIES.keys()), default=SharerSelection.DEFAULT_POLICY,
+        help="how GET picks between the active sharers of a file"
+    )
+    parser.add_argument(
+        "--admin", action="append", default=[], metavar="USERNAME",
+        help="user allowed to request STATS (can be repeated)"
+    )
+    parser.add_argument(
+        "--stats-file", default=ServerMetrics.DEFAULT_DUMP_FILE,
+        help="file stats are appended to when the server gets SIGUSR1"
+    )
+    parser.add_argument("--rcvbuf", type=int, default=None, help="socket receive buffer size in bytes")
+    parser.add_argument("--sndbuf", type=int, default=None, help="socket send buffer size in bytes")
+    parser.add_argument(
+        "--log-level", choices=list(LogLevel.LEVELS.keys()), default="info",
+        help="lowest level of packet event that gets logged (default info, errors are warning)"
+    )
+    parser.add_argument(
+        "--log-sink", choices=list(NetworkLogger.SINKS.keys()), default="text",
+        help="log as text lines (default), JSON lines, or packed binary records"
+    )
+    parser.add_argument("--log-file", default=None, help="file to append the log to instead of stdout")
+    parser.add_argument(
+        "--log-sample", action="append", default=[], metavar="TYPE=N",
+        help="only log every Nth event of a packet type, e.g. HBT=100 (can be repeated)"
+    )
+
+    return parser.parse_args()
+
+def parse_sampling(samples: list[str]) -> dict[int, int]:
+    sampling: dict[int, int] = dict()
+    for sample in samples:
+        name, _, every = sample.partition("=")
+        packet_type: int | None = PacketTypes.get_type(name)
+
+        if packet_type == None or every.isnumeric() != True or int(every) <= 0:
+            print(f"Cannot run. Log samples look like HBT=100, got: {sample}")
+            exit()
+
+        sampling[packet_type] = int(every)
+
+    return sampling
 
 def main():
-    files_handler = UserFilesHandler()
-    users_handler = UserSessionsHandler()
-
-    packet_handler = ServerPacketHandler(files_handler, users_handler, Env.SERVER_IP, server_port)
-    server_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-    server_socket.bind((Env.SERVER_IP, server_port))
-
-    while True:
-        data: bytes = server_socket.recv(UDPPacket.UDP_PACKET_SIZE)
-        source_address: tuple[str, int] = (UDPPacketHandling.get_source_ip(data), UDPPacketHandling.get_source_port(data))
-        try:
-            response: bytes = packet_handler.receive_packet(data)
-
-            username: str = users_handler.get_user_from_addr((source_address[0], source_address[1]))
-            target: str = f"{source_address[0]}:{source_address[1]}" if username == None else username
-            NetworkLogger.log_sent_event(
-                PacketTypes.OK, 
-                source_address[1], 
-                target
-            )
-        except CorruptPacketError:
-            response: bytes = None
-        except Exception:
-            username: str = users_handler.get_user_from_addr((source_address[0], source_address[1]))
-            target: str = f"{source_address[0]}:{source_address[1]}" if username == None else username
-            NetworkLogger.log_sent_event(
-                PacketTypes.ERR, 
-                source_address[1], 
-                target
-            )
-
-            response: bytes = UDPPacketHandling.create_udp_packet(
-                Env.SERVER_IP, source_address[0], 
-                server_port, source_address[1], 
-                PacketTypes.ERR, "".encode("utf-8")
-            )
-
-        if response == None:
-            continue
-        
-        server_socket.sendto(response, source_address)
+    args: argparse.Namespace = parse_args()
+    server_port: int = args.server_port
+
+    # Set up before any workers fork, each one starts its own writer thread
+    NetworkLogger.configure(
+        LogLevel.LEVELS[args.log_level], args.log_sink, args.log_file, parse_sampling(args.log_sample)
+    )
+
+    socket_options: dict = {"receive_buffer": args.rcvbuf, "send_buffer": args.sndbuf}
+    engine_options: dict = {"batch_size": args.batch_size} if args.engine == "batched" else {}
+    handler_options: dict = {"cache_size": args.cache_size, "admins": args.admin, "stats_file": args.stats_file}
+    registry_options: dict = {"sharer_policy": args.sharer_policy}
+
+    if args.workers > 1 or args.shared_registry:
+        ServerWorkerPool(
+            args.workers, args.engine, Env.SERVER_IP, server_port,
+            socket_options, engine_options, handler_options, registry_options
+        ).run()
+        return
+
+    packet_handler = ServerPacketHandler(
+        Registry(sharer_policy=args.sharer_policy), Env.SERVER_IP, server_port, **handler_options
+    )
+    server_socket = ServerEngines.create_socket(Env.SERVER_IP, server_port, **socket_options)
+    packet_handler.install_stats_signal()
+
+    ServerEngines.run(args.engine, packet_handler, server_socket, **engine_options)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    try:
+        main()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,46 @@
+import os
+
+import pytest
+
+from tests.helpers import SERVER_ADDRESS, CREDENTIALS
+from utils.server.Registry import Registry
+from utils.server.ServerPacketHandler import ServerPacketHandler
+from utils.server.UserSessionsHandler import UserSessionsHandler
+from utils.client.FilesHandler import FilesHandler, LocalFileIndex
+from utils.client.Manifest import ManifestCache
+
+@pytest.fixture
+def users_handler(tmp_path, monkeypatch) -> UserSessionsHandler:
+    # The handler looks for credentials.txt under "../", so it's built somewhere
+    # empty and given its credentials directly
+    (tmp_path / "run").mkdir()
+    monkeypatch.chdir(tmp_path / "run")
+
+    handler = UserSessionsHandler()
+    handler.authenticator.credentials = dict(CREDENTIALS)
+
+    return handler
+
+@pytest.fixture
+def registry(users_handler) -> Registry:
+    return Registry(users_handler=users_handler)
+
+@pytest.fixture
+def server(registry) -> ServerPacketHandler:
+    return ServerPacketHandler(registry, *SERVER_ADDRESS, admins=["admin"])
+
+@pytest.fixture
+def shared_directory(tmp_path, monkeypatch) -> str:
+    # Where the peers share files from, FilesHandler indexes it instead of the working
+    # directory. Downloads land in a directory of their own, which becomes the cwd.
+    shared: str = str(tmp_path / "shared")
+    os.mkdir(shared)
+    os.mkdir(tmp_path / "downloads")
+
+    monkeypatch.setattr(FilesHandler, "index", LocalFileIndex(shared))
+    monkeypatch.setattr(ManifestCache, "manifests", dict())
+    monkeypatch.setattr(ManifestCache, "dirty", False)
+    monkeypatch.setattr(ManifestCache, "path", str(tmp_path / "manifests.json"))
+    monkeypatch.chdir(tmp_path / "downloads")
+
+    return shared
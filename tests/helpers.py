@@ -0,0 +1,64 @@
+import socket
+import threading
+from typing import Callable
+
+from utils.Globals import Env
+from utils.networking.UDPHandler import UDPPacketCodec
+from utils.server.ServerPacketHandler import ServerPacketHandler
+
+SERVER_ADDRESS: tuple[str, int] = (Env.SERVER_IP, 60000)
+
+CREDENTIALS: dict[str, str] = {
+    "alice": "pw1",
+    "bob": "pw2",
+    "carol": "pw3",
+    "admin": "pw4"
+}
+
+def client_address(port: int) -> tuple[str, int]:
+    return (Env.CLIENT_IP, port)
+
+def create_request(
+    src_address: tuple[str, int], message_type: int, payload: bytes | str, request_id: int = 0
+) -> bytes:
+    return UDPPacketCodec.encode(
+        src_address[0], SERVER_ADDRESS[0], src_address[1], SERVER_ADDRESS[1], message_type, payload, request_id
+    )
+
+def send(
+    handler: ServerPacketHandler, src_address: tuple[str, int], message_type: int, payload: bytes | str,
+    request_id: int = 0
+) -> bytes | None:
+    # One request through the handler, the reply copied out (or None if nothing went back)
+    result = handler.process_datagram(create_request(src_address, message_type, payload, request_id))
+    if result == None:
+        return None
+
+    response, address = result
+    assert address == src_address
+
+    return bytes(response)
+
+def start_peer(serve: Callable[[socket.socket], None]) -> tuple[str, int]:
+    # A TCP peer on its own port, every connection handed to serve on its own thread
+    listening_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listening_socket.bind((Env.CLIENT_IP, 0))
+    listening_socket.listen(16)
+
+    def accept() -> None:
+        while True:
+            connection, _ = listening_socket.accept()
+            threading.Thread(target=serve, args=(connection,), daemon=True).start()
+
+    threading.Thread(target=accept, daemon=True).start()
+
+    return listening_socket.getsockname()
+
+def closed_port() -> tuple[str, int]:
+    # Somewhere nothing is listening, connections to it are refused
+    probe = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    probe.bind((Env.CLIENT_IP, 0))
+    address: tuple[str, int] = probe.getsockname()
+    probe.close()
+
+    return address
@@ -0,0 +1,95 @@
+import os
+import socket
+
+from tests.helpers import client_address, send
+from tests.test_server_engines import start_server
+from utils.Globals import Env, PacketTypes, BatchStatus
+from utils.client.CommandHandler import CommandHandler
+from utils.networking.ClientTransport import ClientTransport
+from utils.networking.UDPHandler import UDPBatchPacket, UDPBpubPacket, UDPPacket, UDPPacketHandling
+
+ALICE: tuple[str, int] = client_address(50001)
+
+MANIFEST: dict = {"size": 10, "chunk_size": 4, "root": "ab" * 32}
+
+def get_statuses(reply: bytes) -> list[int]:
+    assert UDPPacketHandling.get_message_type(reply) == PacketTypes.OK
+    return UDPBatchPacket.get_reply_data(reply)["statuses"]
+
+def test_split_batches_fill_datagrams_in_order():
+    items: list[str] = [f"file_{index:04}.txt" for index in range(500)]
+    batches: list[list[str]] = UDPBatchPacket.split_batches(items)
+
+    assert len(batches) > 1
+    assert [item for batch in batches for item in batch] == items
+    for batch in batches:
+        assert len(UDPBatchPacket.ITEM_SEPARATOR.join(batch).encode("utf-8")) <= UDPPacket.UDP_MAX_PAYLOAD_SIZE
+
+    # One more item would have fitted in every batch but the last
+    for batch, following in zip(batches, batches[1:]):
+        joined: list[str] = batch + following[:1]
+        assert len(UDPBatchPacket.ITEM_SEPARATOR.join(joined).encode("utf-8")) > UDPPacket.UDP_MAX_PAYLOAD_SIZE
+
+    assert UDPBatchPacket.split_batches([]) == []
+
+def test_bpub_statuses_in_item_order(server):
+    send(server, ALICE, PacketTypes.AUTH, "alice,pw1,6000")
+    send(server, ALICE, PacketTypes.PUB, "old.txt")
+
+    items: list[str] = [
+        UDPBpubPacket.create_item("new.txt", MANIFEST),
+        "broken,1,2",
+        UDPBpubPacket.create_item("old.txt"),
+        UDPBpubPacket.create_item("plain.txt")
+    ]
+    reply: bytes = send(server, ALICE, PacketTypes.BPUB, UDPBatchPacket.ITEM_SEPARATOR.join(items), 5)
+
+    assert get_statuses(reply) == [
+        BatchStatus.OK, BatchStatus.INVALID, BatchStatus.ALREADY_PUBLISHED, BatchStatus.OK
+    ]
+    assert server.registry.files_handler.get_manifest("new.txt", "alice") == MANIFEST
+    assert sorted(server.registry.files_handler.get_shared_by("alice")) == ["new.txt", "old.txt", "plain.txt"]
+
+def test_bunp_statuses(server):
+    send(server, ALICE, PacketTypes.AUTH, "alice,pw1,6000")
+    send(server, ALICE, PacketTypes.PUB, "a.txt")
+
+    reply: bytes = send(server, ALICE, PacketTypes.BUNP, "a.txt\nnever.txt\na.txt", 5)
+
+    assert get_statuses(reply) == [BatchStatus.OK, BatchStatus.NOT_PUBLISHED, BatchStatus.NOT_PUBLISHED]
+    assert server.registry.files_handler.get_shared_by("alice") == []
+
+def test_batches_need_a_session(server):
+    reply: bytes = send(server, ALICE, PacketTypes.BPUB, "a.txt", 5)
+    assert UDPPacketHandling.get_message_type(reply) == PacketTypes.ERR
+
+def test_directory_published_and_unpublished(registry, shared_directory, capsys):
+    os.mkdir(os.path.join(shared_directory, "music"))
+    for filename in ["one.mp3", "two.mp3", "three.mp3.part"]:
+        with open(os.path.join(shared_directory, "music", filename), "wb") as f:
+            f.write(filename.encode())
+
+    server_address: tuple[str, int] = start_server(registry, "blocking")
+    client_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    client_socket.bind((Env.CLIENT_IP, 0))
+    transport = ClientTransport(client_socket, server_address)
+
+    try:
+        auth_packet: bytes = UDPPacketHandling.create_udp_packet(
+            transport.address[0], server_address[0], transport.address[1], server_address[1],
+            PacketTypes.AUTH, b"alice,pw1,6000"
+        )
+        assert UDPPacketHandling.get_message_type(transport.request(auth_packet)) == PacketTypes.OK
+        capsys.readouterr()
+
+        music: str = os.path.join(shared_directory, "music")
+        CommandHandler.handle_batch_pub(transport, music)
+        CommandHandler.handle_batch_pub(transport, music)
+        assert capsys.readouterr().out.splitlines() == ["2 files published", "0 files published, 2 already published"]
+        assert sorted(registry.files_handler.get_shared_by("alice")) == ["one.mp3", "two.mp3"]
+
+        CommandHandler.handle_batch_unp(transport, music)
+        assert capsys.readouterr().out.splitlines() == ["2 files unpublished"]
+        assert registry.files_handler.get_shared_by("alice") == []
+    finally:
+        client_socket.close()
@@ -0,0 +1,37 @@
+import os
+
+from benchmarks.checksum_bench import reference_checksum
+from utils.networking.Checksum import Checksum
+from utils.networking.UDPHandler import UDPPacketCodec, UDPPacketHandling
+from utils.Globals import PacketTypes
+
+SRC_IP = "127.0.0.1"
+DST_IP = "127.0.0.2"
+
+def test_matches_word_by_word_checksum():
+    # Odd and even lengths, the odd ones get padded with a zero byte
+    for size in [0, 1, 2, 3, 20, 1023, 1024]:
+        data: bytes = os.urandom(size)
+        assert Checksum.compute(SRC_IP, DST_IP, data) == reference_checksum(SRC_IP, DST_IP, data)
+
+def test_all_ones_sum_is_not_zero():
+    # Words summing to 0xFFFF have to come out as negative zero, not 0
+    for data in [b"\xff\xff", b"\x00\x00" * 4, b"\xff\xff" * 10]:
+        assert Checksum.compute(SRC_IP, DST_IP, data) == reference_checksum(SRC_IP, DST_IP, data)
+
+def test_packet_verifies_until_corrupted():
+    packet: bytearray = bytearray(UDPPacketCodec.encode(SRC_IP, DST_IP, 1000, 2000, PacketTypes.PUB, b"file.txt"))
+    assert UDPPacketHandling.verify_checksum(bytes(packet), DST_IP)
+
+    packet[-1] ^= 0x01
+    assert UDPPacketHandling.verify_checksum(bytes(packet), DST_IP) != True
+
+def test_wrong_destination_fails():
+    packet: bytes = UDPPacketCodec.encode(SRC_IP, DST_IP, 1000, 2000, PacketTypes.LAP, b"")
+    assert UDPPacketHandling.verify_checksum(packet, "10.0.0.1") != True
+
+def test_short_or_overlong_length_fails():
+    packet: bytes = UDPPacketCodec.encode(SRC_IP, DST_IP, 1000, 2000, PacketTypes.PUB, b"file.txt")
+
+    assert UDPPacketHandling.verify_checksum(packet[:10], DST_IP) != True
+    assert UDPPacketHandling.verify_checksum(packet[:-2], DST_IP) != True
@@ -0,0 +1,58 @@
+import os
+import time
+
+from utils.client.FilesHandler import FilesHandler, LocalFileIndex
+
+def write_file(path: str, data: bytes = b"data") -> None:
+    with open(path, "wb") as f:
+        f.write(data)
+
+def touch_directory(path: str) -> None:
+    # Some filesystems only keep coarse mtimes, so make sure the change is seen
+    future: float = time.time() + 5
+    os.utime(path, (future, future))
+
+def test_index_finds_nested_files(tmp_path):
+    os.makedirs(tmp_path / "a" / "b")
+    write_file(str(tmp_path / "top.txt"))
+    write_file(str(tmp_path / "a" / "b" / "deep.txt"), b"x" * 10)
+
+    index = LocalFileIndex(str(tmp_path))
+    index.build()
+
+    assert index.lookup("deep.txt")["size"] == 10
+    assert index.lookup("deep.txt")["path"] == str(tmp_path / "a" / "b" / "deep.txt")
+    assert index.lookup("missing.txt") == None
+
+def test_refresh_picks_up_added_and_removed_files(tmp_path):
+    write_file(str(tmp_path / "old.txt"))
+    index = LocalFileIndex(str(tmp_path))
+    index.build()
+
+    os.remove(tmp_path / "old.txt")
+    write_file(str(tmp_path / "new.txt"))
+    touch_directory(str(tmp_path))
+    index.refresh()
+
+    assert set(index.files) == {"new.txt"}
+
+def test_internal_files_not_indexed(tmp_path):
+    for filename in ["shared.txt", "movie.mp4.part", "movie.mp4.progress", "movie.mp4.progress.tmp", ".manifests.json", ".manifests.json.tmp"]:
+        write_file(str(tmp_path / filename))
+
+    index = LocalFileIndex(str(tmp_path))
+    index.build()
+
+    assert set(index.files) == {"shared.txt"}
+    assert index.lookup("movie.mp4.part") == None
+    assert index.lookup(".manifests.json") == None
+
+def test_internal_files_kept_out_of_directory_publish(shared_directory):
+    os.mkdir(os.path.join(shared_directory, "music"))
+    write_file(os.path.join(shared_directory, "music", "song.mp3"))
+    write_file(os.path.join(shared_directory, "music", "album.zip.part"))
+    write_file(os.path.join(shared_directory, "music", "album.zip.progress"))
+    write_file(os.path.join(shared_directory, "other.txt"))
+
+    assert set(FilesHandler.get_files_under(os.path.join(shared_directory, "music"))) == {"song.mp3"}
+    assert FilesHandler.file_exists("album.zip.part") != True
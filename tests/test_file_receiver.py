@@ -0,0 +1,63 @@
+import io
+import os
+import socket
+import hashlib
+import threading
+
+from utils.client.FileReceiver import FileReceiver
+
+def send_then_close(data: bytes) -> socket.socket:
+    # The receiving end of a connection that sends data in small pieces and hangs up
+    ours, theirs = socket.socketpair()
+
+    def send() -> None:
+        with theirs:
+            for offset in range(0, len(data), 1000):
+                theirs.sendall(data[offset:offset + 1000])
+
+    threading.Thread(target=send, daemon=True).start()
+    return ours
+
+def test_range_received_through_small_buffer():
+    data: bytes = os.urandom(10000)
+    f = io.BytesIO(b"\0" * 12000)
+    writes: list[int] = []
+    received: list[int] = []
+
+    receiver = FileReceiver(buffer_size=4096, hasher=hashlib.sha256())
+    with send_then_close(data) as connection:
+        position: int = receiver.receive(connection, f, 2000, 12000, writes.append, received.append)
+
+    assert position == 12000
+    assert f.getvalue()[2000:] == data
+    assert receiver.hasher.digest() == hashlib.sha256(data).digest()
+
+    # A write each time the buffer fills, and one for what's left at the end
+    assert writes == [6096, 10192, 12000]
+    assert received[-1] == len(data)
+
+def test_stops_at_end_of_range():
+    data: bytes = os.urandom(5000)
+    f = io.BytesIO()
+
+    with send_then_close(data) as connection:
+        assert FileReceiver(buffer_size=1024).receive(connection, f, 0, 3000) == 3000
+        assert f.getvalue() == data[:3000]
+
+def test_early_close_keeps_what_arrived():
+    data: bytes = os.urandom(3000)
+    f = io.BytesIO()
+    writes: list[int] = []
+
+    with send_then_close(data) as connection:
+        assert FileReceiver(buffer_size=1024).receive(connection, f, 0, 8000, writes.append) == 3000
+
+    assert f.getvalue() == data
+    assert writes[-1] == 3000
+
+def test_hash_file_feeds_what_is_on_disk():
+    data: bytes = os.urandom(5000)
+    receiver = FileReceiver(buffer_size=1024, hasher=hashlib.sha256())
+    receiver.hash_file(io.BytesIO(data), 1000, 4000)
+
+    assert receiver.hasher.digest() == hashlib.sha256(data[1000:4000]).digest()
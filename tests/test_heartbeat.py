@@ -0,0 +1,33 @@
+from tests.helpers import client_address, send
+from utils.Globals import PacketTypes
+from utils.networking.UDPHandler import UDPPacketHandling
+
+ALICE: tuple[str, int] = client_address(50001)
+
+def fail_dispatch(packet) -> None:
+    raise AssertionError("heartbeats should skip the general dispatch")
+
+def test_heartbeat_renews_without_a_reply(server, monkeypatch):
+    send(server, ALICE, PacketTypes.AUTH, "alice,pw1,6000")
+    monkeypatch.setattr(server, "receive_packet", fail_dispatch)
+
+    assert send(server, ALICE, PacketTypes.HBT, "alice,3,4") == None
+    assert server.metrics.packets[PacketTypes.HBT] == 1
+
+    # The load it reported is what sharers get picked by
+    candidates = server.registry.users_handler.get_sharer_candidates(["alice"])
+    assert [candidate["load"] for candidate in candidates] == [7]
+
+def test_heartbeat_without_session_gets_err(server, monkeypatch):
+    monkeypatch.setattr(server, "receive_packet", fail_dispatch)
+
+    reply: bytes = send(server, ALICE, PacketTypes.HBT, "alice,0,0", 12)
+    assert UDPPacketHandling.get_message_type(reply) == PacketTypes.ERR
+    assert UDPPacketHandling.get_request_id(reply) == 12
+    assert server.metrics.errors[PacketTypes.HBT] == 1
+
+def test_malformed_heartbeat_dropped(server):
+    send(server, ALICE, PacketTypes.AUTH, "alice,pw1,6000")
+
+    assert send(server, ALICE, PacketTypes.HBT, "alice,lots,0") == None
+    assert server.metrics.errors[PacketTypes.HBT] == 1
@@ -0,0 +1,47 @@
+import argparse
+
+import pytest
+
+from benchmarks.harness import TrackerProcess
+from benchmarks.load_test import LoadTest, DEFAULT_MIX, parse_mix, get_percentile, report, check_thresholds
+from utils.Globals import PacketTypes
+
+def test_parse_mix():
+    assert parse_mix("pub=2, SCH=4") == {PacketTypes.PUB: 2, PacketTypes.SCH: 4}
+
+    # Only requests whose ERR can be put down to the session (or GET) make sense here
+    with pytest.raises(argparse.ArgumentTypeError):
+        parse_mix("HBT=1")
+    with pytest.raises(argparse.ArgumentTypeError):
+        parse_mix("NOPE=1")
+
+def test_percentiles():
+    latencies: list[float] = [float(value) for value in range(1, 101)]
+
+    assert get_percentile([], 0.99) == 0
+    assert get_percentile(latencies, 0.5) == 51
+    assert get_percentile(latencies, 0.99) == 100
+    assert get_percentile(latencies, 0.999) == 100
+
+def test_short_run_against_local_tracker(capsys):
+    with TrackerProcess(["--log-level", "off"], num_users=20) as tracker:
+        test = LoadTest(tracker.port, 20, 200, parse_mix(DEFAULT_MIX), 1.0, 0)
+        try:
+            test.set_up()
+            elapsed: float = test.run(1.0)
+            lost_sessions: int = test.count_lost_sessions()
+        finally:
+            test.close()
+
+    results: dict = report(test.stats, elapsed, lost_sessions)
+
+    assert results["sent"] > 50
+    assert (results["expired"], results["lost_sessions"]) == (0, 0)
+    assert set(results["types"]) <= {"PUB", "UNP", "LAP", "LPF", "SCH", "GET", "AUTH"}
+
+    gates = argparse.Namespace(max_p99_ms=None, max_timeout_rate=1.0, max_expired=0, min_throughput=0.001)
+    assert check_thresholds(results, gates) == []
+
+    gates.min_throughput = 1e9
+    assert len(check_thresholds(results, gates)) == 1
+    assert "throughput" in capsys.readouterr().out
@@ -0,0 +1,89 @@
+import io
+import json
+from collections import deque
+
+import pytest
+
+from tests.helpers import client_address, send, create_request
+from utils.Globals import PacketTypes
+from utils.server.Logger import NetworkLogger, LogLevel, LogEvent, BinarySink
+
+ALICE: tuple[str, int] = client_address(50001)
+
+@pytest.fixture
+def log(monkeypatch):
+    # Whatever gets logged during the test, read back with log()
+    monkeypatch.setattr(NetworkLogger, "records", deque())
+    monkeypatch.setattr(NetworkLogger, "dropped", 0)
+    for name in ["level", "sampling", "sample_counts", "sink"]:
+        monkeypatch.setattr(NetworkLogger, name, getattr(NetworkLogger, name))
+
+    stream = io.StringIO()
+    NetworkLogger.configure(LogLevel.INFO)
+    NetworkLogger.sink = NetworkLogger.SINKS["text"](stream)
+
+    def read() -> list[str]:
+        # Only what's been logged since the last read, without the timestamps and ports
+        NetworkLogger.flush()
+        lines: list[str] = stream.getvalue().splitlines()
+        stream.seek(0)
+        stream.truncate()
+
+        return [line.split(": ", 2)[2] for line in lines]
+
+    return read
+
+def test_replies_logged_with_their_own_type(server, log):
+    send(server, ALICE, PacketTypes.AUTH, "alice,pw1,6000")
+    send(server, ALICE, PacketTypes.LAP, "")
+    send(server, ALICE, PacketTypes.GET, "missing.txt")
+
+    assert log() == [
+        f"Received AUTH from {ALICE[0]}:{ALICE[1]}", f"Sent OK to {ALICE[0]}:{ALICE[1]}",
+        "Received LAP from alice", "Sent PAGE to alice",
+        "Received GET from alice", "Sent ERR to alice"
+    ]
+
+def test_unknown_types_dropped_not_answered(server, log):
+    send(server, ALICE, PacketTypes.AUTH, "alice,pw1,6000")
+    log()
+
+    assert server.process_datagram(create_request(ALICE, 0x7777, "")) == None
+    assert server.unknown_packets == 1
+    assert 0x7777 not in server.metrics.packets
+    assert log() == [f"Dropped UNKNOWN ({0x7777}) from {ALICE[0]}:{ALICE[1]}"]
+
+def test_level_and_sampling(server, log):
+    NetworkLogger.level = LogLevel.WARNING
+    send(server, ALICE, PacketTypes.AUTH, "alice,pw1,6000")
+    send(server, ALICE, PacketTypes.LAP, "", 2)
+    assert log() == []
+
+    NetworkLogger.configure(LogLevel.INFO, sampling={PacketTypes.LAP: 2})
+    NetworkLogger.sink = NetworkLogger.SINKS["text"](io.StringIO())
+    for _ in range(4):
+        NetworkLogger.log_received_event(PacketTypes.LAP, 1, "alice")
+    assert len(NetworkLogger.records) == 2
+
+def test_full_queue_drops_records(log, monkeypatch):
+    monkeypatch.setattr(NetworkLogger, "MAX_QUEUED", 2)
+    for _ in range(5):
+        NetworkLogger.log_received_event(PacketTypes.LAP, 1, "alice")
+
+    assert (len(NetworkLogger.records), NetworkLogger.dropped) == (2, 3)
+
+def test_json_and_binary_sinks():
+    record = (1700000000.5, LogLevel.WARNING, LogEvent.DROPPED, 0x7777, 50001, "alice")
+
+    stream = io.StringIO()
+    NetworkLogger.SINKS["jsonl"](stream).write_batch([record])
+    assert json.loads(stream.getvalue()) == {
+        "time": 1700000000.5, "level": LogLevel.WARNING, "event": "dropped",
+        "type": "UNKNOWN", "port": 50001, "user": "alice"
+    }
+
+    binary = io.BytesIO()
+    BinarySink(binary).write_batch([record])
+    data: bytes = binary.getvalue()
+    assert BinarySink.RECORD.unpack_from(data) == record[:5] + (5,)
+    assert data[BinarySink.RECORD.size:] == b"alice"
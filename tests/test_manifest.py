@@ -0,0 +1,114 @@
+import os
+import socket
+
+import pytest
+
+from tests.helpers import start_peer, closed_port
+from utils.Globals import Manifests
+from utils.Exceptions import CorruptChunkError
+from utils.client.CommandHandler import CommandHandler
+from utils.client.FilesHandler import FilesHandler, LocalFile
+from utils.client.Manifest import Manifest, ChunkVerifier, ManifestCache
+from utils.networking.ClientServerConnector import ClientNetworkHandler
+from utils.networking.TCPHandler import PeerProtocol, PeerRequestData
+
+def write_file(directory: str, filename: str, size: int) -> bytes:
+    data: bytes = os.urandom(size)
+    with open(os.path.join(directory, filename), "wb") as f:
+        f.write(data)
+
+    return data
+
+def test_round_trip_and_corrupt_manifests(tmp_path):
+    write_file(str(tmp_path), "data.bin", 2500)
+    manifest: Manifest = Manifest.build(str(tmp_path / "data.bin"), chunk_size=1000)
+
+    assert (manifest.size, manifest.get_chunk_count(), manifest.get_chunk_range(2)) == (2500, 3, (2000, 2500))
+    assert Manifest.get_length(manifest.get_data()) == len(manifest.to_bytes())
+    assert Manifest.from_bytes(manifest.to_bytes()).root == manifest.root
+
+    with pytest.raises(CorruptChunkError):
+        Manifest.from_bytes(manifest.to_bytes()[:-1])
+    with pytest.raises(CorruptChunkError):
+        Manifest.from_bytes(manifest.to_bytes()[:-Manifest.DIGEST_SIZE])
+
+def test_verifier_flags_bad_chunks(tmp_path):
+    data: bytes = write_file(str(tmp_path), "data.bin", 2500)
+    manifest: Manifest = Manifest.build(str(tmp_path / "data.bin"), chunk_size=1000)
+
+    results: list[tuple[int, bool]] = []
+    verifier = ChunkVerifier(manifest, lambda index, verified: results.append((index, verified)))
+    corrupted: bytearray = bytearray(data)
+    corrupted[1500] ^= 0xFF
+    verifier.update(memoryview(corrupted))
+
+    assert results == [(0, True), (1, False), (2, True)]
+
+def test_fetch_checks_against_published_root(shared_directory):
+    write_file(shared_directory, "data.bin", 3000)
+    peer: tuple[str, int] = start_peer(ClientNetworkHandler.new_client)
+    expected: Manifest = Manifest.build(os.path.join(shared_directory, "data.bin"))
+
+    assert Manifest.fetch(peer, "data.bin", expected.get_data()).root == expected.root
+
+    with pytest.raises(CorruptChunkError):
+        Manifest.fetch(peer, "data.bin", dict(expected.get_data(), root="0" * 64))
+    with pytest.raises(CorruptChunkError):
+        Manifest.fetch(peer, "missing.bin", expected.get_data())
+
+def test_oversized_manifest_rejected(tmp_path):
+    write_file(str(tmp_path), "data.bin", 3000)
+    expected: Manifest = Manifest.build(str(tmp_path / "data.bin"))
+
+    def claim_huge_manifest(connection: socket.socket) -> None:
+        with connection:
+            connection.recv(1024)
+            connection.sendall(PeerProtocol.MANIFEST_REPLY.pack(0xFFFFFFFF))
+            connection.recv(1024)
+
+    with pytest.raises(ConnectionError):
+        Manifest.fetch(start_peer(claim_huge_manifest), "data.bin", expected.get_data())
+
+    # A published size that would need a huge manifest isn't even asked for
+    with pytest.raises(CorruptChunkError):
+        Manifest.fetch(closed_port(), "data.bin", dict(expected.get_data(), size=2 ** 50, chunk_size=1))
+
+def test_corrupt_chunk_fetched_again(shared_directory):
+    data: bytes = write_file(shared_directory, "data.bin", 3 * Manifests.CHUNK_SIZE)
+    manifest: Manifest = Manifest.build(os.path.join(shared_directory, "data.bin"))
+    ranges: list[tuple[int, int]] = []
+
+    def corrupt_once(connection: socket.socket) -> None:
+        # Flips a byte in the middle chunk the first time it's sent
+        request: PeerRequestData = PeerProtocol.parse_request(connection.recv(1024))
+        if request["manifest"] or len(ranges) > 0:
+            if request["manifest"] != True:
+                ranges.append((request["offset"], request["length"]))
+            ClientNetworkHandler.new_client(connection, None, request)
+            return
+
+        ranges.append((request["offset"], request["length"]))
+        with connection:
+            corrupted: bytearray = bytearray(data)
+            corrupted[Manifests.CHUNK_SIZE + 10] ^= 0xFF
+            connection.sendall(PeerProtocol.RANGE_REPLY.pack(len(data)) + corrupted)
+
+    CommandHandler.handle_get_transfer(start_peer(corrupt_once), "data.bin", manifest.get_data())
+
+    assert ranges[1:] == [(Manifests.CHUNK_SIZE, Manifests.CHUNK_SIZE)]
+    with open("data.bin", "rb") as f:
+        assert f.read() == data
+
+def test_cache_saved_and_loaded(shared_directory):
+    write_file(shared_directory, "data.bin", 3000)
+    local_file: LocalFile = FilesHandler.get_file("data.bin")
+    manifest: Manifest = ManifestCache.get(local_file)
+    assert ManifestCache.get(local_file) is manifest
+
+    ManifestCache.save()
+    assert ManifestCache.dirty != True
+
+    ManifestCache.manifests.clear()
+    ManifestCache.load(ManifestCache.path)
+    assert ManifestCache.get(local_file).root == manifest.root
+    assert ManifestCache.dirty != True
@@ -0,0 +1,38 @@
+import json
+
+from benchmarks.micro import get_codec_benchmarks, measure_memory, compare
+
+def load_baseline() -> dict:
+    with open("benchmarks/baseline.json") as f:
+        return json.load(f)
+
+def test_codec_benchmarks_run_and_are_in_baseline():
+    benchmarks = get_codec_benchmarks()
+    for name in ["UDPBpubPacket", "UDPBunpPacket", "UDPBatchPacket.reply"]:
+        assert f"codec.get_data.{name}" in benchmarks
+
+    # Every item of a batch parses, so the timings aren't of the error path
+    assert None not in benchmarks["codec.get_data.UDPBpubPacket"]()["items"]
+    for function in benchmarks.values():
+        function()
+
+    assert set(benchmarks) <= set(load_baseline()["results"])
+
+def test_baseline_recorded_on_pinned_python():
+    with open(".python-version") as f:
+        pinned: list[str] = f.read().strip().split(".")
+
+    assert load_baseline()["python"].split(".")[:2] == pinned[:2]
+
+def test_compare_flags_slowdowns(capsys):
+    baseline: dict = {"a": {"ops_per_sec": 100}, "b": {"ops_per_sec": 100}}
+    results: dict = {"a": {"ops_per_sec": 85}, "b": {"ops_per_sec": 70}, "c": {"ops_per_sec": 1}}
+
+    assert compare(results, baseline, 0.2) == ["b"]
+    assert "new" in capsys.readouterr().out
+
+def test_memory_counts_allocations():
+    memory: dict = measure_memory(lambda: bytearray(100000), 3)
+
+    assert memory["peak_bytes"] >= 100000
+    assert memory["retained_bytes"] < 1000
@@ -0,0 +1,75 @@
+import pytest
+
+from tests.helpers import client_address, send
+from utils.Exceptions import ResultExpired
+from utils.Globals import PacketTypes, Paging
+from utils.networking.UDPHandler import UDPPagePacket, UDPPacketHandling, UDPPacket
+from utils.server.ResultPager import ResultPager
+
+ALICE: tuple[str, int] = client_address(50001)
+
+def read_page(payload: bytes) -> tuple[int, int, bool, int, list[str]]:
+    token, index, more, total = UDPPagePacket.PREFIX.unpack_from(payload)
+    items: str = str(payload[UDPPagePacket.PREFIX.size:], "utf-8")
+
+    return (token, index, bool(more), total, items.split(",") if items != "" else [])
+
+def test_small_result_is_one_page():
+    token, index, more, total, items = read_page(ResultPager().get_first_page(["a", "b"]))
+    assert (token, index, more, total, items) == (0, 0, False, 2, ["a", "b"])
+
+def test_pages_fit_and_cover_everything():
+    pager = ResultPager()
+    names: list[str] = [f"file_{number:05}.txt" for number in range(500)]
+
+    token, index, more, total, items = read_page(pager.get_first_page(names))
+    assert token != 0 and more and total == 500
+
+    fetched: list[str] = list(items)
+    while more:
+        payload: bytes = pager.get_page(token, index + 1)
+        assert len(payload) <= UDPPacket.UDP_MAX_PAYLOAD_SIZE
+
+        token, index, more, _, items = read_page(payload)
+        fetched += items
+
+    assert fetched == names
+
+def test_unknown_token_expired():
+    with pytest.raises(ResultExpired):
+        ResultPager().get_page(1234, 1)
+
+def test_page_index_bounded(monkeypatch):
+    # The index is 2 bytes on the wire, the last page that fits says there's no more
+    monkeypatch.setattr(Paging, "MAX_PAGES", 3)
+    pager = ResultPager()
+    names: list[str] = ["x" * 500 for _ in range(10)]
+
+    token, *_ = read_page(pager.get_first_page(names))
+    assert read_page(pager.get_page(token, 1))[2] == True
+
+    _, index, more, total, _ = read_page(pager.get_page(token, 2))
+    assert (index, more, total) == (2, False, 10)
+
+    with pytest.raises(ResultExpired):
+        pager.get_page(token, 3)
+
+def test_nxt_through_server(server, registry):
+    send(server, ALICE, PacketTypes.AUTH, "alice,pw1,6001")
+    names: list[str] = [f"report_{number:04}.pdf" for number in range(300)]
+    registry.publish(ALICE, [(name, None) for name in names])
+
+    page = UDPPagePacket.get_data(send(server, ALICE, PacketTypes.SCH, "report", 1))
+    fetched: list[str] = list(page["items"])
+    while page["more"]:
+        reply: bytes = send(server, ALICE, PacketTypes.NXT, f"{page['token']},{page['index'] + 1}", 2)
+        assert UDPPacketHandling.get_request_id(reply) == 2
+        page = UDPPagePacket.get_data(reply)
+        fetched += page["items"]
+
+    assert page["total"] == 300
+    assert fetched == names
+
+    # A token that was never handed out gets an ERR
+    reply = send(server, ALICE, PacketTypes.NXT, "1,1", 3)
+    assert UDPPacketHandling.get_message_type(reply) == PacketTypes.ERR
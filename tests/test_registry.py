@@ -0,0 +1,75 @@
+from tests.helpers import SERVER_ADDRESS, client_address, send
+from utils.Globals import PacketTypes
+from utils.networking.UDPHandler import UDPPacketHandling, UDPGetPacket
+from utils.server.Registry import Registry
+from utils.server.ServerPacketHandler import ServerPacketHandler
+
+ALICE: tuple[str, int] = client_address(50001)
+BOB: tuple[str, int] = client_address(50002)
+
+class CountingRegistry:
+    # Stands in for the workers' proxy, where every call is a round trip
+    def __init__(self, registry: Registry) -> None:
+        self.registry = registry
+        self.calls: list[str] = []
+
+    def __getattr__(self, name: str):
+        method = getattr(self.registry, name)
+
+        def call(*args, **kwargs):
+            self.calls.append(name)
+            return method(*args, **kwargs)
+
+        return call
+
+def test_one_registry_call_per_request(registry):
+    counting = CountingRegistry(registry)
+    server = ServerPacketHandler(counting, *SERVER_ADDRESS)
+
+    requests: list[tuple[tuple[str, int], int, str]] = [
+        (ALICE, PacketTypes.AUTH, "alice,pw1,6001"),
+        (BOB, PacketTypes.AUTH, "bob,pw2,6002"),
+        (ALICE, PacketTypes.PUB, "a.txt"),
+        (BOB, PacketTypes.GET, "a.txt"),
+        (BOB, PacketTypes.SWM, "a.txt,4"),
+        (BOB, PacketTypes.LAP, ""),
+        (BOB, PacketTypes.LAP, ""),
+        (BOB, PacketTypes.SCH, "a"),
+        (ALICE, PacketTypes.LPF, ""),
+        (ALICE, PacketTypes.UNP, "a.txt"),
+        (BOB, PacketTypes.GET, "a.txt"),
+        (ALICE, PacketTypes.BPUB, "b.txt\nc.txt"),
+        (ALICE, PacketTypes.BUNP, "b.txt\nc.txt"),
+    ]
+
+    for count, (address, message_type, payload) in enumerate(requests, start=1):
+        assert send(server, address, message_type, payload) != None
+        assert len(counting.calls) == count
+
+def test_get_returns_sharer_listening_address(server):
+    send(server, ALICE, PacketTypes.AUTH, "alice,pw1,6001")
+    send(server, BOB, PacketTypes.AUTH, "bob,pw2,6002")
+    send(server, ALICE, PacketTypes.PUB, "a.txt")
+
+    reply: bytes = send(server, BOB, PacketTypes.GET, "a.txt")
+    assert UDPPacketHandling.get_message_type(reply) == PacketTypes.OK
+    assert UDPGetPacket.get_reply_data(reply)["address"] == (ALICE[0], 6001)
+
+def test_requests_from_nobody_get_nothing_done(registry):
+    assert registry.identify(ALICE) == None
+    assert registry.publish(ALICE, [("a.txt", None)]) == (None, None)
+    assert registry.get_sharers(ALICE, "a.txt", 1) == (None, None, None)
+    assert registry.files_handler.get_catalog_size() == 0
+
+def test_cached_generation_skips_items(registry):
+    assert registry.authenticate("alice", "pw1", 6001, ALICE)
+    registry.publish(ALICE, [("a.txt", None)])
+
+    username, generation, items = registry.get_published(ALICE, None)
+    assert (username, items) == ("alice", ["a.txt"])
+
+    # Nothing changed, so only the generation comes back
+    assert registry.get_published(ALICE, generation) == ("alice", generation, None)
+
+    registry.publish(ALICE, [("b.txt", None)])
+    assert registry.get_published(ALICE, generation)[2] == ["a.txt", "b.txt"]
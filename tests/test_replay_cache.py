@@ -0,0 +1,67 @@
+import pytest
+
+from tests.helpers import client_address, send, create_request
+from utils.Globals import PacketTypes
+from utils.server.ReplayCache import ReplayCache
+
+ALICE: tuple[str, int] = client_address(50001)
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now: float = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch) -> FakeClock:
+    clock = FakeClock()
+    monkeypatch.setattr("utils.server.ReplayCache.time.monotonic", clock)
+    return clock
+
+def test_only_tagged_changes_replayed():
+    assert ReplayCache.is_replayed(PacketTypes.PUB, 7)
+    assert ReplayCache.is_replayed(PacketTypes.PUB, 0) != True
+    assert ReplayCache.is_replayed(PacketTypes.LAP, 7) != True
+
+def test_replayed_only_for_the_same_request(clock):
+    cache = ReplayCache(ttl=5)
+    cache.put(ALICE, 7, b"request", b"reply")
+
+    assert cache.get(ALICE, 7, b"request") == b"reply"
+    assert cache.get(ALICE, 7, b"different request") == None
+    assert cache.get(client_address(50002), 7, b"request") == None
+    assert cache.replays == 1
+
+def test_entries_expire(clock):
+    cache = ReplayCache(ttl=5)
+    cache.put(ALICE, 1, b"first", b"reply")
+    clock.now += 3
+    cache.put(ALICE, 2, b"second", b"reply")
+
+    clock.now += 2
+    assert cache.get(ALICE, 1, b"first") == None
+    assert cache.get(ALICE, 2, b"second") == b"reply"
+
+    cache.remove_expired()
+    assert list(cache.entries) == [(ALICE, 2)]
+
+def test_capacity_drops_oldest():
+    cache = ReplayCache(capacity=2)
+    for request_id in range(1, 4):
+        cache.put(ALICE, request_id, b"request", b"reply")
+
+    assert [request_id for _, request_id in cache.entries] == [2, 3]
+
+def test_retransmitted_pub_gets_first_reply(server):
+    send(server, ALICE, PacketTypes.AUTH, "alice,pw1,6000")
+
+    first: bytes = send(server, ALICE, PacketTypes.PUB, "notes.pdf", 9)
+    again: bytes = send(server, ALICE, PacketTypes.PUB, "notes.pdf", 9)
+    assert first == again
+    assert first[8:10] == PacketTypes.OK.to_bytes(2, "big")
+
+    # Same ID but not the same request, so it's really done
+    send(server, ALICE, PacketTypes.PUB, "slides.pdf", 9)
+    assert server.replay_cache.replays == 1
+    assert sorted(server.registry.files_handler.get_shared_by("alice")) == ["notes.pdf", "slides.pdf"]
@@ -0,0 +1,64 @@
+from tests.helpers import client_address, send
+from utils.Globals import PacketTypes
+from utils.networking.UDPHandler import UDPPagePacket
+from utils.server.ResponseCache import ResponseCache
+
+ALICE: tuple[str, int] = client_address(50001)
+BOB: tuple[str, int] = client_address(50002)
+
+def test_generation_mismatch_is_a_miss():
+    cache = ResponseCache()
+    cache.put(("SCH", "a"), (1,), b"page")
+
+    assert cache.get(("SCH", "a"), (1,)) == b"page"
+    assert cache.get(("SCH", "a"), (2,)) == None
+    assert cache.get_stats() == {"hits": 1, "misses": 1, "entries": 1}
+
+def test_invalid_entry_is_a_miss():
+    cache = ResponseCache()
+    cache.put(("SCH", "a"), (1,), b"page")
+
+    assert cache.get(("SCH", "a"), (1,), lambda payload: False) == None
+    assert cache.peek(("SCH", "a"), lambda payload: False) == None
+    assert cache.peek(("SCH", "a")) == (1,)
+
+def test_least_recently_used_goes_first():
+    cache = ResponseCache(capacity=2)
+    cache.put("a", (1,), b"a")
+    cache.put("b", (1,), b"b")
+    cache.get("a", (1,))
+    cache.put("c", (1,), b"c")
+
+    assert list(cache.entries) == ["a", "c"]
+
+def test_disabled():
+    cache = ResponseCache(capacity=0)
+    cache.put("a", (1,), b"a")
+
+    assert cache.get("a", (1,)) == None
+
+def test_server_results_go_stale_on_change(server):
+    send(server, ALICE, PacketTypes.AUTH, "alice,pw1,6001")
+    send(server, ALICE, PacketTypes.PUB, "a.txt")
+
+    assert UDPPagePacket.get_data(send(server, ALICE, PacketTypes.SCH, "txt"))["items"] == ["a.txt"]
+    assert UDPPagePacket.get_data(send(server, ALICE, PacketTypes.SCH, "txt"))["items"] == ["a.txt"]
+    assert server.response_cache.hits == 1
+
+    send(server, ALICE, PacketTypes.PUB, "b.txt")
+    assert UDPPagePacket.get_data(send(server, ALICE, PacketTypes.SCH, "txt"))["items"] == ["a.txt", "b.txt"]
+
+    # LAP is cached per address, and a new login changes it
+    assert UDPPagePacket.get_data(send(server, ALICE, PacketTypes.LAP, ""))["items"] == []
+    send(server, BOB, PacketTypes.AUTH, "bob,pw2,6002")
+    assert UDPPagePacket.get_data(send(server, ALICE, PacketTypes.LAP, ""))["items"] == ["bob"]
+    assert UDPPagePacket.get_data(send(server, BOB, PacketTypes.LAP, ""))["items"] == ["alice"]
+
+def test_lpf_not_shared_between_users_on_one_address(server):
+    send(server, ALICE, PacketTypes.AUTH, "alice,pw1,6001")
+    send(server, ALICE, PacketTypes.PUB, "a.txt")
+    assert UDPPagePacket.get_data(send(server, ALICE, PacketTypes.LPF, ""))["items"] == ["a.txt"]
+
+    # bob takes over the address, the cached LPF was alice's
+    send(server, ALICE, PacketTypes.AUTH, "bob,pw2,6002")
+    assert UDPPagePacket.get_data(send(server, ALICE, PacketTypes.LPF, ""))["items"] == []
@@ -0,0 +1,83 @@
+import os
+import socket
+
+from tests.helpers import start_peer
+from utils.client.CommandHandler import CommandHandler
+from utils.client.DownloadProgress import DownloadProgress
+from utils.networking.ClientServerConnector import ClientNetworkHandler
+from utils.networking.TCPHandler import PeerProtocol, PeerRequestData
+
+def test_ranges_merge_and_missing():
+    progress = DownloadProgress("a.bin")
+    progress.add_range(10, 20)
+    progress.add_range(30, 40)
+    progress.add_range(20, 25)
+    progress.add_range(5, 5)
+
+    assert progress.ranges == [[10, 25], [30, 40]]
+    assert progress.get_received() == 25
+    assert progress.get_missing(50) == [(0, 10), (25, 30), (40, 50)]
+
+def test_record_without_part_is_ignored(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    progress = DownloadProgress("a.bin")
+    progress.size = 100
+    progress.add_range(0, 50)
+    progress.save()
+
+    assert DownloadProgress.load("a.bin").is_resuming() != True
+
+    open("a.bin.part", "wb").close()
+    loaded: DownloadProgress = DownloadProgress.load("a.bin")
+    assert (loaded.size, loaded.ranges) == (100, [[0, 50]])
+
+def request_range(peer: tuple[str, int], offset: int, length: int) -> tuple[int, bytes]:
+    connection, size = PeerProtocol.request_range(peer, "data.bin", offset, length, 5)
+    with connection:
+        data: bytearray = bytearray()
+        while chunk := connection.recv(65536):
+            data += chunk
+
+    return (size, bytes(data))
+
+def test_range_requests_served(shared_directory):
+    data: bytes = os.urandom(5000)
+    with open(os.path.join(shared_directory, "data.bin"), "wb") as f:
+        f.write(data)
+
+    peer: tuple[str, int] = start_peer(ClientNetworkHandler.new_client)
+
+    assert request_range(peer, 100, 200) == (5000, data[100:300])
+    assert request_range(peer, 4900, PeerProtocol.TO_END) == (5000, data[4900:])
+    assert request_range(peer, 4990, 100) == (5000, data[4990:])
+    assert request_range(peer, 9000, 100) == (5000, b"")
+
+def test_interrupted_get_resumes_where_it_stopped(shared_directory):
+    data: bytes = os.urandom(300 * 1024)
+    with open(os.path.join(shared_directory, "data.bin"), "wb") as f:
+        f.write(data)
+
+    requests: list[PeerRequestData] = []
+
+    def stop_early(connection: socket.socket) -> None:
+        # Sends the first 100KB of whatever's asked for, then hangs up
+        with connection:
+            request: PeerRequestData = PeerProtocol.parse_request(connection.recv(1024))
+            connection.sendall(PeerProtocol.RANGE_REPLY.pack(len(data)))
+            connection.sendall(data[request["offset"]:request["offset"] + 100 * 1024])
+
+    def record(connection: socket.socket) -> None:
+        request: PeerRequestData = PeerProtocol.parse_request(connection.recv(1024, socket.MSG_PEEK))
+        requests.append(request)
+        ClientNetworkHandler.new_client(connection)
+
+    CommandHandler.handle_get_transfer(start_peer(stop_early), "data.bin")
+    assert os.path.exists("data.bin") != True
+    assert DownloadProgress.load("data.bin").ranges == [[0, 100 * 1024]]
+
+    CommandHandler.handle_get_transfer(start_peer(record), "data.bin")
+    assert [(request["offset"], request["length"]) for request in requests] == [(100 * 1024, 200 * 1024)]
+
+    with open("data.bin", "rb") as f:
+        assert f.read() == data
+    assert sorted(os.listdir(".")) == ["data.bin"]
@@ -0,0 +1,50 @@
+from utils.server.NgramIndex import NgramIndex
+from utils.server.UserFilesHandler import UserFilesHandler
+
+def test_candidates_contain_every_match():
+    index = NgramIndex()
+    for key in ["report.pdf", "reports.zip", "notes.txt", "trepo.md"]:
+        index.add(key)
+
+    assert index.get_candidates("report") == {"report.pdf", "reports.zip"}
+    assert index.get_candidates("xyz") == set()
+
+    # Shorter than a gram, the caller has to scan
+    assert index.get_candidates("re") == None
+
+def test_candidates_give_up_when_too_common():
+    index = NgramIndex()
+    for number in range(10):
+        index.add(f"report{number}.pdf")
+
+    assert index.get_candidates("report", max_candidates=5) == None
+    assert len(index.get_candidates("report", max_candidates=10)) == 10
+
+def test_removed_keys_leave_no_postings():
+    index = NgramIndex()
+    index.add("notes.txt")
+    index.remove("notes.txt")
+
+    assert index.postings == {}
+
+def test_matching_in_publish_order():
+    files = UserFilesHandler()
+    names: list[str] = [f"file{number:03}.txt" for number in range(200)] + ["zzz_report.txt", "aaa_report.txt"]
+    for name in names:
+        files.add_file("alice", name)
+
+    # Selective query goes through the index, common one scans, both in publish order
+    assert files.get_matching("report") == ["zzz_report.txt", "aaa_report.txt"]
+    assert files.get_matching("file") == names[:200]
+    assert files.get_matching("fi") == names[:200]
+    assert files.get_matching("file05") == [f"file{number:03}.txt" for number in range(50, 60)]
+
+def test_matching_same_as_scan():
+    files = UserFilesHandler()
+    names: list[str] = [f"{word}{number}.dat" for number in range(50) for word in ["alpha", "beta", "gamma"]]
+    for name in names:
+        files.add_file("bob", name)
+    files.remove_file("bob", "beta7.dat")
+
+    for query in ["alpha", "beta7", "a1", "ma4", "dat", "nothing", ""]:
+        assert files.get_matching(query) == [name for name in files.shared_files if query in name]
@@ -0,0 +1,104 @@
+import socket
+import threading
+
+from tests.helpers import create_request
+from utils.Globals import Env, PacketTypes
+from utils.networking.UDPHandler import UDPPacketCodec, UDPPacketHandling, UDPPagePacket, UDPPacket
+from utils.server.ServerEngines import ServerEngines
+from utils.server.ServerPacketHandler import ServerPacketHandler
+
+def start_server(registry, engine: str, **engine_options) -> tuple[str, int]:
+    # Engines run until the process exits, so they're left on a daemon thread
+    server_socket: socket.socket = ServerEngines.create_socket(Env.SERVER_IP, 0)
+    address: tuple[str, int] = server_socket.getsockname()
+    handler = ServerPacketHandler(registry, *address)
+
+    threading.Thread(
+        target=ServerEngines.run, args=(engine, handler, server_socket), kwargs=engine_options, daemon=True
+    ).start()
+
+    return address
+
+def connect() -> socket.socket:
+    client_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    client_socket.bind((Env.CLIENT_IP, 0))
+    client_socket.settimeout(2)
+
+    return client_socket
+
+def request(
+    client_socket: socket.socket, server_address: tuple[str, int], message_type: int, payload: str,
+    request_id: int = 0
+) -> bytes:
+    src_address: tuple[str, int] = client_socket.getsockname()
+    client_socket.sendto(
+        UDPPacketCodec.encode(
+            src_address[0], server_address[0], src_address[1], server_address[1], message_type, payload, request_id
+        ),
+        server_address
+    )
+
+    return client_socket.recv(UDPPacket.UDP_PACKET_SIZE)
+
+def check_engine(registry, engine: str, **engine_options) -> None:
+    server_address: tuple[str, int] = start_server(registry, engine, **engine_options)
+    client_socket: socket.socket = connect()
+
+    with client_socket:
+        reply: bytes = request(client_socket, server_address, PacketTypes.AUTH, "alice,pw1,6000", 1)
+        assert UDPPacketHandling.get_message_type(reply) == PacketTypes.OK
+        assert UDPPacketHandling.get_request_id(reply) == 1
+        assert UDPPacketHandling.verify_checksum(reply, Env.CLIENT_IP)
+
+        assert UDPPacketHandling.get_message_type(
+            request(client_socket, server_address, PacketTypes.PUB, "a.txt", 2)
+        ) == PacketTypes.OK
+
+        reply = request(client_socket, server_address, PacketTypes.LPF, "", 3)
+        assert UDPPagePacket.get_data(reply)["items"] == ["a.txt"]
+
+def test_blocking_engine(registry):
+    check_engine(registry, "blocking")
+
+def test_asyncio_engine(registry):
+    check_engine(registry, "asyncio")
+
+def test_asyncio_engine_drops_corrupt(registry):
+    server_address: tuple[str, int] = start_server(registry, "asyncio")
+    client_socket: socket.socket = connect()
+
+    with client_socket:
+        packet: bytearray = bytearray(create_request(client_socket.getsockname(), PacketTypes.AUTH, "alice,pw1,6000"))
+        packet[-1] ^= 0xFF
+        client_socket.sendto(bytes(packet), server_address)
+
+        # Nothing comes back for the corrupt one, and the server is still answering after it
+        reply: bytes = request(client_socket, server_address, PacketTypes.AUTH, "alice,pw1,6000", 9)
+        assert UDPPacketHandling.get_request_id(reply) == 9
+
+def test_batched_engine(registry):
+    check_engine(registry, "batched", batch_size=4)
+
+def test_batched_engine_burst(registry):
+    # More datagrams than fit in a batch, all sent before any reply is read, so
+    # every reply in a batch has to come out intact and matched to its request
+    server_address: tuple[str, int] = start_server(registry, "batched", batch_size=4)
+    client_socket: socket.socket = connect()
+
+    with client_socket:
+        request(client_socket, server_address, PacketTypes.AUTH, "alice,pw1,6000", 1)
+
+        src_address: tuple[str, int] = client_socket.getsockname()
+        for request_id in range(2, 22):
+            client_socket.sendto(
+                create_request(src_address, PacketTypes.PUB, f"file{request_id}.txt", request_id), server_address
+            )
+
+        replies: dict[int, int] = dict()
+        for _ in range(20):
+            reply: bytes = client_socket.recv(UDPPacket.UDP_PACKET_SIZE)
+            assert UDPPacketHandling.verify_checksum(reply, Env.CLIENT_IP)
+            replies[UDPPacketHandling.get_request_id(reply)] = UDPPacketHandling.get_message_type(reply)
+
+        assert replies == {request_id: PacketTypes.OK for request_id in range(2, 22)}
+        assert registry.files_handler.get_catalog_size() == 20
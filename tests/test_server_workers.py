@@ -0,0 +1,122 @@
+import os
+import sys
+import time
+import signal
+import socket
+
+import pytest
+
+from benchmarks.harness import TrackerProcess, SimClient, user_credentials
+from utils.Globals import Env, PacketTypes
+from utils.server.ServerWorkers import ServerWorkerPool
+
+pytestmark = pytest.mark.skipif(
+    sys.platform.startswith("linux") != True, reason="needs SO_REUSEPORT, fork and /proc"
+)
+
+def get_port_owners(port: int) -> set[int]:
+    # Pids with a UDP socket bound to the port, going from /proc/net/udp inodes to fds
+    inodes: set[str] = set()
+    with open("/proc/net/udp") as udp:
+        for line in udp.readlines()[1:]:
+            fields: list[str] = line.split()
+            if int(fields[1].split(":")[1], 16) == port:
+                inodes.add(f"socket:[{fields[9]}]")
+
+    owners: set[int] = set()
+    for pid in filter(str.isdigit, os.listdir("/proc")):
+        try:
+            for fd in os.listdir(f"/proc/{pid}/fd"):
+                if os.readlink(f"/proc/{pid}/fd/{fd}") in inodes:
+                    owners.add(int(pid))
+        except OSError:
+            continue
+
+    return owners
+
+def get_children(pid: int) -> set[int]:
+    with open(f"/proc/{pid}/task/{pid}/children") as children:
+        return {int(child) for child in children.read().split()}
+
+def wait_for(condition, timeout: float = 10.0) -> bool:
+    deadline: float = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.05)
+
+    return False
+
+def is_running(pid: int) -> bool:
+    try:
+        with open(f"/proc/{pid}/stat") as stat:
+            # Zombies have exited, they're just waiting to be reaped
+            return stat.read().split(")")[-1].split()[0] != "Z"
+    except FileNotFoundError:
+        return False
+
+def test_sigterm_stops_workers_and_registry():
+    with TrackerProcess(["--workers", "2"], num_users=4) as tracker:
+        assert wait_for(lambda: len(get_port_owners(tracker.port)) == 2)
+
+        # Two workers and the registry process
+        children: set[int] = get_children(tracker.process.pid)
+        assert len(children) == 3
+
+        os.kill(tracker.process.pid, signal.SIGTERM)
+        assert tracker.process.wait(timeout=10) == 0
+
+        assert wait_for(lambda: not any(is_running(child) for child in children))
+
+        # Nothing is left sharing the port, so it binds without SO_REUSEPORT
+        probe = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        probe.bind((Env.SERVER_IP, tracker.port))
+        probe.close()
+
+def test_dead_worker_is_restarted():
+    with TrackerProcess(["--workers", "2"], num_users=4) as tracker:
+        assert wait_for(lambda: len(get_port_owners(tracker.port)) == 2)
+        workers: set[int] = get_port_owners(tracker.port)
+
+        # Only workers that stayed up a while get restarted
+        time.sleep(ServerWorkerPool.MIN_UPTIME + 0.5)
+        killed: int = min(workers)
+        os.kill(killed, signal.SIGKILL)
+
+        assert wait_for(lambda: len(get_port_owners(tracker.port) - {killed}) == 2)
+        assert killed not in get_port_owners(tracker.port)
+
+        # Sessions live in the registry process, so they're all still served
+        client = SimClient(tracker.port, *user_credentials(0))
+        try:
+            assert client.authenticate()
+            assert client.request(PacketTypes.LAP)[0] == PacketTypes.PAGE
+        finally:
+            client.close()
+
+        assert tracker.process.poll() == None
+
+def test_sigusr1_dumps_every_worker(tmp_path):
+    stats_file: str = str(tmp_path / "stats.txt")
+    with TrackerProcess(["--workers", "2", "--stats-file", stats_file], num_users=4) as tracker:
+        assert wait_for(lambda: len(get_port_owners(tracker.port)) == 2)
+        workers: set[int] = get_port_owners(tracker.port)
+
+        def get_dumped_pids() -> set[int]:
+            if os.path.exists(stats_file) != True:
+                return set()
+            with open(stats_file) as f:
+                return {int(line[len("pid="):]) for line in f if line.startswith("pid=")}
+
+        # Forwarded to the workers, which dump at their next housekeeping
+        os.kill(tracker.process.pid, signal.SIGUSR1)
+        assert wait_for(lambda: get_dumped_pids() == workers)
+
+        # And they're still serving afterwards
+        assert get_port_owners(tracker.port) == workers
+        client = SimClient(tracker.port, *user_credentials(0))
+        try:
+            assert client.authenticate()
+            assert client.request(PacketTypes.LAP)[0] == PacketTypes.PAGE
+        finally:
+            client.close()
@@ -0,0 +1,85 @@
+import pytest
+
+from utils.Exceptions import UserAuthError
+from utils.Globals import Env, Sessions
+from utils.server import UserSessionsHandler as sessions_module
+
+ALICE: tuple[str, int] = (Env.CLIENT_IP, 50001)
+BOB: tuple[str, int] = (Env.CLIENT_IP, 50002)
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now: float = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch) -> FakeClock:
+    fake = FakeClock()
+    monkeypatch.setattr(sessions_module.time, "monotonic", fake.monotonic)
+
+    return fake
+
+def test_session_expires(users_handler, clock):
+    users_handler.generate_session("alice", "pw1", 6001, ALICE)
+    generation: int = users_handler.get_generation()
+
+    clock.now += Sessions.INACTIVE_TIMEOUT - 0.1
+    assert users_handler.get_active_users() == ["alice"]
+
+    clock.now += 0.2
+    assert users_handler.get_active_users() == []
+    assert users_handler.get_active_user(ALICE) == None
+    assert users_handler.user_sessions == {}
+    assert users_handler.get_generation() == generation + 1
+
+def test_renewal_keeps_one_heap_entry(users_handler, clock):
+    users_handler.generate_session("alice", "pw1", 6001, ALICE)
+
+    for _ in range(20):
+        clock.now += Sessions.INACTIVE_TIMEOUT - 0.5
+        assert users_handler.renew_from_address(ALICE, 1, 2) == "alice"
+        users_handler.remove_expired_sessions()
+
+    assert users_handler.get_active_users() == ["alice"]
+    assert len(users_handler.expiry_heap) == 1
+
+def test_sessions_expire_in_deadline_order(users_handler, clock):
+    users_handler.generate_session("alice", "pw1", 6001, ALICE)
+    clock.now += 1
+    users_handler.generate_session("bob", "pw2", 6002, BOB)
+
+    # alice renews last, so bob's session goes first even though it started later
+    clock.now += 1
+    users_handler.get_active_user(ALICE, renew=True)
+
+    clock.now += Sessions.INACTIVE_TIMEOUT - 0.5
+    assert users_handler.get_active_users() == ["alice"]
+
+def test_expired_session_cant_renew(users_handler, clock):
+    users_handler.generate_session("alice", "pw1", 6001, ALICE)
+    clock.now += Sessions.INACTIVE_TIMEOUT
+
+    # Not swept yet, but a heartbeat can't bring it back
+    assert users_handler.renew_from_address(ALICE) == None
+    assert users_handler.get_active_user(ALICE) == None
+
+def test_logins(users_handler, clock):
+    with pytest.raises(UserAuthError):
+        users_handler.generate_session("alice", "wrong", 6001, ALICE)
+
+    users_handler.generate_session("alice", "pw1", 6001, ALICE)
+    with pytest.raises(UserAuthError):
+        users_handler.generate_session("alice", "pw1", 6003, BOB)
+
+    # Another user logging in from alice's address replaces alice's session
+    users_handler.generate_session("bob", "pw2", 6002, ALICE)
+    assert users_handler.get_active_users() == ["bob"]
+    assert users_handler.get_listening_address("alice") == None
+    assert users_handler.get_listening_address("bob") == (ALICE[0], 6002)
+
+    # And alice can log back in once that session's gone
+    clock.now += Sessions.INACTIVE_TIMEOUT
+    users_handler.generate_session("alice", "pw1", 6001, BOB)
+    assert users_handler.get_active_users() == ["alice"]
@@ -0,0 +1,65 @@
+from tests.helpers import client_address, send
+from utils.Globals import PacketTypes
+from utils.networking.UDPHandler import UDPGetPacket, UDPSwmPacket
+from utils.server.Registry import Registry
+from utils.server.SharerSelection import *
+
+def candidates(*loads: int) -> list[SharerCandidate]:
+    return [
+        SharerCandidate(username=f"user{index}", address=("127.0.0.1", 6000 + index), load=load)
+        for index, load in enumerate(loads)
+    ]
+
+def names(selected: list[SharerCandidate]) -> list[str]:
+    return [candidate["username"] for candidate in selected]
+
+def test_first_active():
+    assert names(FirstActivePolicy().select("a", candidates(5, 0, 0), 2)) == ["user0", "user1"]
+
+def test_round_robin_cycles_per_file():
+    policy = RoundRobinPolicy()
+    picks: list[str] = [names(policy.select("a", candidates(0, 0, 0)))[0] for _ in range(4)]
+
+    assert picks == ["user0", "user1", "user2", "user0"]
+    assert names(policy.select("b", candidates(0, 0, 0))) == ["user0"]
+
+def test_least_loaded():
+    assert names(LeastLoadedPolicy().select("a", candidates(3, 1, 2), 2)) == ["user1", "user2"]
+
+def test_power_of_two_never_picks_the_busiest():
+    policy = PowerOfTwoChoicesPolicy()
+    for _ in range(50):
+        assert names(policy.select("a", candidates(9, 1, 2)))[0] != "user0"
+
+    assert sorted(names(policy.select("a", candidates(9, 1, 2), 5))) == ["user0", "user1", "user2"]
+
+def test_assignments_count_towards_load(users_handler):
+    registry = Registry(users_handler=users_handler, sharer_policy="least-loaded")
+    sharers: list[tuple[str, tuple[str, int]]] = [("alice", client_address(50001)), ("bob", client_address(50002))]
+    downloader: tuple[str, int] = client_address(50003)
+
+    for index, (username, address) in enumerate(sharers):
+        registry.authenticate(username, f"pw{index + 1}", 6001 + index, address)
+        registry.publish(address, [("a.txt", None)])
+    registry.authenticate("carol", "pw3", 6003, downloader)
+
+    # Each GET adds to the pick's load until its next heartbeat, so they alternate
+    picks: list[int] = [registry.get_sharers(downloader, "a.txt", 1)[1][0][1] for _ in range(4)]
+    assert sorted(picks) == [6001, 6001, 6002, 6002]
+
+    # A heartbeat reports the real load, which resets what was assigned
+    registry.heartbeat(sharers[0][1], 5, 0)
+    assert registry.get_sharers(downloader, "a.txt", 1)[1] == [(sharers[1][1][0], 6002)]
+
+def test_get_only_mixes_matching_content(server):
+    send(server, client_address(50001), PacketTypes.AUTH, "alice,pw1,6001")
+    send(server, client_address(50002), PacketTypes.AUTH, "bob,pw2,6002")
+    send(server, client_address(50003), PacketTypes.AUTH, "carol,pw3,6003")
+    send(server, client_address(50001), PacketTypes.PUB, f"a.txt,10,4,{'aa' * 32}")
+    send(server, client_address(50002), PacketTypes.PUB, f"a.txt,11,4,{'bb' * 32}")
+
+    reply = UDPGetPacket.get_reply_data(send(server, client_address(50003), PacketTypes.GET, "a.txt"))
+    assert reply["manifest"]["root"] in ["aa" * 32, "bb" * 32]
+
+    swarm = UDPSwmPacket.get_reply_data(send(server, client_address(50003), PacketTypes.SWM, "a.txt,4"))
+    assert len(swarm["addresses"]) == 1
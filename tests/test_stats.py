@@ -0,0 +1,47 @@
+import os
+import signal
+
+import pytest
+
+from tests.helpers import client_address, send
+from utils.Globals import PacketTypes
+
+ALICE: tuple[str, int] = client_address(50001)
+
+@pytest.mark.skipif(hasattr(signal, "SIGUSR1") != True, reason="no SIGUSR1 on this platform")
+def test_sigusr1_dump_waits_for_housekeeping(server, monkeypatch):
+    dumps: list[bool] = []
+    monkeypatch.setattr(server, "dump_stats", lambda: dumps.append(True))
+
+    previous = signal.getsignal(signal.SIGUSR1)
+    try:
+        server.install_stats_signal()
+        os.kill(os.getpid(), signal.SIGUSR1)
+    finally:
+        signal.signal(signal.SIGUSR1, previous)
+
+    # Nothing touched from inside the handler itself
+    assert (dumps, server.stats_requested) == ([], True)
+
+    server.housekeeping()
+    assert (dumps, server.stats_requested) == ([True], False)
+
+    server.housekeeping()
+    assert dumps == [True]
+
+def test_dump_appends_counts(server, tmp_path):
+    server.stats_file = str(tmp_path / "stats.txt")
+    send(server, ALICE, PacketTypes.AUTH, "alice,pw1,6000")
+    send(server, ALICE, PacketTypes.LAP, "")
+
+    server.request_stats()
+    server.housekeeping()
+    server.request_stats()
+    server.housekeeping()
+
+    with open(server.stats_file) as f:
+        lines: list[str] = f.read().splitlines()
+
+    assert lines.count(f"pid={os.getpid()}") == 2
+    assert "packets.LAP=1" in lines
+    assert "gauge.sessions=1" in lines
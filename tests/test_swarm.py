@@ -0,0 +1,71 @@
+import os
+import socket
+
+from tests.helpers import start_peer, closed_port
+from utils.Globals import Swarm
+from utils.client.SwarmDownloader import SwarmDownloader
+from utils.networking.ClientServerConnector import ClientNetworkHandler
+from utils.networking.TCPHandler import PeerProtocol
+
+def write_file(directory: str, filename: str, size: int) -> bytes:
+    data: bytes = os.urandom(size)
+    with open(os.path.join(directory, filename), "wb") as f:
+        f.write(data)
+
+    return data
+
+def test_download_from_several_peers(shared_directory, monkeypatch):
+    monkeypatch.setattr(Swarm, "RANGE_SIZE", 64 * 1024)
+    data: bytes = write_file(shared_directory, "movie.bin", 1024 * 1024 + 123)
+
+    peers: list[tuple[str, int]] = [start_peer(ClientNetworkHandler.new_client) for _ in range(3)]
+    assert SwarmDownloader("movie.bin", peers).download()
+
+    with open("movie.bin", "rb") as f:
+        assert f.read() == data
+
+    # Nothing left over from the transfer
+    assert sorted(os.listdir(".")) == ["movie.bin"]
+
+def test_unreachable_peer_is_skipped(shared_directory, monkeypatch):
+    monkeypatch.setattr(Swarm, "RANGE_SIZE", 64 * 1024)
+    data: bytes = write_file(shared_directory, "movie.bin", 300 * 1024)
+
+    peers: list[tuple[str, int]] = [closed_port(), start_peer(ClientNetworkHandler.new_client)]
+    assert SwarmDownloader("movie.bin", peers).download()
+
+    with open("movie.bin", "rb") as f:
+        assert f.read() == data
+
+def test_every_peer_gone(shared_directory):
+    write_file(shared_directory, "movie.bin", 1000)
+
+    assert SwarmDownloader("movie.bin", [closed_port(), closed_port()]).download() != True
+    assert os.path.exists("movie.bin") != True
+
+def test_existing_file_not_overwritten(shared_directory):
+    write_file(shared_directory, "movie.bin", 1000)
+    with open("movie.bin", "wb") as f:
+        f.write(b"mine")
+
+    assert SwarmDownloader("movie.bin", [start_peer(ClientNetworkHandler.new_client)]).download() != True
+    with open("movie.bin", "rb") as f:
+        assert f.read() == b"mine"
+
+def test_peer_dropping_mid_range_hands_it_back(shared_directory, monkeypatch):
+    monkeypatch.setattr(Swarm, "RANGE_SIZE", 64 * 1024)
+    data: bytes = write_file(shared_directory, "movie.bin", 512 * 1024)
+
+    def drop_half_way(connection: socket.socket) -> None:
+        with connection:
+            request = PeerProtocol.parse_request(connection.recv(1024))
+            connection.sendall(PeerProtocol.RANGE_REPLY.pack(len(data)))
+
+            end: int = min(len(data), request["offset"] + request["length"])
+            connection.sendall(data[request["offset"]:(request["offset"] + end) // 2])
+
+    peers: list[tuple[str, int]] = [start_peer(drop_half_way), start_peer(ClientNetworkHandler.new_client)]
+    assert SwarmDownloader("movie.bin", peers).download()
+
+    with open("movie.bin", "rb") as f:
+        assert f.read() == data
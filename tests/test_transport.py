@@ -0,0 +1,152 @@
+import errno
+import socket
+import time
+
+import pytest
+
+from utils.Globals import Env, PacketTypes, Transport
+from utils.networking.ClientTransport import ClientTransport, RttEstimator
+from utils.networking.UDPHandler import UDPPacketCodec, UDPPacketHandling, UDPPacket
+
+class FakeServer:
+    # A UDP socket the test answers from by hand
+    def __init__(self) -> None:
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.bind((Env.SERVER_IP, 0))
+        self.socket.settimeout(5)
+        self.address: tuple[str, int] = self.socket.getsockname()
+
+    def receive(self) -> tuple[bytes, tuple[str, int]]:
+        return self.socket.recvfrom(UDPPacket.UDP_PACKET_SIZE)
+
+    def reply(self, request: bytes, address: tuple[str, int], request_id: int | None = None) -> None:
+        if request_id == None:
+            request_id = UDPPacketHandling.get_request_id(request)
+
+        self.socket.sendto(UDPPacketCodec.encode(
+            self.address[0], address[0], self.address[1], address[1], PacketTypes.OK, b"", request_id
+        ), address)
+
+    def close(self) -> None:
+        self.socket.close()
+
+class FlakySocket(socket.socket):
+    # Fails its next few recvs with an error like an ICMP one would give
+    failures: int = 0
+
+    def recv(self, size: int) -> bytes:
+        if self.failures > 0:
+            self.failures -= 1
+            raise OSError(errno.EHOSTUNREACH, "No route to host")
+
+        return super().recv(size)
+
+@pytest.fixture
+def server():
+    server = FakeServer()
+    yield server
+    server.close()
+
+def create_transport(server: FakeServer, client_socket: socket.socket | None = None) -> ClientTransport:
+    if client_socket == None:
+        client_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    client_socket.bind((Env.CLIENT_IP, 0))
+
+    return ClientTransport(client_socket, server.address)
+
+def create_request(transport: ClientTransport, payload: bytes = b"") -> bytes:
+    return UDPPacketCodec.encode(
+        transport.address[0], transport.server_address[0], transport.address[1], transport.server_address[1],
+        PacketTypes.LAP, payload
+    )
+
+def test_rtt_estimator():
+    rtt = RttEstimator()
+    assert rtt.rto == Transport.INITIAL_RTO
+
+    rtt.sample(0.1)
+    assert (rtt.srtt, rtt.rttvar) == (0.1, 0.05)
+    assert rtt.rto == pytest.approx(0.3)
+
+    rtt.back_off()
+    assert rtt.rto == pytest.approx(0.6)
+    for _ in range(10):
+        rtt.back_off()
+    assert rtt.rto == Transport.MAX_RTO
+
+def test_replies_matched_by_request_id(server):
+    transport: ClientTransport = create_transport(server)
+    first = transport.submit(create_request(transport, b"first"))
+    second = transport.submit(create_request(transport, b"second"))
+
+    requests: list[tuple[bytes, tuple[str, int]]] = [server.receive(), server.receive()]
+
+    # Answered out of order, each still goes to the one that asked
+    for request, address in reversed(requests):
+        server.reply(request, address)
+
+    assert UDPPacketHandling.get_request_id(first.result(5)) == UDPPacketHandling.get_request_id(requests[0][0])
+    assert UDPPacketHandling.get_request_id(second.result(5)) == UDPPacketHandling.get_request_id(requests[1][0])
+    assert transport.rtt.srtt != None
+
+def test_lost_requests_retransmitted_with_one_back_off(server, monkeypatch):
+    monkeypatch.setattr(Transport, "INITIAL_RTO", 0.2)
+    transport: ClientTransport = create_transport(server)
+    futures = [transport.submit(create_request(transport, payload)) for payload in [b"a", b"b"]]
+
+    # Both first copies are dropped, then the retransmissions answered
+    server.receive()
+    server.receive()
+    for _ in range(2):
+        server.reply(*server.receive())
+
+    for future in futures:
+        future.result(5)
+
+    assert transport.retransmissions == 2
+    assert transport.rtt.rto == pytest.approx(0.4)
+
+    # Retransmitted requests aren't sampled, there's no telling which copy was answered
+    assert transport.rtt.srtt == None
+
+def test_stale_and_duplicate_replies_dropped(server):
+    transport: ClientTransport = create_transport(server)
+    future = transport.submit(create_request(transport))
+    request, address = server.receive()
+
+    server.reply(request, address, UDPPacketHandling.get_request_id(request) + 1)
+    server.reply(request, address)
+    server.reply(request, address)
+    future.result(5)
+
+    deadline: float = time.monotonic() + 5
+    while transport.stale_replies < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert transport.stale_replies == 2
+
+def test_unanswered_request_times_out(server, monkeypatch):
+    monkeypatch.setattr(Transport, "REQUEST_TIMEOUT", 0.3)
+    transport: ClientTransport = create_transport(server)
+
+    with pytest.raises(socket.timeout):
+        transport.request(create_request(transport))
+
+def test_socket_errors_dont_stop_the_receiver(server):
+    client_socket = FlakySocket(socket.AF_INET, socket.SOCK_DGRAM)
+    client_socket.failures = 3
+    transport: ClientTransport = create_transport(server, client_socket)
+
+    future = transport.submit(create_request(transport))
+    server.reply(*server.receive())
+
+    assert future.result(5) != None
+    assert client_socket.failures == 0
+
+def test_closed_socket_fails_whats_pending(server):
+    transport: ClientTransport = create_transport(server)
+    future = transport.submit(create_request(transport))
+    server.receive()
+
+    transport.socket.close()
+    with pytest.raises(socket.timeout, match="didn't respond"):
+        future.result(2)
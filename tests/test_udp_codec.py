@@ -0,0 +1,101 @@
+import pytest
+
+from tests.helpers import SERVER_ADDRESS, client_address, create_request, send
+from utils.Exceptions import CorruptPacketError
+from utils.Globals import PacketTypes
+from utils.networking.UDPHandler import *
+
+ALICE: tuple[str, int] = client_address(50001)
+
+def test_header_is_20_bytes():
+    assert UDPPacket.UDP_TOTAL_HEADER_SIZE == 20
+    assert UDPPacketCodec.HEADER.size == UDPPacket.UDP_TOTAL_HEADER_SIZE
+
+def test_round_trip():
+    packet: bytes = create_request(ALICE, PacketTypes.PUB, "notes.pdf", request_id=0xDEADBEEF)
+    view: UDPPacketView = UDPPacketCodec.decode(packet)
+
+    assert view.source_address == ALICE
+    assert view.dst_port == SERVER_ADDRESS[1]
+    assert view.length == len(packet)
+    assert view.message_type == PacketTypes.PUB
+    assert view.request_id == 0xDEADBEEF
+    assert bytes(view.payload) == b"notes.pdf"
+    assert UDPPacketHandling.get_request_id(packet) == 0xDEADBEEF
+
+def test_encode_into_matches_encode():
+    buffer: bytearray = bytearray(UDPPacket.UDP_PACKET_SIZE)
+    length: int = UDPPacketCodec.encode_into(
+        buffer, ALICE[0], SERVER_ADDRESS[0], ALICE[1], SERVER_ADDRESS[1], PacketTypes.SCH, b"notes", 7
+    )
+
+    assert bytes(buffer[:length]) == create_request(ALICE, PacketTypes.SCH, b"notes", 7)
+
+def test_encode_into_too_small_buffer():
+    with pytest.raises(Exception):
+        UDPPacketCodec.encode_into(
+            bytearray(24), ALICE[0], SERVER_ADDRESS[0], ALICE[1], SERVER_ADDRESS[1], PacketTypes.SCH, b"notes"
+        )
+
+def test_set_request_id_keeps_checksum_valid():
+    packet: bytes = UDPPacketCodec.set_request_id(create_request(ALICE, PacketTypes.LAP, b""), SERVER_ADDRESS[0], 42)
+
+    assert UDPPacketHandling.get_request_id(packet) == 42
+    assert UDPPacketHandling.verify_checksum(packet, SERVER_ADDRESS[0])
+
+def test_truncated_packet_rejected():
+    packet: bytes = create_request(ALICE, PacketTypes.PUB, "notes.pdf")
+
+    with pytest.raises(CorruptPacketError):
+        UDPPacketView(packet[:-1])
+
+    with pytest.raises(CorruptPacketError):
+        UDPPacketView(packet[:UDPPacket.UDP_TOTAL_HEADER_SIZE - 1])
+
+def test_lying_payload_size_rejected():
+    packet: bytearray = bytearray(create_request(ALICE, PacketTypes.PUB, "notes.pdf"))
+    UDPPacketCodec.FIELD.pack_into(packet, UDPPacket.UDP_PAYLOAD_SIZE_OFFSET, 3)
+
+    with pytest.raises(CorruptPacketError):
+        UDPPacketView(packet)
+
+def test_server_drops_lying_packet(server):
+    # The checksum is fixed up so only the payload size gives it away
+    packet: bytearray = bytearray(create_request(ALICE, PacketTypes.AUTH, "alice,pw1,6000"))
+    UDPPacketCodec.FIELD.pack_into(packet, UDPPacket.UDP_PAYLOAD_SIZE_OFFSET, 5)
+    packet = bytearray(UDPPacketCodec.set_request_id(bytes(packet), SERVER_ADDRESS[0], 0))
+
+    assert server.process_datagram(bytes(packet)) == None
+    assert server.corrupt_packets == 1
+
+def test_trailing_bytes_past_length_ignored():
+    view: UDPPacketView = UDPPacketView(create_request(ALICE, PacketTypes.GET, "a.txt") + b"junk")
+    assert UDPGetPacket.get_data(view)["filename"] == "a.txt"
+
+def test_parsers():
+    assert UDPAuthPacket.get_data(create_request(ALICE, PacketTypes.AUTH, "alice,pw1,6000")) == {
+        "username": "alice", "password": "pw1", "listening_port": 6000
+    }
+    assert UDPHbtPacket.get_data(create_request(ALICE, PacketTypes.HBT, "alice")) == {
+        "username": "alice", "active_uploads": 0, "queue_depth": 0
+    }
+
+    manifest: FileManifestData = FileManifestData(size=10, chunk_size=4, root="ab" * 32)
+    pub: bytes = UDPPubPacket.create_packet(ALICE[0], SERVER_ADDRESS[0], ALICE[1], SERVER_ADDRESS[1], "a.txt", manifest)
+    assert UDPPubPacket.get_data(pub) == {"filename": "a.txt", "manifest": manifest}
+
+    with pytest.raises(CorruptPacketError):
+        UDPAuthPacket.get_data(create_request(ALICE, PacketTypes.AUTH, "alice,pw1"))
+
+def test_server_replies_are_not_shared_between_slots(server):
+    # Engines that batch replies pass a buffer per datagram, earlier replies stay intact
+    first_buffer: bytearray = bytearray(UDPPacket.UDP_PACKET_SIZE)
+    second_buffer: bytearray = bytearray(UDPPacket.UDP_PACKET_SIZE)
+
+    first, _ = server.process_datagram(create_request(ALICE, PacketTypes.AUTH, "alice,pw1,6000", 1), first_buffer)
+    second, _ = server.process_datagram(create_request(ALICE, PacketTypes.LAP, "", 2), second_buffer)
+
+    assert UDPPacketHandling.get_message_type(first) == PacketTypes.OK
+    assert UDPPacketHandling.get_request_id(first) == 1
+    assert UDPPacketHandling.get_message_type(second) == PacketTypes.PAGE
+    assert UDPPacketHandling.verify_checksum(bytes(first), ALICE[0])
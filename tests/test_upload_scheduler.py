@@ -0,0 +1,136 @@
+import os
+import socket
+import threading
+import time
+
+from tests.helpers import client_address
+from utils.Globals import Env
+from utils.client.UploadScheduler import UploadScheduler
+from utils.networking.ClientServerConnector import ClientNetworkHandler
+from utils.networking.TCPHandler import TCP, PeerProtocol, PeerRequestData
+
+def wait_for(condition, timeout: float = 5) -> None:
+    deadline: float = time.monotonic() + timeout
+    while condition() != True:
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+def create_request(listening_port: int | None, filename: str) -> bytes:
+    request: bytes = PeerProtocol.create_request(filename)
+    if listening_port == None:
+        return request
+
+    return PeerProtocol.PEER_PREFIX.pack(PeerProtocol.PEER_MAGIC, listening_port) + request
+
+def connect(scheduler: UploadScheduler, request: bytes | None) -> socket.socket:
+    # Every peer connects from the same IP, like they do when they all run on one host
+    ours, theirs = socket.socketpair()
+    assert scheduler.submit(theirs, client_address(50000))
+
+    if request != None:
+        # Read once nothing's left waiting on its request
+        ours.sendall(request)
+        wait_for(lambda: scheduler.queued == scheduler.ready)
+
+    return ours
+
+def test_requests_carry_listening_port(monkeypatch):
+    assert PeerProtocol.parse_request(PeerProtocol.create_range_request("a.txt", 1, 2))["peer_port"] == None
+
+    monkeypatch.setattr(PeerProtocol, "listening_port", 6001)
+    for request in [
+        PeerProtocol.create_request("a.txt"),
+        PeerProtocol.create_range_request("a.txt", 1, 2),
+        PeerProtocol.create_manifest_request("a.txt")
+    ]:
+        data: PeerRequestData = PeerProtocol.parse_request(request)
+        assert (data["filename"], data["peer_port"]) == ("a.txt", 6001)
+
+    assert PeerProtocol.parse_request(PeerProtocol.create_range_request("a.txt", 1, 2))["offset"] == 1
+
+def test_peers_on_one_host_take_turns():
+    served: list[tuple[int | None, str]] = []
+    release = threading.Event()
+
+    def serve(connection, bucket, request: PeerRequestData) -> None:
+        served.append((request["peer_port"], request["filename"]))
+        release.wait(5)
+
+    scheduler = UploadScheduler(serve, max_uploads=1)
+    scheduler.start()
+
+    # The first one holds the only worker while everything else queues up behind it
+    connections: list[socket.socket] = [connect(scheduler, create_request(6001, "a1"))]
+    wait_for(lambda: scheduler.active == 1)
+    for listening_port, filename in [(6001, "a2"), (6001, "a3"), (6002, "b1"), (6003, "c1")]:
+        connections.append(connect(scheduler, create_request(listening_port, filename)))
+
+    assert scheduler.get_queue_depth() == 4
+    release.set()
+    wait_for(lambda: len(served) == 5)
+
+    assert [filename for _, filename in served] == ["a1", "a2", "b1", "c1", "a3"]
+    for connection in connections:
+        connection.close()
+
+def test_failed_upload_reported_and_worker_carries_on(capsys):
+    served: list[str] = []
+
+    def serve(connection, bucket, request: PeerRequestData) -> None:
+        if request["filename"] == "bad.txt":
+            raise ValueError("broken")
+        served.append(request["filename"])
+
+    scheduler = UploadScheduler(serve, max_uploads=1)
+    scheduler.start()
+
+    connect(scheduler, create_request(6001, "bad.txt")).close()
+    connect(scheduler, create_request(6001, "good.txt")).close()
+    wait_for(lambda: served == ["good.txt"])
+
+    assert scheduler.failed == 1
+    assert "bad.txt" in capsys.readouterr().out
+
+def test_silent_connections_dropped(monkeypatch):
+    monkeypatch.setattr(TCP, "PEER_TIMEOUT", 0.2)
+    scheduler = UploadScheduler(lambda connection, bucket, request: None, max_uploads=1)
+    scheduler.start()
+
+    connection: socket.socket = connect(scheduler, None)
+    wait_for(lambda: scheduler.get_queue_depth() == 0)
+
+    connection.settimeout(1)
+    assert connection.recv(1) == b""
+    connection.close()
+
+def test_full_queue_turns_connections_away():
+    scheduler = UploadScheduler(lambda connection, bucket, request: None, max_queued=1)
+
+    first, second = socket.socketpair(), socket.socketpair()
+    assert scheduler.submit(first[1], client_address(50000))
+    assert scheduler.submit(second[1], client_address(50001)) != True
+    assert scheduler.rejected == 1
+
+    for ours, theirs in [first, second]:
+        ours.close()
+        theirs.close()
+
+def test_uploads_served_through_listen(shared_directory, monkeypatch):
+    data: bytes = os.urandom(100 * 1024)
+    with open(os.path.join(shared_directory, "data.bin"), "wb") as f:
+        f.write(data)
+
+    listening_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listening_socket.bind((Env.CLIENT_IP, 0))
+    monkeypatch.setattr(ClientNetworkHandler, "upload_scheduler", None)
+    monkeypatch.setattr(PeerProtocol, "listening_port", None)
+    threading.Thread(target=ClientNetworkHandler.listen, args=(listening_socket,), daemon=True).start()
+    wait_for(lambda: ClientNetworkHandler.upload_scheduler != None)
+
+    connection, size = PeerProtocol.request_range(listening_socket.getsockname(), "data.bin", 1000, 5000, 5)
+    with connection:
+        assert size == len(data)
+        assert PeerProtocol.receive_exactly(connection, 5000) == data[1000:6000]
+
+    # Our own requests say where we listen from now on
+    assert PeerProtocol.listening_port == listening_socket.getsockname()[1]
@@ -0,0 +1,57 @@
+import os
+import socket
+import threading
+import time
+
+import pytest
+
+from utils.client.UploadScheduler import TokenBucket
+from utils.networking.ClientServerConnector import ClientNetworkHandler
+
+@pytest.fixture(params=[True, False], ids=["sendfile", "buffered"])
+def use_sendfile(request, monkeypatch) -> bool:
+    monkeypatch.setattr(ClientNetworkHandler, "use_sendfile", request.param)
+    monkeypatch.setattr(ClientNetworkHandler, "upload_chunk_size", 4096)
+
+    return request.param
+
+def send_and_receive(path: str, offset: int, count: int | None, bucket: TokenBucket | None = None) -> bytes:
+    sender, receiver = socket.socketpair()
+    received: bytearray = bytearray()
+
+    def receive() -> None:
+        while chunk := receiver.recv(65536):
+            received.extend(chunk)
+
+    thread = threading.Thread(target=receive)
+    thread.start()
+
+    with sender, open(path, "rb") as f:
+        ClientNetworkHandler.send_file(sender, f, offset, count, bucket)
+
+    thread.join()
+    receiver.close()
+
+    return bytes(received)
+
+def test_whole_file_and_ranges(tmp_path, use_sendfile):
+    data: bytes = os.urandom(100 * 1024 + 7)
+    path: str = str(tmp_path / "data.bin")
+    with open(path, "wb") as f:
+        f.write(data)
+
+    assert send_and_receive(path, 0, None) == data
+    assert send_and_receive(path, 5000, 10000) == data[5000:15000]
+    assert send_and_receive(path, 100 * 1024, 100) == data[100 * 1024:]
+    assert send_and_receive(path, 10, 0) == b""
+
+def test_rate_limited(tmp_path, use_sendfile):
+    data: bytes = os.urandom(40 * 1024)
+    path: str = str(tmp_path / "data.bin")
+    with open(path, "wb") as f:
+        f.write(data)
+
+    # A second's burst of 20KB, so the other 20KB has to wait about a second
+    started: float = time.monotonic()
+    assert send_and_receive(path, 0, None, TokenBucket(20 * 1024)) == data
+    assert time.monotonic() - started >= 0.8
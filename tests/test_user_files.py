@@ -0,0 +1,65 @@
+import pytest
+
+from utils.Exceptions import FileAlreadyPublished, FileNotExistent
+from utils.networking.UDPHandler import FileManifestData
+from utils.server.UserFilesHandler import UserFilesHandler
+
+def test_index_kept_in_sync_both_ways():
+    files = UserFilesHandler()
+    files.add_file("alice", "a.txt")
+    files.add_file("bob", "a.txt")
+    files.add_file("alice", "b.txt")
+
+    assert files.get_file_sharers("a.txt") == ["alice", "bob"]
+    assert files.get_shared_by("alice") == ["a.txt", "b.txt"]
+    assert files.get_shared_by("bob") == ["a.txt"]
+
+    files.remove_file("alice", "a.txt")
+    assert files.get_file_sharers("a.txt") == ["bob"]
+    assert files.get_shared_by("alice") == ["b.txt"]
+
+def test_emptied_entries_are_removed():
+    files = UserFilesHandler()
+    files.add_file("alice", "a.txt", FileManifestData(size=1, chunk_size=1, root="00"))
+    files.remove_file("alice", "a.txt")
+
+    assert files.shared_files == {}
+    assert files.user_files == {}
+    assert files.file_manifests == {}
+    assert files.get_catalog_size() == 0
+
+    with pytest.raises(FileNotExistent):
+        files.get_file_sharers("a.txt")
+
+def test_duplicates_and_missing():
+    files = UserFilesHandler()
+    files.add_file("alice", "a.txt")
+
+    with pytest.raises(FileAlreadyPublished):
+        files.add_file("alice", "a.txt")
+
+    with pytest.raises(FileNotExistent):
+        files.remove_file("bob", "a.txt")
+
+def test_generation_moves_on_change_only():
+    files = UserFilesHandler()
+    files.add_file("alice", "a.txt")
+    generation: int = files.get_generation()
+
+    assert files.add_files("alice", [("a.txt", None)]) == [False]
+    assert files.get_generation() == generation
+
+    assert files.remove_files("alice", ["a.txt", "b.txt"]) == [True, False]
+    assert files.get_generation() == generation + 1
+
+def test_manifest_per_sharer():
+    files = UserFilesHandler()
+    first: FileManifestData = FileManifestData(size=10, chunk_size=4, root="aa")
+    second: FileManifestData = FileManifestData(size=11, chunk_size=4, root="bb")
+
+    files.add_file("alice", "a.txt", first)
+    files.add_file("bob", "a.txt", second)
+
+    assert files.get_manifest("a.txt", "alice") == first
+    assert files.get_manifest("a.txt", "bob") == second
+    assert files.get_manifest("a.txt", "carol") == None
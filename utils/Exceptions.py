@@ -14,4 +14,16 @@ class UserAuthError(Exception):
     pass
 
 class NoActiveSharers(Exception):
-    pass
\ No newline at end of file
+    pass
+
+class ResultExpired(Exception):
+    pass
+
+class SlowPeerError(Exception):
+    pass
+
+class CorruptChunkError(Exception):
+    pass
+
+class InvalidPeerRequest(Exception):
+    pass
@@ -12,6 +12,12 @@ class PacketTypes:
     LPF = 8
     UNP = 9
     SCH = 10
+    PAGE = 11
+    NXT = 12
+    SWM = 13
+    STATS = 14
+    BPUB = 15
+    BUNP = 16
 
     _packet_names = {
         AUTH: "AUTH",
@@ -23,16 +29,105 @@ class PacketTypes:
         PUB: "PUB",
         LPF: "LPF",
         UNP: "UNP",
-        SCH: "SCH"
+        SCH: "SCH",
+        PAGE: "PAGE",
+        NXT: "NXT",
+        SWM: "SWM",
+        STATS: "STATS",
+        BPUB: "BPUB",
+        BUNP: "BUNP"
     }
 
     @classmethod
     def get_name(cls, packet_type: int) -> str:
         return cls._packet_names.get(packet_type, "UNKNOWN")
 
+    @classmethod
+    def get_type(cls, name: str) -> int | None:
+        for packet_type, packet_name in cls._packet_names.items():
+            if packet_name == name.upper():
+                return packet_type
+
+        return None
+
+class BatchStatus:
+    # What happened to each item of a BPUB/BUNP, one byte per item in the OK reply
+    OK = 0
+    ALREADY_PUBLISHED = 1
+    NOT_PUBLISHED = 2
+    INVALID = 3
+
 class Env:
     CLIENT_IP = '127.0.0.1'
     SERVER_IP = '127.0.0.1'
 
 class Sessions:
-    INACTIVE_TIMEOUT = 3
\ No newline at end of file
+    INACTIVE_TIMEOUT = 3
+
+    # How often clients heartbeat when they've sent nothing else in the meantime
+    HEARTBEAT_INTERVAL = 2
+
+class Swarm:
+    # Most sharers a swarm download asks the server for, and the size of the
+    # ranges the file is split into between them
+    MAX_PEERS = 4
+    RANGE_SIZE = 1024 * 1024
+
+    # A peer serving a range slower than this (bytes/s) loses it to another peer
+    MIN_PEER_RATE = 64 * 1024
+    PEER_TIMEOUT = 5
+
+class Uploads:
+    # Serve uploads with the kernel's zero-copy sendfile where the platform has it,
+    # otherwise read and sendall chunks of this size
+    USE_SENDFILE = True
+    CHUNK_SIZE = 256 * 1024
+
+    # Uploads served at once, connections left waiting before new ones are turned
+    # away, and an optional cap on the combined upload rate in bytes/s
+    MAX_CONCURRENT = 4
+    MAX_QUEUED = 32
+    BANDWIDTH_LIMIT = None
+
+class Downloads:
+    # Size of the buffer a download receives into before writing it out, and a
+    # hashlib algorithm (e.g. "sha256") to hash plain gets with as they arrive, or None
+    BUFFER_SIZE = 1024 * 1024
+    HASH_ALGORITHM = None
+
+class Manifests:
+    # Files are hashed in chunks of this size when published, and downloads refetch
+    # a chunk that fails its check at most this many times before giving up
+    CHUNK_SIZE = 1024 * 1024
+    MAX_RETRIES = 3
+
+    # Largest manifest taken from a peer, enough for a 512GB file in 1MB chunks
+    MAX_SIZE = 16 * 1024 * 1024
+
+    # Where the client keeps the manifests of its files between runs, in its directory
+    CACHE_FILE = ".manifests.json"
+
+class Paging:
+    # How long the server keeps a paginated result around for NXT requests,
+    # and the most results it will hold onto at once
+    SNAPSHOT_TIMEOUT = 30
+    MAX_SNAPSHOTS = 1024
+
+    # Pages are numbered with 2 bytes in PAGE, so a result stops after this many
+    MAX_PAGES = 0x10000
+
+class Transport:
+    # Retransmission timeout bounds (seconds) for requests to the server. Until an RTT
+    # has been measured INITIAL_RTO is used, after that it follows the measured RTT.
+    INITIAL_RTO = 1.0
+    MIN_RTO = 0.2
+    MAX_RTO = 4.0
+
+    # How long a request keeps being retried before it times out
+    REQUEST_TIMEOUT = 5.0
+
+    # Requests waiting on a reply at once, sending more waits for one to finish
+    MAX_IN_FLIGHT = 32
+
+    # How often the receiver thread checks for requests due a retransmission
+    TICK = 0.05
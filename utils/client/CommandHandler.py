@@ -1,42 +1,64 @@
 import socket
 import os
+import hashlib
 import threading
 from pathlib import Path
+from typing import Iterator
+from concurrent.futures import Future
 
 from utils.networking.UDPHandler import *
-from utils.Globals import PacketTypes
-from utils.client.FilesHandler import FilesHandler
-from utils.networking.TCPHandler import TCP
+from utils.Globals import PacketTypes, Swarm, Downloads, Manifests, BatchStatus
+from utils.client.FilesHandler import FilesHandler, LocalFile
+from utils.client.SwarmDownloader import SwarmDownloader
+from utils.client.DownloadProgress import DownloadProgress
+from utils.client.FileReceiver import FileReceiver
+from utils.client.Manifest import Manifest, ManifestCache, ChunkVerifier
+from utils.networking.TCPHandler import TCP, PeerProtocol
+from utils.networking.ClientTransport import ClientTransport
+from utils.Exceptions import CorruptChunkError
 
 class CommandHandler:
     @staticmethod
-    def execute_command(command: list[str], client_server_socket: socket, server_address: tuple[str, int]):
+    def execute_command(command: list[str], transport: ClientTransport):
         invalid_cmd: str = "Invalid command. Correct usage:"
         match command[0]:
             case "get":
+                if len(command) == 3 and command[1] == "-m":
+                    CommandHandler.handle_swarm_get(transport, command[2])
+                    return
                 if (len(command) != 2):
-                    raise Exception(f"{invalid_cmd} get <filename>")
-                CommandHandler.handle_get(client_server_socket, server_address, command[1])
+                    raise Exception(f"{invalid_cmd} get [-m] <filename>")
+                CommandHandler.handle_get(transport, command[1])
             case "lap":
                 if (len(command) != 1):
                     raise Exception(f"{invalid_cmd} lap")
-                CommandHandler.handle_lap(client_server_socket, server_address)
+                CommandHandler.handle_lap(transport)
             case "lpf":
                 if (len(command) != 1):
                     raise Exception(f"{invalid_cmd} lpf")
-                CommandHandler.handle_lpf(client_server_socket, server_address)
+                CommandHandler.handle_lpf(transport)
             case "pub":
+                if len(command) == 3 and command[1] == "-r":
+                    CommandHandler.handle_batch_pub(transport, command[2])
+                    return
                 if (len(command) != 2):
-                    raise Exception(f"{invalid_cmd} pub <filename>")
-                CommandHandler.handle_pub(client_server_socket, server_address, command[1])
+                    raise Exception(f"{invalid_cmd} pub [-r] <filename | directory>")
+                CommandHandler.handle_pub(transport, command[1])
             case "sch":
                 if (len(command) != 2):
                     raise Exception(f"{invalid_cmd} sch")
-                CommandHandler.handle_sch(client_server_socket, server_address, command[1])
+                CommandHandler.handle_sch(transport, command[1])
             case "unp":
+                if len(command) == 3 and command[1] == "-r":
+                    CommandHandler.handle_batch_unp(transport, command[2])
+                    return
                 if (len(command) != 2):
-                    raise Exception(f"{invalid_cmd} unp <filename>")
-                CommandHandler.handle_unp(client_server_socket, server_address, command[1])
+                    raise Exception(f"{invalid_cmd} unp [-r] <filename | directory>")
+                CommandHandler.handle_unp(transport, command[1])
+            case "sts":
+                if (len(command) != 1):
+                    raise Exception(f"{invalid_cmd} sts")
+                CommandHandler.handle_sts(transport)
             case "xit":
                 if (len(command) != 1):
                     raise Exception(f"{invalid_cmd} xit")
@@ -62,40 +84,86 @@ class CommandHandler:
         exit()
 
     @staticmethod
-    def handle_lap(client_server_socket: socket.socket, server_address: tuple[str, int]) -> None:
+    def request_pages(transport: ClientTransport, request: bytes) -> tuple[int, Iterator[list[str]]]:
+        # Sends a LAP/LPF/SCH request, returns the total number of results and an
+        # iterator over the pages of them
+        response: bytes = transport.request(request)
+
+        if UDPPacketHandling.get_message_type(response) != PacketTypes.PAGE:
+            return (0, iter(()))
+
+        first_page: UDPPagePacketData = UDPPagePacket.get_data(response)
+
+        return (
+            first_page["total"],
+            CommandHandler.iterate_pages(transport, first_page)
+        )
+
+    @staticmethod
+    def iterate_pages(transport: ClientTransport, page: UDPPagePacketData) -> Iterator[list[str]]:
+        # Each page asks for the next one before handing its items over, so the next
+        # page is already on its way while this one is being printed
+        while True:
+            next_page: Future | None = None
+            if page["more"]:
+                next_page = transport.submit(UDPNxtPacket.create_packet(
+                    transport.address[0], transport.server_address[0],
+                    transport.address[1], transport.server_address[1],
+                    page["token"], page["index"] + 1
+                ))
+
+            yield page["items"]
+
+            if next_page == None:
+                return
+
+            response: bytes = next_page.result()
+            if UDPPacketHandling.get_message_type(response) != PacketTypes.PAGE:
+                raise Exception("Results expired before they could all be fetched, try again.")
+
+            page = UDPPagePacket.get_data(response)
+
+    @staticmethod
+    def print_pages(pages: Iterator[list[str]]) -> None:
+        for items in pages:
+            if len(items) > 0:
+                print(f"\n".join(items))
+
+    @staticmethod
+    def handle_lap(transport: ClientTransport) -> None:
         request = UDPPacketHandling.create_udp_packet(
-            client_server_socket.getsockname()[0], server_address[0], 
-            client_server_socket.getsockname()[1], server_address[1],
+            transport.address[0], transport.server_address[0], 
+            transport.address[1], transport.server_address[1],
             PacketTypes.LAP, "".encode("utf-8")
         )
-        client_server_socket.sendto(request, server_address)
-        response: bytes = client_server_socket.recv(UDPPacket.UDP_PACKET_SIZE)
-
-        active_users: list[str] = UDPPacketHandling.get_payload_string_args(response)
+        total, active_users = CommandHandler.request_pages(transport, request)
 
-        if len(active_users) <= 0:
+        if total <= 0:
             print(f"No active peers")
             return
                 
-        print(f"{len(active_users)} active peer{'s' if len(active_users) != 1 else ''}")
-        print(f"\n".join(active_users))
+        print(f"{total} active peer{'s' if total != 1 else ''}")
+        CommandHandler.print_pages(active_users)
     
     @staticmethod
-    def handle_pub(client_server_socket: socket.socket, server_address: tuple[str, int], filename: str):
+    def handle_pub(transport: ClientTransport, filename: str):
         # The spec does say it'll be a valid file, but still better to do check
-        if FilesHandler.file_exists(filename) != True:
+        local_file: LocalFile | None = FilesHandler.get_file(filename)
+        if local_file == None:
             print(f"File does not exist!")
             return
+
+        # Cached, so this only hashes the file the first time (or after it changes)
+        manifest: Manifest = ManifestCache.get(local_file)
+        ManifestCache.save()
         
         request: UDPPubPacketData = UDPPubPacket.create_packet(
-            client_server_socket.getsockname()[0], server_address[0], 
-            client_server_socket.getsockname()[1], server_address[1],
-            filename
+            transport.address[0], transport.server_address[0], 
+            transport.address[1], transport.server_address[1],
+            filename, manifest.get_data()
         )
 
-        client_server_socket.sendto(request, server_address)
-
-        response: bytes = client_server_socket.recv(UDPPacket.UDP_PACKET_SIZE)
+        response: bytes = transport.request(request)
         message_type: int = UDPPacketHandling.get_message_type(response)
 
         if message_type != PacketTypes.OK:
@@ -104,35 +172,131 @@ class CommandHandler:
             print(f"File published successfully")
     
     @staticmethod
-    def handle_lpf(client_server_socket: socket.socket, server_address: tuple[str, int]):
+    def request_batches(transport: ClientTransport, create_packet, items: list[str]) -> list[int | None]:
+        # Splits the items into batches that fit in a datagram and sends them all at
+        # once. Returns a BatchStatus per item, or None where its whole batch failed.
+        batches: list[list[str]] = UDPBatchPacket.split_batches(items)
+        futures: list[Future] = [
+            transport.submit(create_packet(
+                transport.address[0], transport.server_address[0],
+                transport.address[1], transport.server_address[1],
+                batch
+            ))
+            for batch in batches
+        ]
+
+        statuses: list[int | None] = []
+        for batch, future in zip(batches, futures):
+            try:
+                response: bytes = future.result()
+            except socket.timeout:
+                statuses += [None] * len(batch)
+                continue
+
+            if UDPPacketHandling.get_message_type(response) != PacketTypes.OK:
+                statuses += [None] * len(batch)
+                continue
+
+            replied: list[int] = UDPBatchPacket.get_reply_data(response)["statuses"][:len(batch)]
+            statuses += replied + [None] * (len(batch) - len(replied))
+
+        return statuses
+
+    @staticmethod
+    def print_batch_results(filenames: list[str], statuses: list[int | None], done: str, skipped: str):
+        succeeded: int = statuses.count(BatchStatus.OK)
+        unchanged: int = len([status for status in statuses if status in (
+            BatchStatus.ALREADY_PUBLISHED, BatchStatus.NOT_PUBLISHED
+        )])
+        rejected: list[str] = [
+            filename for filename, status in zip(filenames, statuses) if status == BatchStatus.INVALID
+        ]
+        unanswered: list[str] = [filename for filename, status in zip(filenames, statuses) if status == None]
+
+        print(f"{succeeded} file{'s' if succeeded != 1 else ''} {done}" + (f", {unchanged} {skipped}" if unchanged > 0 else ""))
+        if len(rejected) > 0:
+            print(f"Rejected by the server (names can't contain commas):")
+            print(f"\n".join(rejected))
+        if len(unanswered) > 0:
+            print(f"No response for {len(unanswered)} file{'s' if len(unanswered) != 1 else ''}, try again:")
+            print(f"\n".join(unanswered))
+
+    @staticmethod
+    def handle_batch_pub(transport: ClientTransport, directory: str):
+        local_files: dict[str, LocalFile] = FilesHandler.get_files_under(directory)
+        if len(local_files) <= 0:
+            print(f"No files to publish under {directory}")
+            return
+
+        filenames: list[str] = []
+        items: list[str] = []
+        for filename in sorted(local_files):
+            try:
+                manifest: Manifest = ManifestCache.get(local_files[filename])
+            except OSError:
+                # Gone or unreadable since the index last saw it
+                continue
+
+            filenames.append(filename)
+            items.append(UDPBpubPacket.create_item(filename, manifest.get_data()))
+
+        # Saved once for the whole directory rather than after every file
+        ManifestCache.save()
+
+        statuses: list[int | None] = CommandHandler.request_batches(transport, UDPBpubPacket.create_packet, items)
+        CommandHandler.print_batch_results(filenames, statuses, "published", "already published")
+
+    @staticmethod
+    def handle_batch_unp(transport: ClientTransport, directory: str):
+        filenames: list[str] = sorted(FilesHandler.get_files_under(directory))
+        if len(filenames) <= 0:
+            print(f"No files to unpublish under {directory}")
+            return
+
+        statuses: list[int | None] = CommandHandler.request_batches(transport, UDPBunpPacket.create_packet, filenames)
+        CommandHandler.print_batch_results(filenames, statuses, "unpublished", "weren't published")
+
+    @staticmethod
+    def handle_lpf(transport: ClientTransport):
         request: bytes = UDPPacketHandling.create_udp_packet(
-            client_server_socket.getsockname()[0], server_address[0], 
-            client_server_socket.getsockname()[1], server_address[1],
+            transport.address[0], transport.server_address[0], 
+            transport.address[1], transport.server_address[1],
             PacketTypes.LPF, "".encode("utf-8")
         )
 
-        client_server_socket.sendto(request, server_address)
+        total, published_files = CommandHandler.request_pages(transport, request)
 
-        response: bytes = client_server_socket.recv(UDPPacket.UDP_PACKET_SIZE)
-        published_files: list[str] = UDPPacketHandling.get_payload_string_args(response)
-
-        if len(published_files) <= 0:
+        if total <= 0:
             print("No files published")
         else:
-            print(f"{len(published_files)} file{'s' if len(published_files) != 1 else ''} published:")
-            print(f"\n".join(published_files))
+            print(f"{total} file{'s' if total != 1 else ''} published:")
+            CommandHandler.print_pages(published_files)
+    
+    @staticmethod
+    def handle_sts(transport: ClientTransport):
+        request: bytes = UDPPacketHandling.create_udp_packet(
+            transport.address[0], transport.server_address[0], 
+            transport.address[1], transport.server_address[1],
+            PacketTypes.STATS, "".encode("utf-8")
+        )
+
+        # Stats always have items, so nothing back means we were refused
+        total, stats = CommandHandler.request_pages(transport, request)
+
+        if total <= 0:
+            print("Unable to get server stats, only admins can.")
+        else:
+            CommandHandler.print_pages(stats)
     
     @staticmethod
-    def handle_unp(client_server_socket: socket.socket, server_address: tuple[str, int], filename: str):
+    def handle_unp(transport: ClientTransport, filename: str):
         request: bytes = UDPUnpPacket.create_packet(
-            client_server_socket.getsockname()[0], server_address[0], 
-            client_server_socket.getsockname()[1], server_address[1],
+            transport.address[0], transport.server_address[0], 
+            transport.address[1], transport.server_address[1],
             filename
         )
 
-        client_server_socket.sendto(request, server_address)
-
-        response: bytes = client_server_socket.recv(UDPPacket.UDP_PACKET_SIZE)
+        response: bytes = transport.request(request)
         message_type: int = UDPPacketHandling.get_message_type(response)
 
         if message_type != PacketTypes.OK:
@@ -141,86 +305,223 @@ class CommandHandler:
             print(f"File unpublished successfully")
 
     @staticmethod
-    def handle_get(client_server_socket: socket.socket, server_address: tuple[str, int], filename: str):
+    def handle_get(transport: ClientTransport, filename: str):
         request: UDPGetPacketData = UDPGetPacket.create_packet(
-            client_server_socket.getsockname()[0], server_address[0], 
-            client_server_socket.getsockname()[1], server_address[1],
+            transport.address[0], transport.server_address[0], 
+            transport.address[1], transport.server_address[1],
             filename
         )
 
-        client_server_socket.sendto(request, server_address)
-
-        response: bytes = client_server_socket.recv(UDPPacket.UDP_PACKET_SIZE)
+        response: bytes = transport.request(request)
         message_type: int = UDPPacketHandling.get_message_type(response)
 
         if message_type != PacketTypes.OK:
             print(f"No copies of file with filename: {filename} found!")
             return
         
-        data: list[str] = UDPPacketHandling.get_payload_string_args(response)
-        sender_address = (data[0], int(data[1]))
-
-        transfer_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        # Set time out as 5 seconds, don't want client hanging if sender goes offline
-        transfer_socket.settimeout(5)
-        transfer_socket.connect(sender_address)
-
-        transfer_socket.send(f"{filename}".encode("utf-8"))
+        reply: UDPGetReplyData = UDPGetPacket.get_reply_data(response)
 
         # Daemon not set to true for this thread, because I'm assuming we should finish
         # all transfers before exiting. This can be changed later.
         threading.Thread(
             target=CommandHandler.handle_get_transfer,
-            args=(transfer_socket, filename),
+            args=(reply["address"], filename, reply["manifest"]),
         ).start()
 
     @staticmethod
-    def handle_get_transfer(connection: socket.socket, filename: str):
+    def handle_swarm_get(transport: ClientTransport, filename: str):
+        request: bytes = UDPSwmPacket.create_packet(
+            transport.address[0], transport.server_address[0], 
+            transport.address[1], transport.server_address[1],
+            filename, Swarm.MAX_PEERS
+        )
+
+        response: bytes = transport.request(request)
+        message_type: int = UDPPacketHandling.get_message_type(response)
+
+        if message_type != PacketTypes.OK:
+            print(f"No copies of file with filename: {filename} found!")
+            return
+
+        reply: UDPSwmReplyData = UDPSwmPacket.get_reply_data(response)
+
+        threading.Thread(target=SwarmDownloader(filename, reply["addresses"], reply["manifest"]).download).start()
+
+    @staticmethod
+    def handle_get_transfer(sender_address: tuple[str, int], filename: str, manifest_data: FileManifestData | None = None):
         if Path(filename).exists():
             print(f"File with this name already exists, cancelling file transfer")
-            connection.close()
             return
-        
-        
 
-        f = open(f"{os.getcwd()}/{filename}", "wb")
-        while True:
+        # Picks up from whatever an earlier, interrupted get of this file left behind
+        progress: DownloadProgress = DownloadProgress.load(filename)
+
+        manifest: Manifest | None = None
+        if manifest_data != None:
             try:
-                data = connection.recv(TCP.TCP_PACKET_SIZE)
-            except socket.timeout:
-                print(f"Connection timed out, cancelling file transfer.")
-                os.remove(filename)
-                connection.close()
+                manifest = Manifest.fetch(sender_address, filename, manifest_data)
+            except (OSError, ConnectionError, CorruptChunkError):
+                print(f"Sharer couldn't give a manifest matching the published one, cancelling file transfer.")
                 return
 
-            if not data:
-                break
+            # The partial was of a different version of the file
+            if progress.size != None and progress.size != manifest.size:
+                progress.ranges = []
+            progress.size = manifest.size
+        else:
+            print(f"{filename} was published without a manifest, it won't be verified")
+
+        if progress.is_resuming():
+            print(f"Resuming {filename} from {progress.get_received()} bytes")
+
+        # Until the sharer has told us the size, everything from the start is missing
+        missing: list[tuple[int, int]] = [(0, PeerProtocol.TO_END)] if progress.size == None \
+            else progress.get_missing(progress.size)
+
+        # Only whole chunks can be verified, so partial ones are fetched again
+        if manifest != None:
+            missing = [manifest.align(start, end) for start, end in missing]
+
+        # Hashing as we go only works if the rest of the file arrives in order
+        receiver: FileReceiver = FileReceiver()
+        if Downloads.HASH_ALGORITHM != None and len(missing) == 1 and manifest == None:
+            receiver.hasher = hashlib.new(Downloads.HASH_ALGORITHM)
+
+        bad_chunks: list[int] = []
+
+        try:
+            with progress.open_part() as f:
+                if progress.size != None:
+                    progress.preallocate(f, progress.size)
+
+                if manifest != None:
+                    receiver.verifier = ChunkVerifier(
+                        manifest, lambda index, verified: CommandHandler.record_chunk(
+                            progress, manifest, f, bad_chunks, index, verified
+                        )
+                    )
+
+                if receiver.hasher != None:
+                    receiver.hash_file(f, 0, missing[0][0])
+
+                for start, end in missing:
+                    CommandHandler.receive_range(sender_address, progress, receiver, f, start, end)
+
+                # Chunks that failed their check are fetched again on their own
+                for _ in range(Manifests.MAX_RETRIES):
+                    if len(bad_chunks) <= 0:
+                        break
+
+                    retrying: list[int] = list(bad_chunks)
+                    bad_chunks.clear()
+                    for index in retrying:
+                        CommandHandler.receive_range(
+                            sender_address, progress, receiver, f, *manifest.get_chunk_range(index)
+                        )
+
+                # Drop anything a stale partial had past the end of the file
+                f.truncate(progress.size)
+
+                if Downloads.HASH_ALGORITHM != None and receiver.hasher == None:
+                    receiver.hasher = hashlib.new(Downloads.HASH_ALGORITHM)
+                    receiver.hash_file(f, 0, progress.size)
+        except (OSError, ConnectionError):
+            progress.save()
+            print(f"Connection to sharer lost, {filename} paused at {progress.get_received()} bytes. Run get again to resume.")
+            return
 
-            f.write(data)
-        
+        if len(bad_chunks) > 0:
+            progress.save()
+            print(f"{len(bad_chunks)} chunk{'s' if len(bad_chunks) != 1 else ''} of {filename} kept failing verification, paused at {progress.get_received()} bytes.")
+            return
+
+        if progress.is_complete() != True:
+            progress.save()
+            print(f"Sharer stopped sending early, {filename} paused at {progress.get_received()} bytes. Run get again to resume.")
+            return
+
+        progress.finish()
         print(f"\n{filename} downloaded successfully!")
-        connection.close()
+        if manifest != None:
+            print(f"Verified against manifest {manifest.root}")
+        if receiver.hasher != None:
+            print(f"{Downloads.HASH_ALGORITHM}: {receiver.hasher.hexdigest()}")
 
     @staticmethod
-    def handle_sch(
-        client_server_socket: socket.socket, server_address: tuple[str, int], substring: str
+    def record_chunk(
+        progress: DownloadProgress, manifest: Manifest, f, bad_chunks: list[int], index: int, verified: bool
     ):
+        if verified != True:
+            bad_chunks.append(index)
+            return
+
+        # Verified chunks are the only progress recorded, saved every so often
+        start, end = manifest.get_chunk_range(index)
+        progress.add_range(start, end)
+        if end // DownloadProgress.CHECKPOINT_SIZE != start // DownloadProgress.CHECKPOINT_SIZE:
+            f.flush()
+            progress.save()
+
+    @staticmethod
+    def receive_range(
+        sender_address: tuple[str, int], progress: DownloadProgress, receiver: FileReceiver, f, start: int, end: int
+    ):
+        # Time out after 5 seconds, don't want client hanging if sender goes offline
+        length: int = PeerProtocol.TO_END if end == PeerProtocol.TO_END else end - start
+        connection, size = PeerProtocol.request_range(
+            sender_address, progress.filename, start, length, TCP.PEER_TIMEOUT
+        )
+
+        with connection:
+            # File changed on the sharer's side since we started, the partial is no good
+            if progress.size != None and progress.size != size:
+                progress.ranges = []
+                f.truncate(0)
+                raise ConnectionError("File changed on the sharer since the download started")
+
+            if progress.size == None:
+                progress.preallocate(f, size)
+
+            progress.size = size
+            end = min(end, size)
+
+            # With a manifest, progress is recorded as each chunk passes its check
+            if receiver.verifier != None:
+                receiver.verifier.start(start)
+                receiver.receive(connection, f, start, end)
+                f.flush()
+                return
+
+            # Otherwise it's only recorded for bytes that have been flushed
+            checkpoint: int = start
+            def on_write(position: int) -> None:
+                nonlocal checkpoint
+                if position - checkpoint >= DownloadProgress.CHECKPOINT_SIZE:
+                    f.flush()
+                    progress.add_range(checkpoint, position)
+                    progress.save()
+                    checkpoint = position
+
+            position: int = receiver.receive(connection, f, start, end, on_write)
+
+            f.flush()
+            progress.add_range(checkpoint, position)
+
+    @staticmethod
+    def handle_sch(transport: ClientTransport, substring: str):
         request: bytes = UDPSchPacket.create_packet(
-            client_server_socket.getsockname()[0], server_address[0], 
-            client_server_socket.getsockname()[1], server_address[1],
+            transport.address[0], transport.server_address[0], 
+            transport.address[1], transport.server_address[1],
             substring
         )
 
-        client_server_socket.sendto(request, server_address)
-        response: bytes = client_server_socket.recv(UDPPacket.UDP_PACKET_SIZE)
-
-        matching_files: list[str] = UDPPacketHandling.get_payload_string_args(response)
+        total, matching_files = CommandHandler.request_pages(transport, request)
 
-        if len(matching_files) <= 0:
+        if total <= 0:
             print("No files published containing that substring in its name.")
         else:
-            print(f"{len(matching_files)} file{'s' if len(matching_files) != 1 else ''} found:")
-            print(f"\n".join(matching_files))
+            print(f"{total} file{'s' if total != 1 else ''} found:")
+            CommandHandler.print_pages(matching_files)
         
 
 
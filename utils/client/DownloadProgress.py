@@ -0,0 +1,109 @@
+import os
+import json
+
+class DownloadProgress:
+    # Downloads are written to "<filename>.part", next to a small sidecar record of
+    # which byte ranges of it are known to be on disk. If a transfer stalls, both
+    # are kept, and the next get of the same file only asks for what's missing, from
+    # whichever sharer the server hands out. The record is only updated after the
+    # data it covers has been flushed, so it never claims more than is really there.
+
+    PART_SUFFIX = ".part"
+    PROGRESS_SUFFIX = ".progress"
+
+    # How much gets written between saves of the record, at most this much is refetched on resume
+    CHECKPOINT_SIZE = 4 * 1024 * 1024
+
+    def __init__(self, filename: str) -> None:
+        self.filename = filename
+        self.path = os.path.join(os.getcwd(), filename)
+        self.part_path = self.path + DownloadProgress.PART_SUFFIX
+        self.progress_path = self.path + DownloadProgress.PROGRESS_SUFFIX
+
+        self.size: int | None = None
+        self.ranges: list[list[int]] = []
+
+    @staticmethod
+    def load(filename: str) -> "DownloadProgress":
+        progress = DownloadProgress(filename)
+
+        # A record without its data (or the other way around) can't be trusted
+        if os.path.exists(progress.part_path) and os.path.exists(progress.progress_path):
+            try:
+                with open(progress.progress_path) as f:
+                    record: dict = json.load(f)
+
+                progress.size = record["size"]
+                progress.ranges = [list(byte_range) for byte_range in record["ranges"]]
+            except (OSError, ValueError, KeyError, TypeError):
+                progress.size = None
+                progress.ranges = []
+
+        return progress
+
+    def is_resuming(self) -> bool:
+        return len(self.ranges) > 0
+
+    def get_received(self) -> int:
+        return sum(end - start for start, end in self.ranges)
+
+    def open_part(self):
+        # Opened for in-place writes, created if this is a fresh download
+        if os.path.exists(self.part_path) != True:
+            open(self.part_path, "wb").close()
+
+        return open(self.part_path, "r+b")
+
+    def preallocate(self, f, size: int) -> None:
+        # Reserve the whole file up front where the platform can, so it isn't grown write by write
+        current: int = os.fstat(f.fileno()).st_size
+        if current > size:
+            f.truncate(size)
+        elif current < size:
+            try:
+                os.posix_fallocate(f.fileno(), 0, size)
+            except (AttributeError, OSError):
+                f.truncate(size)
+
+    def add_range(self, start: int, end: int) -> None:
+        if end <= start:
+            return
+
+        # Keep ranges sorted and merged so the record stays small
+        merged: list[list[int]] = []
+        for byte_range in sorted(self.ranges + [[start, end]]):
+            if merged and byte_range[0] <= merged[-1][1]:
+                merged[-1][1] = max(merged[-1][1], byte_range[1])
+            else:
+                merged.append(byte_range)
+
+        self.ranges = merged
+
+    def get_missing(self, size: int) -> list[tuple[int, int]]:
+        missing: list[tuple[int, int]] = []
+        position: int = 0
+        for start, end in self.ranges:
+            if start > position:
+                missing.append((position, min(start, size)))
+            position = max(position, end)
+
+        if position < size:
+            missing.append((position, size))
+
+        return missing
+
+    def is_complete(self) -> bool:
+        return self.size != None and len(self.get_missing(self.size)) <= 0
+
+    def save(self) -> None:
+        # Write then rename, so a crash mid-save leaves the old record intact
+        temporary_path: str = self.progress_path + ".tmp"
+        with open(temporary_path, "w") as f:
+            json.dump({"size": self.size, "ranges": self.ranges}, f)
+
+        os.replace(temporary_path, self.progress_path)
+
+    def finish(self) -> None:
+        os.replace(self.part_path, self.path)
+        if os.path.exists(self.progress_path):
+            os.remove(self.progress_path)
@@ -0,0 +1,70 @@
+import socket
+from typing import Callable
+
+from utils.Globals import Downloads
+
+class FileReceiver:
+    # Receives a byte range from a peer straight into one big reusable buffer with
+    # recv_into, and only writes to the file when the buffer fills up or the range
+    # ends, so a large download is a few hundred big writes instead of a small
+    # bytes object and a write per recv. A whole-file hash and a ChunkVerifier can
+    # both be fed in the same pass.
+
+    def __init__(self, buffer_size: int = Downloads.BUFFER_SIZE, hasher=None, verifier=None) -> None:
+        self.buffer: memoryview = memoryview(bytearray(buffer_size))
+        self.hasher = hasher
+        self.verifier = verifier
+
+    def receive(
+        self, connection: socket.socket, f, start: int, end: int,
+        on_write: Callable[[int], None] | None = None,
+        on_receive: Callable[[int], None] | None = None
+    ) -> int:
+        # Returns how far into the file we got. on_write gets the new position after
+        # every write, on_receive the number of bytes received so far after every recv.
+        f.seek(start)
+        position: int = start
+        filled: int = 0
+
+        while position + filled < end:
+            read: int = connection.recv_into(self.buffer[filled:min(len(self.buffer), filled + end - position - filled)])
+            if not read:
+                break
+
+            filled += read
+            if filled >= len(self.buffer):
+                position = self.write(f, position, filled, on_write)
+                filled = 0
+
+            if on_receive != None:
+                on_receive(position + filled - start)
+
+        if filled > 0:
+            position = self.write(f, position, filled, on_write)
+
+        return position
+
+    def write(self, f, position: int, filled: int, on_write: Callable[[int], None] | None) -> int:
+        data: memoryview = self.buffer[:filled]
+        f.write(data)
+        if self.hasher != None:
+            self.hasher.update(data)
+        if self.verifier != None:
+            self.verifier.update(data)
+
+        position += filled
+        if on_write != None:
+            on_write(position)
+
+        return position
+
+    def hash_file(self, f, start: int, end: int) -> None:
+        # Feeds bytes already on disk to the hasher, e.g. what an earlier attempt downloaded
+        f.seek(start)
+        while start < end:
+            read: int = f.readinto(self.buffer[:min(len(self.buffer), end - start)])
+            if not read:
+                break
+
+            self.hasher.update(self.buffer[:read])
+            start += read
@@ -1,13 +1,172 @@
 import os
+import threading
+from typing import TypedDict
+
+from utils.Globals import Manifests
+from utils.client.DownloadProgress import DownloadProgress
+
+class LocalFile(TypedDict):
+    """Class to define data structure of a file the client can share"""
+
+    path: str
+    size: int
+    mtime: float
+
+class LocalFileIndex:
+    # Maps filenames to where they are under the client's directory, so pub and
+    # incoming peer requests don't walk the whole tree each time. A directory's mtime
+    # changes whenever an entry is added, removed or renamed in it, so refreshing only
+    # has to stat each known directory and rescan the ones that changed.
+
+    # The client's own files (partial downloads and their progress records, the
+    # manifest cache, and anything mid write-then-rename) are never indexed, so
+    # peers can't fetch them and pub -r doesn't publish them
+    INTERNAL_SUFFIXES: tuple[str, ...] = (DownloadProgress.PART_SUFFIX, DownloadProgress.PROGRESS_SUFFIX, ".tmp")
+    INTERNAL_FILES: set[str] = {Manifests.CACHE_FILE}
+
+    def __init__(self, root: str = ".") -> None:
+        self.root = root
+        self.files: dict[str, LocalFile] = dict()
+
+        # Every directory we've scanned, its mtime then, and the files it gave us
+        self.directory_mtimes: dict[str, int] = dict()
+        self.directory_files: dict[str, set[str]] = dict()
+
+        # Lookups come from the command loop and from every upload thread
+        self.lock = threading.Lock()
+        self.built: bool = False
+
+    def build(self) -> None:
+        with self.lock:
+            self.files.clear()
+            self.directory_mtimes.clear()
+            self.directory_files.clear()
+
+            self.scan_directory(self.root)
+            self.built = True
+
+    def scan_directory(self, directory: str) -> None:
+        try:
+            mtime: int = os.stat(directory).st_mtime_ns
+            entries: list[os.DirEntry] = list(os.scandir(directory))
+        except OSError:
+            self.forget_directory(directory)
+            return
+
+        found: set[str] = set()
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    # New subdirectories get scanned now, known ones are refreshed on their own
+                    if entry.path not in self.directory_mtimes:
+                        self.scan_directory(entry.path)
+                    continue
+
+                stat: os.stat_result = entry.stat()
+            except OSError:
+                continue
+
+            if LocalFileIndex.is_internal(entry.name):
+                continue
+
+            found.add(entry.name)
+
+            # Same as walking the tree, the first copy found wins
+            existing: LocalFile | None = self.files.get(entry.name)
+            if existing == None or os.path.dirname(existing["path"]) == directory:
+                self.files[entry.name] = LocalFile(path=entry.path, size=stat.st_size, mtime=stat.st_mtime)
+
+        # Files that have gone from this directory since the last scan
+        for filename in self.directory_files.get(directory, set()) - found:
+            existing: LocalFile | None = self.files.get(filename)
+            if existing != None and os.path.dirname(existing["path"]) == directory:
+                del self.files[filename]
+
+        self.directory_mtimes[directory] = mtime
+        self.directory_files[directory] = found
+
+    @staticmethod
+    def is_internal(filename: str) -> bool:
+        return filename in LocalFileIndex.INTERNAL_FILES or filename.endswith(LocalFileIndex.INTERNAL_SUFFIXES)
+
+    def forget_directory(self, directory: str) -> None:
+        self.directory_mtimes.pop(directory, None)
+        for filename in self.directory_files.pop(directory, set()):
+            existing: LocalFile | None = self.files.get(filename)
+            if existing != None and os.path.dirname(existing["path"]) == directory:
+                del self.files[filename]
+
+    def refresh(self) -> None:
+        with self.lock:
+            if self.built != True:
+                self.scan_directory(self.root)
+                self.built = True
+                return
+
+            for directory, mtime in list(self.directory_mtimes.items()):
+                # Already rescanned (or dropped) as part of a parent's rescan
+                if self.directory_mtimes.get(directory) != mtime:
+                    continue
+
+                try:
+                    changed: bool = os.stat(directory).st_mtime_ns != mtime
+                except OSError:
+                    self.forget_directory(directory)
+                    continue
+
+                if changed:
+                    self.scan_directory(directory)
+
+    def lookup(self, filename: str) -> LocalFile | None:
+        with self.lock:
+            if self.built != True:
+                local_file: LocalFile | None = None
+            else:
+                local_file = self.files.get(filename)
+
+            if local_file != None:
+                # Writing to a file doesn't touch its directory, so check the file itself
+                try:
+                    stat: os.stat_result = os.stat(local_file["path"])
+                    local_file["size"] = stat.st_size
+                    local_file["mtime"] = stat.st_mtime
+                    return LocalFile(**local_file)
+                except OSError:
+                    pass
+
+        # Not there (or gone), something may have changed since the last refresh
+        self.refresh()
+
+        with self.lock:
+            local_file = self.files.get(filename)
+            return None if local_file == None else LocalFile(**local_file)
+
+    def get_files_under(self, directory: str) -> dict[str, LocalFile]:
+        # Every indexed file somewhere under the directory, by the name it's shared as
+        self.refresh()
+
+        prefix: str = os.path.join(os.path.abspath(directory), "")
+        with self.lock:
+            return {
+                filename: LocalFile(**local_file) for filename, local_file in self.files.items()
+                if os.path.abspath(local_file["path"]).startswith(prefix)
+            }
 
 class FilesHandler:
+    index: LocalFileIndex = LocalFileIndex()
+
+    @staticmethod
+    def build_index() -> None:
+        FilesHandler.index.build()
+
+    @staticmethod
+    def get_file(filename: str) -> LocalFile | None:
+        return FilesHandler.index.lookup(filename)
+
+    @staticmethod
+    def get_files_under(directory: str) -> dict[str, LocalFile]:
+        return FilesHandler.index.get_files_under(directory)
+
     @staticmethod
     def file_exists(filename: str) -> bool:
-        # Traverse from project root folder, rel path is kind of
-        # brittle, but it should be okay.
-        for root, dirs, files in os.walk("."):
-            for file in files:
-                if file == filename:
-                    return True
-
-        return False
+        return FilesHandler.get_file(filename) != None
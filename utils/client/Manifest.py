@@ -0,0 +1,214 @@
+import os
+import json
+import hashlib
+import struct
+import threading
+from typing import Callable
+
+from utils.Globals import Manifests
+from utils.networking.TCPHandler import TCP, PeerProtocol
+from utils.Exceptions import CorruptChunkError
+from utils.client.FilesHandler import LocalFile
+from utils.networking.UDPHandler import FileManifestData
+
+class Manifest:
+    # A file's size, the chunk size it was hashed with and the SHA-256 of every chunk.
+    # The root hash covers all of that, so the tracker only needs to store the root
+    # and a downloader can check the full list it gets from a peer against it.
+
+    # Structure: file size (Q), chunk size (I), then the chunk digests back to back
+    HEADER = struct.Struct("!QI")
+    DIGEST_SIZE = 32
+
+    def __init__(self, size: int, chunk_size: int, digests: list[bytes]) -> None:
+        self.size = size
+        self.chunk_size = chunk_size
+        self.digests = digests
+        self.root: str = hashlib.sha256(self.to_bytes()).hexdigest()
+
+    @staticmethod
+    def build(path: str, chunk_size: int = Manifests.CHUNK_SIZE) -> "Manifest":
+        buffer: memoryview = memoryview(bytearray(chunk_size))
+        digests: list[bytes] = []
+        size: int = 0
+
+        with open(path, "rb") as f:
+            while True:
+                read: int = f.readinto(buffer)
+                if not read:
+                    break
+
+                digests.append(hashlib.sha256(buffer[:read]).digest())
+                size += read
+
+        return Manifest(size, chunk_size, digests)
+
+    def to_bytes(self) -> bytes:
+        return Manifest.HEADER.pack(self.size, self.chunk_size) + b"".join(self.digests)
+
+    @staticmethod
+    def from_bytes(data: bytes) -> "Manifest":
+        if len(data) < Manifest.HEADER.size or (len(data) - Manifest.HEADER.size) % Manifest.DIGEST_SIZE != 0:
+            raise CorruptChunkError()
+
+        size, chunk_size = Manifest.HEADER.unpack_from(data)
+        digests: list[bytes] = [
+            data[start:start + Manifest.DIGEST_SIZE]
+            for start in range(Manifest.HEADER.size, len(data), Manifest.DIGEST_SIZE)
+        ]
+
+        manifest: Manifest = Manifest(size, chunk_size, digests)
+        if chunk_size <= 0 or len(digests) != manifest.get_chunk_count():
+            raise CorruptChunkError()
+
+        return manifest
+
+    @staticmethod
+    def fetch(peer: tuple[str, int], filename: str, expected: FileManifestData) -> "Manifest":
+        # The server only has the root, the chunk digests come from the sharer and
+        # are only trusted if they hash to that root
+        length: int = Manifest.get_length(expected)
+        if length > Manifests.MAX_SIZE:
+            raise CorruptChunkError()
+
+        data: bytes | None = PeerProtocol.request_manifest(peer, filename, TCP.PEER_TIMEOUT, length)
+        if data == None:
+            raise CorruptChunkError()
+
+        manifest: Manifest = Manifest.from_bytes(data)
+        if manifest.root != expected["root"] or manifest.size != expected["size"]:
+            raise CorruptChunkError()
+
+        return manifest
+
+    @staticmethod
+    def get_length(data: FileManifestData) -> int:
+        # How long the manifest for a published file has to be, its header and a digest a chunk
+        if data["chunk_size"] <= 0:
+            return Manifest.HEADER.size
+
+        chunks: int = (data["size"] + data["chunk_size"] - 1) // data["chunk_size"]
+        return Manifest.HEADER.size + chunks * Manifest.DIGEST_SIZE
+
+    def get_data(self) -> FileManifestData:
+        return FileManifestData(size=self.size, chunk_size=self.chunk_size, root=self.root)
+
+    def get_chunk_count(self) -> int:
+        return (self.size + self.chunk_size - 1) // self.chunk_size
+
+    def get_chunk_range(self, index: int) -> tuple[int, int]:
+        start: int = index * self.chunk_size
+        return (start, min(start + self.chunk_size, self.size))
+
+    def align(self, start: int, end: int) -> tuple[int, int]:
+        # Widens a byte range out to whole chunks, since only whole chunks can be checked
+        return (start - start % self.chunk_size, min(self.size, -(-end // self.chunk_size) * self.chunk_size))
+
+class ChunkVerifier:
+    # Hashes bytes as they're written and checks each chunk against the manifest as
+    # soon as its last byte goes past, so a download never has to read itself back.
+    # It's fed like a hashlib object, and has to be started at a chunk boundary.
+
+    def __init__(self, manifest: Manifest, on_chunk: Callable[[int, bool], None]) -> None:
+        self.manifest = manifest
+        self.on_chunk = on_chunk
+        self.start(0)
+
+    def start(self, offset: int) -> None:
+        self.index: int = offset // self.manifest.chunk_size
+        self.remaining: int = 0
+        if self.index < self.manifest.get_chunk_count():
+            start, end = self.manifest.get_chunk_range(self.index)
+            self.remaining = end - start
+
+        self.hasher = hashlib.sha256()
+
+    def update(self, data: memoryview) -> None:
+        while len(data) > 0 and self.remaining > 0:
+            taking: int = min(len(data), self.remaining)
+            self.hasher.update(data[:taking])
+            self.remaining -= taking
+            data = data[taking:]
+
+            if self.remaining <= 0:
+                self.on_chunk(self.index, self.hasher.digest() == self.manifest.digests[self.index])
+                self.start((self.index + 1) * self.manifest.chunk_size)
+
+class ManifestCache:
+    # Hashing a big file takes a while, so manifests are kept for as long as the
+    # file's mtime and size say it hasn't changed. Publishing it again, or serving
+    # its manifest to peers, is then free. They're saved to CACHE_FILE and loaded
+    # back when the client starts, so that holds across restarts too.
+    manifests: dict[str, tuple[float, int, Manifest]] = dict()
+    lock: threading.Lock = threading.Lock()
+    path: str = Manifests.CACHE_FILE
+
+    # Whether there's anything new since the cache was last saved
+    dirty: bool = False
+
+    @staticmethod
+    def load(path: str = Manifests.CACHE_FILE) -> None:
+        ManifestCache.path = path
+
+        try:
+            with open(path) as f:
+                record: dict = json.load(f)
+        except (OSError, ValueError):
+            return
+
+        if isinstance(record, dict) != True:
+            return
+
+        with ManifestCache.lock:
+            for file_path, entry in record.items():
+                # Anything that doesn't load just gets hashed again when it's needed
+                try:
+                    manifest: Manifest = Manifest.from_bytes(bytes.fromhex(entry["manifest"]))
+                    ManifestCache.manifests[file_path] = (entry["mtime"], entry["size"], manifest)
+                except (KeyError, TypeError, ValueError, CorruptChunkError):
+                    continue
+
+    @staticmethod
+    def save() -> None:
+        with ManifestCache.lock:
+            if ManifestCache.dirty != True:
+                return
+
+            # Files that have gone since don't need their manifests any more
+            record: dict = {
+                file_path: {"mtime": mtime, "size": size, "manifest": manifest.to_bytes().hex()}
+                for file_path, (mtime, size, manifest) in ManifestCache.manifests.items()
+                if os.path.exists(file_path)
+            }
+
+            # Write then rename, so a crash mid-save leaves the old cache intact
+            temporary_path: str = ManifestCache.path + ".tmp"
+            try:
+                with open(temporary_path, "w") as f:
+                    json.dump(record, f)
+
+                os.replace(temporary_path, ManifestCache.path)
+            except OSError:
+                # Not being able to save only costs hashing again next time
+                return
+
+            ManifestCache.dirty = False
+
+    @staticmethod
+    def get(local_file: LocalFile) -> Manifest:
+        with ManifestCache.lock:
+            entry: tuple[float, int, Manifest] | None = ManifestCache.manifests.get(local_file["path"])
+
+        if (
+            entry != None and entry[0] == local_file["mtime"] and entry[1] == local_file["size"] and
+            entry[2].chunk_size == Manifests.CHUNK_SIZE
+        ):
+            return entry[2]
+
+        manifest: Manifest = Manifest.build(local_file["path"])
+        with ManifestCache.lock:
+            # Replaces the manifest for an older version of the same file
+            ManifestCache.manifests[local_file["path"]] = (local_file["mtime"], local_file["size"], manifest)
+            ManifestCache.dirty = True
+
+        return manifest
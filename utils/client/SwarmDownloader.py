@@ -0,0 +1,210 @@
+import socket
+import threading
+import time
+from collections import deque
+from pathlib import Path
+
+from utils.Globals import Swarm
+from utils.networking.TCPHandler import PeerProtocol
+from utils.client.DownloadProgress import DownloadProgress
+from utils.client.FileReceiver import FileReceiver
+from utils.client.Manifest import Manifest, ChunkVerifier
+from utils.networking.UDPHandler import FileManifestData
+from utils.Exceptions import SlowPeerError, CorruptChunkError
+
+class SwarmDownloader:
+    # Downloads one file from several peers at once. The file is split into fixed
+    # size ranges that every peer pulls from a shared queue, so faster peers end up
+    # doing more of the work. Each range is written straight into its place in the
+    # file. If a peer drops or is too slow its range goes back on the queue for
+    # another peer, and that peer is dropped from the swarm. Finished ranges are
+    # recorded in a DownloadProgress, so an interrupted swarm can be resumed later.
+    # When the file was published with a manifest, every chunk is checked as it
+    # arrives. A peer that sends a bad chunk is dropped and only that chunk is queued
+    # again for the others.
+
+    def __init__(
+        self, filename: str, peers: list[tuple[str, int]], manifest_data: FileManifestData | None = None
+    ) -> None:
+        self.filename = filename
+        self.peers = peers
+        self.progress: DownloadProgress = DownloadProgress.load(filename)
+
+        self.manifest_data = manifest_data
+        self.manifest: Manifest | None = None
+
+        self.pending: deque[tuple[int, int]] = deque()
+        self.pending_lock = threading.Lock()
+        self.in_flight: int = 0
+
+        # Progress is written from every worker, so saves are serialised
+        self.progress_lock = threading.Lock()
+
+    def request_range(self, peer: tuple[str, int], offset: int, length: int) -> tuple[socket.socket, int]:
+        return PeerProtocol.request_range(peer, self.filename, offset, length, Swarm.PEER_TIMEOUT)
+
+    def get_file_size(self) -> int | None:
+        # An empty range from the first peer that answers tells us how big the file is
+        for peer in self.peers:
+            try:
+                connection, size = self.request_range(peer, 0, 0)
+                connection.close()
+                return size
+            except (OSError, ConnectionError):
+                continue
+
+        return None
+
+    def get_manifest(self) -> Manifest | None:
+        # Any peer will do, as long as its manifest matches the root the server gave us
+        for peer in self.peers:
+            try:
+                return Manifest.fetch(peer, self.filename, self.manifest_data)
+            except (OSError, ConnectionError, CorruptChunkError):
+                continue
+
+        return None
+
+    def fetch_range(
+        self, peer: tuple[str, int], receiver: FileReceiver, start: int, end: int
+    ) -> list[tuple[int, int]]:
+        # Returns the chunks of the range that failed verification
+        connection, _ = self.request_range(peer, start, end - start)
+        started: float = time.monotonic()
+
+        checked: list[tuple[int, bool]] = []
+        if self.manifest != None:
+            receiver.verifier = ChunkVerifier(self.manifest, lambda index, verified: checked.append((index, verified)))
+            receiver.verifier.start(start)
+
+        def on_receive(received: int) -> None:
+            # Give every peer a second before judging its speed
+            elapsed: float = time.monotonic() - started
+            if elapsed > 1 and received / elapsed < Swarm.MIN_PEER_RATE:
+                raise SlowPeerError()
+
+        with connection, open(self.progress.part_path, "r+b") as f:
+            if receiver.receive(connection, f, start, end, on_receive=on_receive) < end:
+                raise ConnectionError("Peer closed the connection early")
+
+        if self.manifest == None:
+            verified: list[tuple[int, int]] = [(start, end)]
+            failed: list[tuple[int, int]] = []
+        else:
+            verified = [self.manifest.get_chunk_range(index) for index, ok in checked if ok]
+            failed = [self.manifest.get_chunk_range(index) for index, ok in checked if ok != True]
+
+        # Only recorded once the whole range is on disk, a range that fails part way is refetched in full
+        with self.progress_lock:
+            for verified_start, verified_end in verified:
+                self.progress.add_range(verified_start, verified_end)
+            self.progress.save()
+
+        return failed
+
+    def take_range(self) -> tuple[int, int] | None:
+        with self.pending_lock:
+            if len(self.pending) <= 0:
+                return None
+
+            self.in_flight += 1
+            return self.pending.popleft()
+
+    def finish_range(self, failed: list[tuple[int, int]]) -> None:
+        with self.pending_lock:
+            self.in_flight -= 1
+
+            # Put them at the front so they're picked up again straight away
+            for byte_range in reversed(failed):
+                self.pending.appendleft(byte_range)
+
+    def work(self, peer: tuple[str, int]) -> None:
+        # Each worker receives into its own buffer
+        receiver: FileReceiver = FileReceiver()
+
+        while True:
+            byte_range: tuple[int, int] | None = self.take_range()
+
+            if byte_range == None:
+                # Another peer may still fail and hand its range back
+                with self.pending_lock:
+                    if self.in_flight <= 0:
+                        return
+
+                time.sleep(0.1)
+                continue
+
+            try:
+                failed: list[tuple[int, int]] = self.fetch_range(peer, receiver, *byte_range)
+            except (OSError, ConnectionError, SlowPeerError):
+                self.finish_range([byte_range])
+                return
+
+            self.finish_range(failed)
+
+            # A peer that sent bad data isn't trusted with any more of the file
+            if len(failed) > 0:
+                return
+
+    def download(self) -> bool:
+        if Path(self.filename).exists():
+            print(f"File with this name already exists, cancelling file transfer")
+            return False
+
+        range_size: int = Swarm.RANGE_SIZE
+        if self.manifest_data != None:
+            self.manifest = self.get_manifest()
+            if self.manifest == None:
+                print(f"No sharer could give a manifest matching the published one, cancelling file transfer.")
+                return False
+
+            size: int | None = self.manifest.size
+
+            # Ranges are whole chunks, so each one can be checked
+            range_size = max(1, Swarm.RANGE_SIZE // self.manifest.chunk_size) * self.manifest.chunk_size
+        else:
+            print(f"{self.filename} was published without a manifest, it won't be verified")
+            size = self.get_file_size()
+
+        if size == None:
+            print(f"None of the sharers could be reached, cancelling file transfer.")
+            return False
+
+        # The file changed on the sharers' side since an earlier attempt, start over
+        if self.progress.size != size:
+            self.progress.ranges = []
+        self.progress.size = size
+
+        if self.progress.is_resuming():
+            print(f"Resuming {self.filename} from {self.progress.get_received()} bytes")
+
+        for missing_start, missing_end in self.progress.get_missing(size):
+            if self.manifest != None:
+                missing_start, missing_end = self.manifest.align(missing_start, missing_end)
+
+            for start in range(missing_start, missing_end, range_size):
+                self.pending.append((start, min(start + range_size, missing_end)))
+
+        with self.progress.open_part() as f:
+            self.progress.preallocate(f, size)
+        self.progress.save()
+
+        workers: list[threading.Thread] = [
+            threading.Thread(target=self.work, args=(peer,)) for peer in self.peers
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        if len(self.pending) > 0:
+            print(f"Lost every sharer before {self.filename} finished, paused at {self.progress.get_received()} bytes. Run get again to resume.")
+            return False
+
+        self.progress.finish()
+
+        peers: str = f"{len(self.peers)} peer{'s' if len(self.peers) != 1 else ''}"
+        print(f"\n{self.filename} downloaded successfully from {peers}!")
+        if self.manifest != None:
+            print(f"Verified against manifest {self.manifest.root}")
+        return True
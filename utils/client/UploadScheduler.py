@@ -0,0 +1,208 @@
+import socket
+import selectors
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Callable
+
+from utils.Globals import Uploads
+from utils.networking.TCPHandler import TCP, PeerProtocol, PeerRequestData
+from utils.Exceptions import InvalidPeerRequest
+
+class TokenBucket:
+    # Caps the combined upload rate. Tokens are bytes, refilled at rate per second
+    # up to a burst of one second's worth, and senders wait until they have enough.
+
+    def __init__(self, rate: int) -> None:
+        self.rate = rate
+        self.capacity = rate
+        self.tokens: float = rate
+        self.updated: float = time.monotonic()
+        self.lock = threading.Lock()
+
+    def consume(self, amount: int) -> None:
+        # Asking for more than the bucket holds would wait forever, take it in pieces
+        while amount > 0:
+            taking: int = min(amount, self.capacity)
+
+            with self.lock:
+                now: float = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+
+                # Go into debt and sleep it off, so waiting senders are served in turn
+                self.tokens -= taking
+                wait: float = -self.tokens / self.rate if self.tokens < 0 else 0
+
+            if wait > 0:
+                time.sleep(wait)
+
+            amount -= taking
+
+class UploadScheduler:
+    # Serves peer connections on a fixed set of worker threads instead of a thread
+    # per connection. Each connection's request is read first, by one thread watching
+    # all the new ones at once, so it can be queued under the peer that sent it. The
+    # workers take from each peer in turn, so one peer asking for lots of files can't
+    # starve the rest. Once max_queued connections are waiting, new ones are closed
+    # straight away and the peer can retry or go to another sharer.
+    #
+    # Peers on the same host all connect from the same IP, so a peer is told apart by
+    # the IP and the listening port it sends with its request, the same address the
+    # tracker knows it by. Requests that don't say fall back to the IP alone.
+
+    def __init__(
+        self, serve: Callable[[socket.socket, TokenBucket | None, PeerRequestData], None],
+        max_uploads: int = Uploads.MAX_CONCURRENT, max_queued: int = Uploads.MAX_QUEUED,
+        bandwidth_limit: int | None = Uploads.BANDWIDTH_LIMIT
+    ) -> None:
+        self.serve = serve
+        self.max_uploads = max_uploads
+        self.max_queued = max_queued
+        self.bucket: TokenBucket | None = None if bandwidth_limit == None else TokenBucket(bandwidth_limit)
+
+        # Peer -> its requests waiting for a worker, in the order peers get their next turn
+        self.peer_queues: OrderedDict[
+            tuple[str, int | None], deque[tuple[socket.socket, PeerRequestData]]
+        ] = OrderedDict()
+
+        # Accepted connections not yet handed to the reader thread, which is woken
+        # through the socket pair to pick them up
+        self.arrivals: list[tuple[socket.socket, tuple[str, int]]] = []
+        self.wakeup_receiver, self.wakeup_sender = socket.socketpair()
+
+        # Everything accepted and not yet taken by a worker, and how much of it has
+        # had its request read
+        self.queued: int = 0
+        self.ready: int = 0
+
+        self.active: int = 0
+        self.rejected: int = 0
+        self.failed: int = 0
+        self.condition = threading.Condition()
+
+    def start(self) -> None:
+        threading.Thread(target=self.read_requests, daemon=True).start()
+        for _ in range(self.max_uploads):
+            threading.Thread(target=self.work, daemon=True).start()
+
+    def submit(self, connection: socket.socket, address: tuple[str, int]) -> bool:
+        with self.condition:
+            if self.queued >= self.max_queued:
+                self.rejected += 1
+                connection.close()
+                return False
+
+            self.arrivals.append((connection, address))
+            self.queued += 1
+
+            # The reader only needs waking once for however many arrive meanwhile
+            if len(self.arrivals) == 1:
+                self.wakeup_sender.send(b"\x00")
+
+        return True
+
+    def read_requests(self) -> None:
+        selector: selectors.BaseSelector = selectors.DefaultSelector()
+        selector.register(self.wakeup_receiver, selectors.EVENT_READ)
+
+        # When to give up on each connection still to send its request. They all get
+        # the same timeout, so they're in deadline order.
+        deadlines: dict[socket.socket, float] = dict()
+
+        while True:
+            timeout: float | None = None
+            if len(deadlines) > 0:
+                timeout = max(0, next(iter(deadlines.values())) - time.monotonic())
+
+            for key, _ in selector.select(timeout):
+                if key.fileobj is self.wakeup_receiver:
+                    self.wakeup_receiver.recv(TCP.TCP_PACKET_SIZE)
+                    with self.condition:
+                        arrivals, self.arrivals = self.arrivals, []
+
+                    for connection, address in arrivals:
+                        connection.setblocking(False)
+                        selector.register(connection, selectors.EVENT_READ, address)
+                        deadlines[connection] = time.monotonic() + TCP.PEER_TIMEOUT
+
+                    continue
+
+                selector.unregister(key.fileobj)
+                del deadlines[key.fileobj]
+                self.read_request(key.fileobj, key.data)
+
+            # A peer that never sends its request shouldn't hold a place in the queue
+            now: float = time.monotonic()
+            while len(deadlines) > 0:
+                connection, deadline = next(iter(deadlines.items()))
+                if deadline > now:
+                    break
+
+                selector.unregister(connection)
+                del deadlines[connection]
+                self.drop(connection)
+
+    def read_request(self, connection: socket.socket, address: tuple[str, int]) -> None:
+        # Requests are small enough to arrive in one go, same as when a worker read them
+        try:
+            data: bytes = connection.recv(TCP.TCP_PACKET_SIZE)
+            if not data:
+                raise InvalidPeerRequest()
+
+            request: PeerRequestData = PeerProtocol.parse_request(data)
+            connection.settimeout(TCP.PEER_TIMEOUT)
+        except (OSError, InvalidPeerRequest):
+            self.drop(connection)
+            return
+
+        with self.condition:
+            self.peer_queues.setdefault((address[0], request["peer_port"]), deque()).append((connection, request))
+            self.ready += 1
+            self.condition.notify()
+
+    def drop(self, connection: socket.socket) -> None:
+        connection.close()
+        with self.condition:
+            self.queued -= 1
+
+    def take(self) -> tuple[socket.socket, PeerRequestData]:
+        with self.condition:
+            while self.ready <= 0:
+                self.condition.wait()
+
+            # Serve the peer whose turn it is, then send it to the back of the line
+            peer, requests = self.peer_queues.popitem(last=False)
+            connection, request = requests.popleft()
+            if len(requests) > 0:
+                self.peer_queues[peer] = requests
+
+            self.ready -= 1
+            self.queued -= 1
+            self.active += 1
+
+        return (connection, request)
+
+    def work(self) -> None:
+        while True:
+            connection, request = self.take()
+
+            try:
+                self.serve(connection, self.bucket, request)
+            except OSError:
+                pass
+            except Exception as e:
+                # Whatever went wrong was down to this one connection, the worker
+                # carries on with the next so a bad peer can't use up the pool
+                self.failed += 1
+                print(f"Unable to send {request['filename']} to a peer: {e}")
+            finally:
+                connection.close()
+                with self.condition:
+                    self.active -= 1
+
+    def get_active_uploads(self) -> int:
+        return self.active
+
+    def get_queue_depth(self) -> int:
+        return self.queued
@@ -0,0 +1,53 @@
+import socket
+from functools import lru_cache
+
+class Checksum:
+    # Internet checksum (RFC 1071) worked out over whole buffers instead of one
+    # byte pair at a time. Because 2^16 = 1 (mod 0xFFFF), the one's complement
+    # sum of every 16-bit word in a buffer is the same as the whole buffer read
+    # as one big-endian integer, mod 0xFFFF. So int.from_bytes and a single
+    # modulo do all the work in C, rather than a Python loop per word.
+
+    WORD_MODULUS = 0xFFFF
+
+    @staticmethod
+    def fold(data: bytes | bytearray | memoryview) -> int:
+        value: int = int.from_bytes(data, "big")
+
+        # Odd length buffers are padded with a zero byte at the end
+        if len(data) & 1:
+            value <<= 8
+
+        return value % Checksum.WORD_MODULUS
+
+    @staticmethod
+    @lru_cache(maxsize=1024)
+    def _fold_addresses(src_ip: str, dst_ip: str) -> int:
+        # Only a handful of address pairs ever show up, so cache the part of the
+        # pseudo-header that doesn't change between packets
+        return Checksum.fold(socket.inet_aton(src_ip) + socket.inet_aton(dst_ip))
+
+    @staticmethod
+    def fold_pseudo_header(src_ip: str, dst_ip: str, packet_length: int) -> int:
+        # Pseudo-header is src IP (4B), dst IP (4B), reserved (1B), protocol (1B)
+        # and UDP length (2B). Reserved + protocol is one word, length is another.
+        return Checksum._fold_addresses(src_ip, dst_ip) + socket.IPPROTO_UDP + packet_length
+
+    @staticmethod
+    def compute(src_ip: str, dst_ip: str, packet: bytes | bytearray | memoryview) -> int:
+        total: int = Checksum.fold_pseudo_header(src_ip, dst_ip, len(packet)) + Checksum.fold(packet)
+
+        # The pseudo-header is never all zeros, so a zero remainder here means the
+        # end-around carry sum was 0xFFFF (negative zero), not zero
+        word_sum: int = total % Checksum.WORD_MODULUS or Checksum.WORD_MODULUS
+
+        # Return one's compliment
+        return ~word_sum & 0xFFFF
+
+    @staticmethod
+    def verify(src_ip: str, dst_ip: str, packet: bytes | bytearray | memoryview) -> bool:
+        # Summing a packet with its checksum already filled in gives 0xFFFF when
+        # nothing was corrupted, which is 0 mod 0xFFFF
+        total: int = Checksum.fold_pseudo_header(src_ip, dst_ip, len(packet)) + Checksum.fold(packet)
+
+        return total % Checksum.WORD_MODULUS == 0
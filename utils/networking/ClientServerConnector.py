@@ -3,60 +3,167 @@ import threading
 import time
 import os
 
-from utils.Globals import Env, PacketTypes
-from utils.networking.UDPHandler import UDPPacketHandling, UDPPacket, UDPHbtPacket
-from utils.networking.TCPHandler import TCP
-from utils.client.FilesHandler import FilesHandler
+from utils.Globals import Env, PacketTypes, Uploads, Sessions
+from utils.networking.UDPHandler import UDPPacketHandling, UDPHbtPacket
+from utils.networking.ClientTransport import ClientTransport
+from utils.networking.TCPHandler import TCP, PeerProtocol, PeerRequestData
+from utils.client.FilesHandler import FilesHandler, LocalFile
+from utils.client.UploadScheduler import UploadScheduler, TokenBucket
+from utils.client.Manifest import ManifestCache
+from utils.Exceptions import InvalidPeerRequest
 
 class ClientNetworkHandler:
+    # Serves incoming peer requests, its load is reported to the server with each heartbeat
+    upload_scheduler: UploadScheduler | None = None
+
+    # How uploads are sent, see Uploads in Globals
+    use_sendfile: bool = Uploads.USE_SENDFILE
+    upload_chunk_size: int = Uploads.CHUNK_SIZE
+
     @staticmethod
-    def new_client(connection: socket.socket) -> None:
-        requested: str = connection.recv(TCP.TCP_PACKET_SIZE).decode(TCP.TCP_ENCODING_FORMAT)
-        
-        if FilesHandler.file_exists(requested) != True:
-            connection.close()
+    def send_buffered(
+        connection: socket.socket, f, offset: int, count: int | None, bucket: TokenBucket | None = None
+    ) -> None:
+        # Fallback for when sendfile can't be used, one reusable buffer and sendall
+        # so partial sends are retried instead of silently dropped
+        buffer: memoryview = memoryview(bytearray(ClientNetworkHandler.upload_chunk_size))
+        f.seek(offset)
+
+        while count != 0:
+            read: int = f.readinto(buffer if count == None else buffer[:min(len(buffer), count)])
+            if not read:
+                break
+
+            if bucket != None:
+                bucket.consume(read)
+
+            connection.sendall(buffer[:read])
+            if count != None:
+                count -= read
+
+    @staticmethod
+    def send_file(
+        connection: socket.socket, f, offset: int, count: int | None, bucket: TokenBucket | None = None
+    ) -> None:
+        if count == 0:
             return
-        
-        # Find file either in cwd or move into subdirectories to find
-        for root, dirs, files in os.walk("."):
-            for file in files:
-                if file == requested:
-                    f = open(os.path.join(root, file), "rb")
-        
-        # Send the file in 1024B chunks to the requesting peer
-        while True:
-            chunk = f.read(TCP.TCP_PACKET_SIZE)
 
-            if not chunk:
+        if ClientNetworkHandler.use_sendfile != True or hasattr(os, "sendfile") != True:
+            ClientNetworkHandler.send_buffered(connection, f, offset, count, bucket)
+            return
+
+        # sendfile has the kernel copy straight from the page cache to the socket
+        if bucket == None:
+            connection.sendfile(f, offset, count)
+            return
+
+        # Rate limited, so hand it to the kernel a chunk at a time as tokens allow
+        end: int = os.fstat(f.fileno()).st_size if count == None else offset + count
+        while offset < end:
+            chunk: int = min(ClientNetworkHandler.upload_chunk_size, end - offset)
+            bucket.consume(chunk)
+
+            sent: int = connection.sendfile(f, offset, chunk)
+            if sent <= 0:
                 break
 
-            connection.send(chunk)
+            offset += sent
+
+    @staticmethod
+    def new_client(
+        connection: socket.socket, bucket: TokenBucket | None = None, request: PeerRequestData | None = None
+    ) -> None:
+        # The upload scheduler has already read the request, anyone else leaves it to us
+        with connection:
+            if request == None:
+                try:
+                    request = PeerProtocol.parse_request(connection.recv(TCP.TCP_PACKET_SIZE))
+                except InvalidPeerRequest:
+                    return
 
-        connection.close()
+            local_file: LocalFile | None = FilesHandler.get_file(request["filename"])
+
+            if request["manifest"]:
+                data: bytes = b"" if local_file == None else ManifestCache.get(local_file).to_bytes()
+                connection.sendall(PeerProtocol.MANIFEST_REPLY.pack(len(data)) + data)
+                return
+
+            if local_file == None:
+                return
+
+            with open(local_file["path"], "rb") as f:
+                offset: int = 0
+                count: int | None = None
+
+                # Range requests get the file size first, then just the bytes asked for
+                if request["offset"] != None:
+                    size: int = os.fstat(f.fileno()).st_size
+                    connection.sendall(PeerProtocol.RANGE_REPLY.pack(size))
+
+                    offset = min(request["offset"], size)
+                    count = min(request["length"], size - offset)
+
+                ClientNetworkHandler.send_file(connection, f, offset, count, bucket)
 
     @staticmethod
     def listen(listening_socket: socket.socket) -> None:
-        listening_socket.listen()
+        # Sent with our own requests, so sharers can tell us apart from other peers on this host
+        PeerProtocol.listening_port = listening_socket.getsockname()[1]
+
+        scheduler: UploadScheduler = UploadScheduler(ClientNetworkHandler.new_client)
+        scheduler.start()
+        ClientNetworkHandler.upload_scheduler = scheduler
+
+        # The listen backlog holds connections while the scheduler's queue is full
+        listening_socket.listen(Uploads.MAX_QUEUED)
         while True:
             connection, address = listening_socket.accept()
-            threading.Thread(
-                target=ClientNetworkHandler.new_client, 
-                args=(connection,)
-            ).start()
+            scheduler.submit(connection, address)
 
     @staticmethod
-    def heart_beat_mechanism(socket: socket.socket, username: str, server_port: int):
+    def get_upload_load() -> tuple[int, int]:
+        scheduler: UploadScheduler | None = ClientNetworkHandler.upload_scheduler
+        if scheduler == None:
+            return (0, 0)
+
+        return (scheduler.get_active_uploads(), scheduler.get_queue_depth())
+
+    @staticmethod
+    def heart_beat_mechanism(transport: ClientTransport, username: str):
+        # Any request the server gets renews the session just like a heartbeat, so
+        # one is only sent after HEARTBEAT_INTERVAL with nothing else acknowledged.
+        # If the upload load has changed though, it still goes every interval so the
+        # server hears about it.
+        interval: float = Sessions.HEARTBEAT_INTERVAL
+        last_heartbeat: float = time.monotonic()
+        last_load: tuple[int, int] = (0, 0)
+
         while True:
-            time.sleep(2)
+            active_uploads, queue_depth = ClientNetworkHandler.get_upload_load()
+            due: float = last_heartbeat + interval
+
+            if (active_uploads, queue_depth) == last_load:
+                due = max(due, transport.last_acknowledged + interval)
+
+            # Checks back a few times an interval in case the load changes meanwhile
+            now: float = time.monotonic()
+            if now < due:
+                time.sleep(min(due - now, interval / 4))
+                continue
+
+            last_heartbeat = now
+            last_load = (active_uploads, queue_depth)
+
             heart_beat_packet = UDPHbtPacket.create_packet(
-                Env.CLIENT_IP, Env.SERVER_IP, socket.getsockname()[1], server_port,
-                username
+                transport.address[0], transport.server_address[0],
+                transport.address[1], transport.server_address[1],
+                username, active_uploads, queue_depth
             )
 
-            socket.sendto(heart_beat_packet, (Env.SERVER_IP, server_port))
+            transport.send(heart_beat_packet)
 
     @staticmethod
-    def connect_to_server(server_port: int) -> socket:
+    def connect_to_server(server_port: int) -> ClientTransport:
         client_server_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
         client_server_socket.bind((Env.CLIENT_IP, 0))
 
@@ -65,8 +172,8 @@ class ClientNetworkHandler:
 
         client_server_port: int = client_server_socket.getsockname()[1]
 
-        # Socket will throw timeout exception if takes more than 5 seconds for response.
-        client_server_socket.settimeout(5.0)
+        # Retransmits lost requests, and times out if there's still no response after 5 seconds
+        transport: ClientTransport = ClientTransport(client_server_socket, (Env.SERVER_IP, server_port))
 
         while True:
             username: str = input("Enter username: ")
@@ -78,10 +185,8 @@ class ClientNetworkHandler:
                 PacketTypes.AUTH, auth_payload.encode("utf-8")
             )
 
-            client_server_socket.sendto(payload, (Env.SERVER_IP, server_port))
-
             try:
-                response = client_server_socket.recvfrom(UDPPacket.UDP_PACKET_SIZE)[0]
+                response: bytes = transport.request(payload)
                 response_type: int = UDPPacketHandling.get_message_type(response)
 
                 if (response_type != PacketTypes.OK):
@@ -96,7 +201,7 @@ class ClientNetworkHandler:
         # Start heartbeat mechanism
         threading.Thread(
             target=ClientNetworkHandler.heart_beat_mechanism,
-            args=(client_server_socket, username, server_port),
+            args=(transport, username),
             daemon=True
         ).start()
 
@@ -107,4 +212,4 @@ class ClientNetworkHandler:
             daemon=True
         ).start()
         
-        return client_server_socket
+        return transport
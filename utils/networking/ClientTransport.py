@@ -0,0 +1,194 @@
+import time
+import random
+import socket
+import threading
+from concurrent.futures import Future
+
+from utils.Globals import Transport
+from utils.networking.UDPHandler import UDPPacketCodec, UDPPacketHandling, UDPPacket
+
+class RttEstimator:
+    # Smoothed RTT and its variance, worked into a retransmission timeout the way TCP
+    # does it (Jacobson/Karels, RFC 6298). Retransmitted requests are never sampled,
+    # since there's no telling which copy a reply was for (Karn), and every
+    # retransmission doubles the timeout until a clean sample brings it back down.
+
+    ALPHA = 1 / 8
+    BETA = 1 / 4
+    K = 4
+
+    def __init__(self) -> None:
+        self.srtt: float | None = None
+        self.rttvar: float = 0
+        self.rto: float = Transport.INITIAL_RTO
+
+    def sample(self, rtt: float) -> None:
+        if self.srtt == None:
+            self.srtt = rtt
+            self.rttvar = rtt / 2
+        else:
+            self.rttvar = (1 - RttEstimator.BETA) * self.rttvar + RttEstimator.BETA * abs(self.srtt - rtt)
+            self.srtt = (1 - RttEstimator.ALPHA) * self.srtt + RttEstimator.ALPHA * rtt
+
+        self.rto = min(Transport.MAX_RTO, max(Transport.MIN_RTO, self.srtt + RttEstimator.K * self.rttvar))
+
+    def back_off(self) -> None:
+        self.rto = min(Transport.MAX_RTO, self.rto * 2)
+
+class PendingRequest:
+    def __init__(self, packet: bytes, now: float, rto: float) -> None:
+        self.packet = packet
+        self.future: Future = Future()
+        self.sent_at: float = now
+        self.attempts: int = 1
+        self.retransmit_at: float = now + rto
+        self.deadline: float = now + Transport.REQUEST_TIMEOUT
+
+class ClientTransport:
+    # Everything the client sends the server goes through here. Each request is
+    # tagged with an ID the server echoes back, so several can be out at once and a
+    # background thread hands each reply to the future waiting on it. Replies nobody
+    # is waiting for (duplicates, or ones for a request that already timed out) are
+    # dropped, so a late reply can never be taken for the answer to something else.
+    # Requests that go unanswered are sent again after an RTO worked out from
+    # measured round trips, until REQUEST_TIMEOUT runs out.
+
+    def __init__(self, client_socket: socket.socket, server_address: tuple[str, int]) -> None:
+        self.socket = client_socket
+        self.address: tuple[str, int] = client_socket.getsockname()
+        self.server_address = server_address
+
+        self.rtt: RttEstimator = RttEstimator()
+        self.pending: dict[int, PendingRequest] = dict()
+        self.lock: threading.Lock = threading.Lock()
+        self.in_flight: threading.BoundedSemaphore = threading.BoundedSemaphore(Transport.MAX_IN_FLIGHT)
+
+        # 0 is for untagged packets, so IDs skip it when they wrap around. They start
+        # somewhere random so a client that ends up on the address a previous one had
+        # doesn't reuse its IDs too.
+        self.next_id: int = random.randrange(1, 0xFFFFFFFF)
+
+        self.retransmissions: int = 0
+        self.corrupt_packets: int = 0
+        self.stale_replies: int = 0
+
+        # When the last request the server is known to have got was sent. Any request
+        # renews the session, so the heartbeat thread doesn't need to send one until
+        # HEARTBEAT_INTERVAL after this.
+        self.last_acknowledged: float = time.monotonic()
+
+        self.socket.settimeout(Transport.TICK)
+        threading.Thread(target=self.receive_replies, daemon=True).start()
+
+    def submit(self, packet: bytes) -> Future:
+        # Sends a request without waiting, the future's result is the reply packet,
+        # or socket.timeout if there wasn't one in time
+        self.in_flight.acquire()
+
+        with self.lock:
+            request_id: int = self.next_id
+            self.next_id = self.next_id % 0xFFFFFFFF + 1
+
+            tagged: bytes = UDPPacketCodec.set_request_id(packet, self.server_address[0], request_id)
+            pending: PendingRequest = PendingRequest(tagged, time.monotonic(), self.rtt.rto)
+            self.pending[request_id] = pending
+
+        self.socket.sendto(tagged, self.server_address)
+
+        return pending.future
+
+    def request(self, packet: bytes) -> bytes:
+        return self.submit(packet).result()
+
+    def request_many(self, packets: list[bytes]) -> list[bytes]:
+        # All sent before waiting on any, so they cost about one round trip together
+        futures: list[Future] = [self.submit(packet) for packet in packets]
+
+        return [future.result() for future in futures]
+
+    def send(self, packet: bytes) -> None:
+        # Fire and forget, for packets that don't get a reply (HBT)
+        self.socket.sendto(packet, self.server_address)
+
+    def receive_replies(self) -> None:
+        while True:
+            try:
+                response: bytes = self.socket.recv(UDPPacket.UDP_PACKET_SIZE)
+                self.complete(response)
+            except socket.timeout:
+                pass
+            except OSError:
+                # Usually an ICMP error for something we sent, e.g. the server isn't up
+                # (yet), and retransmitting takes care of it. Once the socket's closed
+                # though nothing more can come back, so whoever's waiting is told now.
+                if self.socket.fileno() == -1:
+                    self.fail_pending()
+                    return
+
+            self.retransmit_due()
+
+    def complete(self, response: bytes) -> None:
+        if UDPPacketHandling.verify_checksum(response, self.address[0]) != True:
+            self.corrupt_packets += 1
+            return
+
+        with self.lock:
+            pending: PendingRequest | None = self.pending.pop(UDPPacketHandling.get_request_id(response), None)
+            if pending == None:
+                self.stale_replies += 1
+                return
+
+            # Only first attempts count, a retransmission may have been answered from
+            # the server's replay cache, which doesn't renew anything
+            if pending.attempts == 1:
+                self.rtt.sample(time.monotonic() - pending.sent_at)
+                self.last_acknowledged = max(self.last_acknowledged, pending.sent_at)
+
+        self.in_flight.release()
+        pending.future.set_result(response)
+
+    def retransmit_due(self) -> None:
+        now: float = time.monotonic()
+        expired: list[PendingRequest] = []
+        due: list[PendingRequest] = []
+
+        with self.lock:
+            for request_id, pending in list(self.pending.items()):
+                if now >= pending.deadline:
+                    del self.pending[request_id]
+                    expired.append(pending)
+                elif now >= pending.retransmit_at:
+                    due.append(pending)
+
+            # However many requests timed out together, it's one sign of congestion,
+            # so the RTO only backs off once for them
+            if due:
+                self.rtt.back_off()
+
+            for pending in due:
+                pending.attempts += 1
+                pending.retransmit_at = now + self.rtt.rto
+
+        resending: list[bytes] = [pending.packet for pending in due]
+
+        for packet in resending:
+            self.retransmissions += 1
+            try:
+                self.socket.sendto(packet, self.server_address)
+            except OSError:
+                # Lost like any other datagram, it's tried again after the next RTO
+                pass
+
+        self.expire(expired)
+
+    def expire(self, expired: list[PendingRequest]) -> None:
+        for pending in expired:
+            self.in_flight.release()
+            pending.future.set_exception(socket.timeout("Server didn't respond in time, try again"))
+
+    def fail_pending(self) -> None:
+        with self.lock:
+            expired: list[PendingRequest] = list(self.pending.values())
+            self.pending.clear()
+
+        self.expire(expired)
@@ -1,4 +1,162 @@
+import socket
+import struct
+from typing import TypedDict
+
+from utils.Exceptions import InvalidPeerRequest
 
 class TCP:
     TCP_PACKET_SIZE = 1024
-    TCP_ENCODING_FORMAT = "utf-8"
\ No newline at end of file
+    TCP_ENCODING_FORMAT = "utf-8"
+    # Seconds to wait on a peer before giving up on it
+    PEER_TIMEOUT = 5
+
+class PeerRequestData(TypedDict):
+    """Class to define data structure of a request from one peer to another"""
+
+    filename: str
+    # None for a plain whole-file request
+    offset: int | None
+    length: int | None
+    # Asking for the file's chunk manifest rather than its bytes
+    manifest: bool
+    # The listening port the requester registered with the tracker, None if it didn't say
+    peer_port: int | None
+
+class PeerProtocol:
+    # A plain request is just the filename, and the whole file is streamed back.
+    # A range request starts with a NUL byte, which can't be in a filename, then the
+    # offset and length, then the filename. The reply starts with the full size of
+    # the file so the requester can plan the rest of its ranges. A manifest request
+    # is its own marker then the filename, and is answered with the manifest's length
+    # then the manifest (a length of 0 if the peer doesn't have one).
+    #
+    # Any of them can be prefixed with the requester's listening port, so a sharer
+    # can tell apart peers that all connect from the same IP. Together with the IP
+    # it's the same address the tracker knows the peer by.
+
+    RANGE_MAGIC = b"\x00R"
+    RANGE_REQUEST = struct.Struct("!2sQQ")
+    RANGE_REPLY = struct.Struct("!Q")
+
+    MANIFEST_MAGIC = b"\x00M"
+    MANIFEST_REPLY = struct.Struct("!I")
+
+    PEER_MAGIC = b"\x00P"
+    PEER_PREFIX = struct.Struct("!2sH")
+
+    # Length meaning "everything from offset to the end of the file"
+    TO_END = 0xFFFFFFFFFFFFFFFF
+
+    # Our own listening port once we have one, sent with every request we make
+    listening_port: int | None = None
+
+    @staticmethod
+    def add_peer_prefix(request: bytes) -> bytes:
+        if PeerProtocol.listening_port == None:
+            return request
+
+        return PeerProtocol.PEER_PREFIX.pack(PeerProtocol.PEER_MAGIC, PeerProtocol.listening_port) + request
+
+    @staticmethod
+    def create_request(filename: str) -> bytes:
+        return PeerProtocol.add_peer_prefix(filename.encode(TCP.TCP_ENCODING_FORMAT))
+
+    @staticmethod
+    def create_range_request(filename: str, offset: int, length: int) -> bytes:
+        return PeerProtocol.add_peer_prefix(
+            PeerProtocol.RANGE_REQUEST.pack(PeerProtocol.RANGE_MAGIC, offset, length) +
+            filename.encode(TCP.TCP_ENCODING_FORMAT)
+        )
+
+    @staticmethod
+    def create_manifest_request(filename: str) -> bytes:
+        return PeerProtocol.add_peer_prefix(PeerProtocol.MANIFEST_MAGIC + filename.encode(TCP.TCP_ENCODING_FORMAT))
+
+    @staticmethod
+    def decode_filename(filename: bytes) -> str:
+        # Peers can send anything, a name that isn't valid utf-8 can't be a shared file
+        try:
+            return filename.decode(TCP.TCP_ENCODING_FORMAT)
+        except UnicodeDecodeError:
+            raise InvalidPeerRequest()
+
+    @staticmethod
+    def parse_request(request: bytes) -> PeerRequestData:
+        peer_port: int | None = None
+        if request.startswith(PeerProtocol.PEER_MAGIC) and len(request) >= PeerProtocol.PEER_PREFIX.size:
+            _, peer_port = PeerProtocol.PEER_PREFIX.unpack_from(request)
+            request = request[PeerProtocol.PEER_PREFIX.size:]
+
+        if request.startswith(PeerProtocol.RANGE_MAGIC) and len(request) >= PeerProtocol.RANGE_REQUEST.size:
+            _, offset, length = PeerProtocol.RANGE_REQUEST.unpack_from(request)
+
+            return PeerRequestData(
+                filename=PeerProtocol.decode_filename(request[PeerProtocol.RANGE_REQUEST.size:]),
+                offset=offset,
+                length=length,
+                manifest=False,
+                peer_port=peer_port
+            )
+
+        if request.startswith(PeerProtocol.MANIFEST_MAGIC):
+            return PeerRequestData(
+                filename=PeerProtocol.decode_filename(request[len(PeerProtocol.MANIFEST_MAGIC):]),
+                offset=None,
+                length=None,
+                manifest=True,
+                peer_port=peer_port
+            )
+
+        return PeerRequestData(
+            filename=PeerProtocol.decode_filename(request),
+            offset=None,
+            length=None,
+            manifest=False,
+            peer_port=peer_port
+        )
+
+    @staticmethod
+    def receive_exactly(connection: socket.socket, size: int) -> bytes:
+        data: bytearray = bytearray()
+        while len(data) < size:
+            chunk: bytes = connection.recv(size - len(data))
+            if not chunk:
+                raise ConnectionError("Peer closed the connection early")
+
+            data += chunk
+
+        return bytes(data)
+
+    @staticmethod
+    def request_range(
+        peer: tuple[str, int], filename: str, offset: int, length: int, timeout: float
+    ) -> tuple[socket.socket, int]:
+        # Returns the connection, positioned at the start of the range's bytes, and the file size
+        connection: socket.socket = socket.create_connection(peer, timeout=timeout)
+        try:
+            connection.sendall(PeerProtocol.create_range_request(filename, offset, length))
+            size: int = PeerProtocol.RANGE_REPLY.unpack(
+                PeerProtocol.receive_exactly(connection, PeerProtocol.RANGE_REPLY.size)
+            )[0]
+        except Exception:
+            connection.close()
+            raise
+
+        return (connection, size)
+
+    @staticmethod
+    def request_manifest(peer: tuple[str, int], filename: str, timeout: float, max_length: int) -> bytes | None:
+        with socket.create_connection(peer, timeout=timeout) as connection:
+            connection.sendall(PeerProtocol.create_manifest_request(filename))
+            length: int = PeerProtocol.MANIFEST_REPLY.unpack(
+                PeerProtocol.receive_exactly(connection, PeerProtocol.MANIFEST_REPLY.size)
+            )[0]
+
+            if length == 0:
+                return None
+
+            # The length is whatever the peer says, don't go allocating for more than could be right
+            if length > max_length:
+                raise ConnectionError("Peer sent a manifest longer than expected")
+
+            return PeerProtocol.receive_exactly(connection, length)
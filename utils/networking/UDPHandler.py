@@ -1,73 +1,45 @@
 import struct
 import socket
+import threading
 from abc import ABC, abstractmethod
+from functools import lru_cache
 from typing import TypedDict
 
 from utils.Exceptions import *
 from utils.Globals import PacketTypes
+from utils.networking.Checksum import Checksum
 
 class UDPPacketHandling:
     @staticmethod
     def create_udp_packet(
-        src_ip: str, dst_ip: str, src_port: int, dst_port: int, message_type: int, payload: bytes
+        src_ip: str, dst_ip: str, src_port: int, dst_port: int, message_type: int, payload: bytes,
+        request_id: int = 0
     ) -> bytes | Exception:
-        if message_type > pow(2, 16) or len(payload) > pow(2, 16):
-            raise Exception("Invalid packet, cannot generate")
-        
-        length: int = UDPPacket.UDP_TOTAL_HEADER_SIZE + len(payload)
-
-        # Structure: 2 bytes (H = short) per field in struct
-        header_no_checksum = struct.pack(
-            "!HHHHHH4s", src_port, dst_port, length, 0, message_type, len(payload), socket.inet_aton(src_ip)
-        )
-
-        checksum: int = UDPPacketHandling.get_checksum(src_ip, dst_ip, header_no_checksum + payload)
-
-        header_with_checksum = struct.pack(
-            "!HHHHHH4s", src_port, dst_port, length, checksum, message_type, len(payload), socket.inet_aton(src_ip)
-        )
-
-        return header_with_checksum + payload
+        return UDPPacketCodec.encode(src_ip, dst_ip, src_port, dst_port, message_type, payload, request_id)
     
     @staticmethod
     def get_checksum(src_ip: str, dst_ip: str, packet: bytes) -> int:
-        packet_length: int = len(packet)
-        # Stucture of a pseudo-header, which is required for check sum, is:
-        # Source IP - 4B
-        # Destination IP - 4B
-        # Reserved - 1B
-        # Protocol - 1B
-        # UDP Length - 2B
-        pseudoheader: bytes = struct.pack(
-            "!4s4sBBH", socket.inet_aton(src_ip), socket.inet_aton(dst_ip), 0, socket.IPPROTO_UDP, packet_length
-        )
-
-        full_packet: bytes = pseudoheader + packet
-        full_packet_length: int = len(full_packet)
-
-        checksum: int = 0
-        # Loop over for each byte pair (word), so 2 bytes at a time
-        for i in range(0, full_packet_length, 2):
-            first_byte = full_packet[i] << 8
+        return Checksum.compute(src_ip, dst_ip, packet)
 
-            if i + 1 < full_packet_length:
-                second_byte = full_packet[i]
-            else:
-                second_byte = 0
-
-            combined = first_byte + second_byte
-            checksum += combined
+    @staticmethod
+    def verify_checksum(packet: bytes, dst_ip: str) -> bool:
+        # Anything too short to even hold a header is corrupt
+        if len(packet) < UDPPacket.UDP_TOTAL_HEADER_SIZE:
+            return False
 
-            # Have to wrap around if sum has gone over 2 bytes
-            # This means adding the overflow to least significant bit
-            checksum = (checksum & 0xFFFF) + (checksum >> 16)
+        length: int = UDPPacketHandling._get_field_value(
+            packet, UDPPacket.UDP_LENGTH_OFFSET, UDPPacket.UDP_LENGTH_SIZE
+        )
+        if length < UDPPacket.UDP_TOTAL_HEADER_SIZE or length > len(packet):
+            return False
 
-        # Return one's compliment
-        return ~checksum & 0xFFFF
+        return Checksum.verify(
+            UDPPacketHandling.get_source_ip(packet), dst_ip, memoryview(packet)[:length]
+        )
     
     @staticmethod
     def _get_field_value(packet: bytes, offset: int, size: int):
-        return struct.unpack("!H", packet[offset:offset + size])[0]
+        return UDPPacketCodec.FIELD.unpack_from(packet, offset)[0]
     
     @staticmethod
     def get_payload_size(packet: bytes) -> int:
@@ -81,11 +53,14 @@ class UDPPacketHandling:
             packet, UDPPacket.UDP_MESSAGE_TYPE_OFFSET, UDPPacket.UDP_MESSAGE_TYPE_SIZE
         )
     
+    @staticmethod
+    def get_request_id(packet: bytes) -> int:
+        return UDPPacketCodec.REQUEST_ID.unpack_from(packet, UDPPacket.UDP_REQUEST_ID_OFFSET)[0]
+
     @staticmethod
     def get_source_ip(packet: bytes) -> str:
-        size: int = UDPPacket.UDP_SRC_IP_SIZE
         offset: int = UDPPacket.UDP_SRC_IP_OFFSET
-        return socket.inet_ntoa(struct.unpack("!4s", packet[offset:offset + size])[0])
+        return UDPPacketCodec.unpack_ip(bytes(packet[offset:offset + UDPPacket.UDP_SRC_IP_SIZE]))
     
     @staticmethod
     def get_source_port(packet: bytes) -> int:
@@ -95,23 +70,15 @@ class UDPPacketHandling:
     
     @staticmethod
     def get_payload(packet: bytes) -> bytes:
-        payload_size = UDPPacketHandling.get_payload_size(packet)
-        return packet[UDPPacket.UDP_TOTAL_HEADER_SIZE:(UDPPacket.UDP_TOTAL_HEADER_SIZE + payload_size)]
+        return bytes(UDPPacketCodec.decode(packet).payload)
     
     @staticmethod
     def get_payload_string(packet: bytes):
-        payload: bytes = UDPPacketHandling.get_payload(packet)
-        return payload.decode("utf-8")
+        return UDPPacketCodec.decode(packet).get_payload_string()
     
     @staticmethod
     def get_payload_string_args(packet: bytes) -> list[str]:
-        payload: bytes = UDPPacketHandling.get_payload(packet)
-
-        # Even if payload is empty, there will still be '' element without this
-        if payload.decode("utf-8") == '':
-            return []
-        else:
-            return payload.decode("utf-8").split(",")
+        return UDPPacketCodec.decode(packet).get_payload_string_args()
 
 class UDPPacket:
     # The whole point of this class it to keep the structure of the UDP packet used
@@ -146,6 +113,11 @@ class UDPPacket:
     UDP_SRC_IP_OFFSET = UDP_PAYLOAD_SIZE_OFFSET + UDP_PAYLOAD_SIZE_SIZE
     UDP_SRC_IP_SIZE = 4
 
+    # Request ID, echoed back in the reply so a client with several requests out can
+    # tell which one it's for. 0 means the sender isn't matching replies (e.g. HBT)
+    UDP_REQUEST_ID_OFFSET = UDP_SRC_IP_OFFSET + UDP_SRC_IP_SIZE
+    UDP_REQUEST_ID_SIZE = 4
+
     # Total header size
     UDP_TOTAL_HEADER_SIZE = (
         UDP_SRC_PORT_SIZE + 
@@ -154,13 +126,164 @@ class UDPPacket:
         UDP_CHECKSUM_SIZE + 
         UDP_MESSAGE_TYPE_SIZE + 
         UDP_PAYLOAD_SIZE_SIZE + 
-        UDP_SRC_IP_SIZE
+        UDP_SRC_IP_SIZE +
+        UDP_REQUEST_ID_SIZE
     )
 
     # UDP Packet Size
     UDP_MAX_PAYLOAD_SIZE = 1024
     UDP_PACKET_SIZE = UDP_MAX_PAYLOAD_SIZE + UDP_TOTAL_HEADER_SIZE
 
+    # Largest packet the 2 byte length field can describe
+    UDP_MAX_LENGTH = 0xFFFF
+
+class UDPPacketView:
+    """
+     A lightweight view over a received datagram. The header is unpacked once when
+     the view is made and the payload is a memoryview, so nothing is copied until a
+     handler actually asks for strings
+    """
+
+    __slots__ = (
+        "packet", "src_port", "dst_port", "length", "checksum",
+        "message_type", "payload_size", "packed_src_ip", "request_id"
+    )
+
+    def __init__(self, packet: bytes | bytearray | memoryview) -> None:
+        if len(packet) < UDPPacket.UDP_TOTAL_HEADER_SIZE:
+            raise CorruptPacketError()
+
+        self.packet: memoryview = memoryview(packet)
+        (
+            self.src_port, self.dst_port, self.length, self.checksum,
+            self.message_type, self.payload_size, self.packed_src_ip, self.request_id
+        ) = UDPPacketCodec.HEADER.unpack_from(packet)
+
+        # A datagram shorter than its length says, or whose payload size doesn't add up
+        # to its length, got cut short or is lying, so it's rejected instead of sliced
+        if (
+            self.length > len(packet) or
+            self.payload_size != self.length - UDPPacket.UDP_TOTAL_HEADER_SIZE
+        ):
+            raise CorruptPacketError()
+
+    @property
+    def src_ip(self) -> str:
+        return UDPPacketCodec.unpack_ip(self.packed_src_ip)
+
+    @property
+    def source_address(self) -> tuple[str, int]:
+        return (UDPPacketCodec.unpack_ip(self.packed_src_ip), self.src_port)
+
+    @property
+    def payload(self) -> memoryview:
+        start: int = UDPPacket.UDP_TOTAL_HEADER_SIZE
+        return self.packet[start:start + self.payload_size]
+
+    def get_payload_string(self) -> str:
+        return str(self.payload, "utf-8")
+
+    def get_payload_string_args(self) -> list[str]:
+        # Even if payload is empty, there will still be '' element without this
+        if self.payload_size == 0:
+            return []
+
+        return str(self.payload, "utf-8").split(",")
+
+class UDPPacketCodec:
+    """
+     Precompiled encoder/decoder for BitTrickle UDP packets. Packets are decoded once
+     into a UDPPacketView, and built with pack_into into a reusable per-thread buffer
+     with the checksum patched in place afterwards
+    """
+
+    # Structure: 2 bytes (H = short) per field in struct, then the 4 byte source IP
+    # and the 4 byte request ID
+    HEADER = struct.Struct("!HHHHHH4sI")
+    FIELD = struct.Struct("!H")
+    REQUEST_ID = struct.Struct("!I")
+
+    _buffers = threading.local()
+
+    @staticmethod
+    @lru_cache(maxsize=1024)
+    def pack_ip(ip: str) -> bytes:
+        return socket.inet_aton(ip)
+
+    @staticmethod
+    @lru_cache(maxsize=1024)
+    def unpack_ip(packed_ip: bytes) -> str:
+        return socket.inet_ntoa(packed_ip)
+
+    @staticmethod
+    def decode(packet: "bytes | bytearray | memoryview | UDPPacketView") -> UDPPacketView:
+        if isinstance(packet, UDPPacketView):
+            return packet
+
+        return UDPPacketView(packet)
+
+    @staticmethod
+    def _get_buffer() -> bytearray:
+        # Each thread gets its own buffer, the client sends heartbeats from a
+        # different thread to the one running commands
+        buffer: bytearray | None = getattr(UDPPacketCodec._buffers, "buffer", None)
+        if buffer is None:
+            buffer = bytearray(UDPPacket.UDP_MAX_LENGTH)
+            UDPPacketCodec._buffers.buffer = buffer
+
+        return buffer
+
+    @staticmethod
+    def encode_into(
+        buffer: bytearray | memoryview, src_ip: str, dst_ip: str, src_port: int, dst_port: int,
+        message_type: int, payload: bytes | str, request_id: int = 0
+    ) -> int:
+        if isinstance(payload, str):
+            payload = payload.encode("utf-8")
+
+        length: int = UDPPacket.UDP_TOTAL_HEADER_SIZE + len(payload)
+        if message_type > UDPPacket.UDP_MAX_LENGTH or length > min(len(buffer), UDPPacket.UDP_MAX_LENGTH):
+            raise Exception("Invalid packet, cannot generate")
+
+        UDPPacketCodec.HEADER.pack_into(
+            buffer, 0, src_port, dst_port, length, 0, message_type, len(payload),
+            UDPPacketCodec.pack_ip(src_ip), request_id
+        )
+        buffer[UDPPacket.UDP_TOTAL_HEADER_SIZE:length] = payload
+
+        checksum: int = Checksum.compute(src_ip, dst_ip, memoryview(buffer)[:length])
+        UDPPacketCodec.FIELD.pack_into(buffer, UDPPacket.UDP_CHECKSUM_OFFSET, checksum)
+
+        return length
+
+    @staticmethod
+    def encode(
+        src_ip: str, dst_ip: str, src_port: int, dst_port: int, message_type: int, payload: bytes | str,
+        request_id: int = 0
+    ) -> bytes:
+        # Copies the packet out, for callers that keep it (e.g. to retransmit). The
+        # server builds its replies with encode_into instead.
+        buffer: bytearray = UDPPacketCodec._get_buffer()
+        length: int = UDPPacketCodec.encode_into(
+            buffer, src_ip, dst_ip, src_port, dst_port, message_type, payload, request_id
+        )
+
+        return bytes(memoryview(buffer)[:length])
+
+    @staticmethod
+    def set_request_id(packet: bytes, dst_ip: str, request_id: int) -> bytes:
+        # Tags an already built packet, so the UDP*Packet classes don't all need to
+        # know about request IDs. The ID is covered by the checksum, so that's redone.
+        tagged: bytearray = bytearray(packet)
+        UDPPacketCodec.REQUEST_ID.pack_into(tagged, UDPPacket.UDP_REQUEST_ID_OFFSET, request_id)
+        UDPPacketCodec.FIELD.pack_into(tagged, UDPPacket.UDP_CHECKSUM_OFFSET, 0)
+
+        src_ip: str = UDPPacketCodec.unpack_ip(bytes(tagged[UDPPacket.UDP_SRC_IP_OFFSET:UDPPacket.UDP_REQUEST_ID_OFFSET]))
+        checksum: int = Checksum.compute(src_ip, dst_ip, tagged)
+        UDPPacketCodec.FIELD.pack_into(tagged, UDPPacket.UDP_CHECKSUM_OFFSET, checksum)
+
+        return bytes(tagged)
+
 # TYPED DICTS TO KEEP STRUCTURE OF UDP PACKET TYPES EASILY KNOWN AND CHANGED
 
 class UDPGetPacketData(TypedDict):
@@ -176,17 +299,40 @@ class UDPAuthPacketData(TypedDict):
     listening_port: int
 
 class UDPHbtPacketData(TypedDict):
-    """Class to define data structure of an AUTH packet"""
+    """Class to define data structure of an HBT packet"""
 
     username: str
+    active_uploads: int
+    queue_depth: int
+
+class FileManifestData(TypedDict):
+    """Class to define data structure of the manifest summary a file is published with"""
+
+    size: int
+    chunk_size: int
+    root: str
+
+class UDPGetReplyData(TypedDict):
+    """Class to define data structure of the OK reply to a GET packet"""
+
+    address: tuple[str, int]
+    # None if the sharer published without a manifest
+    manifest: FileManifestData | None
+
+class UDPSwmReplyData(TypedDict):
+    """Class to define data structure of the OK reply to an SWM packet"""
+
+    addresses: list[tuple[str, int]]
+    manifest: FileManifestData | None
 
 class UDPPubPacketData(TypedDict):
-    """Class to define data structure of an AUTH packet"""
+    """Class to define data structure of a PUB packet"""
 
     filename: str
+    manifest: FileManifestData | None
 
 class UDPUnpPacketData(TypedDict):
-    """Class to define data structure of an AUTH packet"""
+    """Class to define data structure of an UNP packet"""
 
     filename: str
 
@@ -195,6 +341,44 @@ class UDPSchPacketData(TypedDict):
 
     substring: str
 
+class UDPSwmPacketData(TypedDict):
+    """Class to define data structure of an SWM (swarm GET) packet"""
+
+    filename: str
+    max_sharers: int
+
+class UDPPagePacketData(TypedDict):
+    """Class to define data structure of a PAGE packet"""
+
+    token: int
+    index: int
+    more: bool
+    total: int
+    items: list[str]
+
+class UDPNxtPacketData(TypedDict):
+    """Class to define data structure of an NXT packet"""
+
+    token: int
+    index: int
+
+class UDPBpubPacketData(TypedDict):
+    """Class to define data structure of a BPUB packet"""
+
+    # None for any item that couldn't be parsed
+    items: list[UDPPubPacketData | None]
+
+class UDPBunpPacketData(TypedDict):
+    """Class to define data structure of a BUNP packet"""
+
+    filenames: list[str]
+
+class UDPBatchReplyData(TypedDict):
+    """Class to define data structure of the OK reply to a BPUB or BUNP packet"""
+
+    # One BatchStatus per item, in the order the items were sent
+    statuses: list[int]
+
 class UDPGenericPacket(ABC):
     """
      An abstract class inherited by all other UDP packet classes
@@ -222,14 +406,15 @@ class UDPGenericPacket(ABC):
         pass
 
     @abstractmethod
-    def get_data(packet: bytes):
+    def get_data(packet: bytes | UDPPacketView):
         """
         A method to get all the packet's data in the required form
 
         Parameters
         ----------
-        packet: bytes
-            the packet that is to be broken down into its data components
+        packet: bytes | UDPPacketView
+            the packet that is to be broken down into its data components, either raw
+            or already decoded by UDPPacketCodec
         """
 
         pass
@@ -245,13 +430,13 @@ class UDPGetPacket(UDPGenericPacket):
     def create_packet(
         src_ip: str, dst_ip: str, src_port: int, dst_port: int, filename: str
     ) -> bytes:
-        return UDPPacketHandling.create_udp_packet(
+        return UDPPacketCodec.encode(
             src_ip, dst_ip, src_port, dst_port, PacketTypes.GET, filename.encode("utf-8")
         )
 
     @staticmethod
-    def get_data(packet: bytes) -> UDPGetPacketData:
-        args: list[str] = UDPPacketHandling.get_payload_string_args(packet)
+    def get_data(packet: bytes | UDPPacketView) -> UDPGetPacketData:
+        args: list[str] = UDPPacketCodec.decode(packet).get_payload_string_args()
 
         if args.__len__() != UDPGetPacket.NUM_ARGS:
             raise CorruptPacketError()
@@ -260,6 +445,22 @@ class UDPGetPacket(UDPGenericPacket):
             filename=args[0]
         )
 
+    @staticmethod
+    def create_reply_payload(address: tuple[str, int], manifest: FileManifestData | None) -> bytes:
+        return ",".join([address[0], str(address[1])] + UDPPubPacket.manifest_to_args(manifest)).encode("utf-8")
+
+    @staticmethod
+    def get_reply_data(packet: bytes | UDPPacketView) -> UDPGetReplyData:
+        args: list[str] = UDPPacketCodec.decode(packet).get_payload_string_args()
+
+        if len(args) != 2 and len(args) != 5:
+            raise CorruptPacketError()
+
+        return UDPGetReplyData(
+            address=(args[0], int(args[1])),
+            manifest=UDPPubPacket.manifest_from_args(args[2:])
+        )
+
 class UDPAuthPacket(UDPGenericPacket):
     """
      A class to create and parse UDP AUTH packets
@@ -271,13 +472,13 @@ class UDPAuthPacket(UDPGenericPacket):
     def create_packet(
         src_ip: str, dst_ip: str, src_port: int, dst_port: int, credentials: str
     ) -> bytes:
-        return UDPPacketHandling.create_udp_packet(
+        return UDPPacketCodec.encode(
             src_ip, dst_ip, src_port, dst_port, PacketTypes.AUTH, credentials
         )
     
     @staticmethod
-    def get_data(packet: bytes) -> UDPAuthPacketData:
-        args: list[str] = UDPPacketHandling.get_payload_string_args(packet)
+    def get_data(packet: bytes | UDPPacketView) -> UDPAuthPacketData:
+        args: list[str] = UDPPacketCodec.decode(packet).get_payload_string_args()
 
         if args.__len__() != UDPAuthPacket.NUM_ARGS:
             raise CorruptPacketError()
@@ -290,59 +491,122 @@ class UDPAuthPacket(UDPGenericPacket):
 
 class UDPHbtPacket(UDPGenericPacket):
     """
-     A class to create and parse UDP HBT packets
+     A class to create and parse UDP HBT packets. Besides keeping the session alive,
+     a heartbeat reports how busy the peer is uploading so the server can spread GETs
     """
 
     NUM_ARGS: int = len(UDPHbtPacketData.__annotations__)
 
     @staticmethod
     def create_packet(
-        src_ip: str, dst_ip: str, src_port: int, dst_port: int, username: str
+        src_ip: str, dst_ip: str, src_port: int, dst_port: int, username: str,
+        active_uploads: int = 0, queue_depth: int = 0
     ) -> bytes:
-        return UDPPacketHandling.create_udp_packet(
-            src_ip, dst_ip, src_port, dst_port, PacketTypes.HBT, username.encode("utf-8")
+        return UDPPacketCodec.encode(
+            src_ip, dst_ip, src_port, dst_port, PacketTypes.HBT,
+            f"{username},{active_uploads},{queue_depth}".encode("utf-8")
         )
     
     @staticmethod
-    def get_data(packet: bytes) -> UDPAuthPacketData:
-        args: list[str] = UDPPacketHandling.get_payload_string_args(packet)
+    def get_data(packet: bytes | UDPPacketView) -> UDPHbtPacketData:
+        args: list[str] = UDPPacketCodec.decode(packet).get_payload_string_args()
+
+        # Older clients only send their username
+        if len(args) == 1:
+            args += ["0", "0"]
 
-        if len(args) != UDPHbtPacket.NUM_ARGS:
+        if len(args) != UDPHbtPacket.NUM_ARGS or not args[1].isnumeric() or not args[2].isnumeric():
             raise CorruptPacketError()
 
-        return UDPAuthPacketData(
-            username=args[0]
+        return UDPHbtPacketData(
+            username=args[0],
+            active_uploads=int(args[1]),
+            queue_depth=int(args[2])
         )
 
+    @staticmethod
+    def get_load(packet: bytes | UDPPacketView) -> tuple[int, int]:
+        """
+         Parses just the upload load from a HBT payload, for the server's heartbeat
+         fast path. The username isn't needed there since sessions are looked up by
+         the address the heartbeat came from
+
+         Parameters
+         ----------
+         packet : bytes | UDPPacketView
+          The HBT packet
+        
+         Returns
+         -------
+         tuple[int, int]
+          The number of active uploads and the upload queue depth
+
+         Raises
+         ------
+         CorruptPacketError
+          If the payload isn't a username optionally followed by two numbers
+        """
+        args: list[bytes] = bytes(UDPPacketCodec.decode(packet).payload).split(b",")
+
+        # Older clients only send their username
+        if len(args) == 1:
+            return (0, 0)
+
+        if len(args) != UDPHbtPacket.NUM_ARGS or not args[1].isdigit() or not args[2].isdigit():
+            raise CorruptPacketError()
+
+        return (int(args[1]), int(args[2]))
+
 class UDPPubPacket(UDPGenericPacket):
     """
-     A class to create and parse UDP PUB packets
+     A class to create and parse UDP PUB packets. The file's manifest summary goes
+     along with its name so downloaders can check what they get
     """
 
-    NUM_ARGS: int = len(UDPPubPacketData.__annotations__)
-
     @staticmethod
     def create_packet(
-        src_ip: str, dst_ip: str, src_port: int, dst_port: int, filename: str
+        src_ip: str, dst_ip: str, src_port: int, dst_port: int, filename: str,
+        manifest: FileManifestData | None = None
     ) -> bytes:
-        return UDPPacketHandling.create_udp_packet(
-            src_ip, dst_ip, src_port, dst_port, PacketTypes.PUB, filename.encode("utf-8")
+        return UDPPacketCodec.encode(
+            src_ip, dst_ip, src_port, dst_port, PacketTypes.PUB,
+            ",".join([filename] + UDPPubPacket.manifest_to_args(manifest)).encode("utf-8")
         )
     
     @staticmethod
-    def get_data(packet: bytes) -> UDPPubPacketData:
-        args: list[str] = UDPPacketHandling.get_payload_string_args(packet)
+    def get_data(packet: bytes | UDPPacketView) -> UDPPubPacketData:
+        args: list[str] = UDPPacketCodec.decode(packet).get_payload_string_args()
 
-        if len(args) != UDPPubPacket.NUM_ARGS:
+        # Older clients only send the filename
+        if len(args) != 1 and len(args) != 4:
             raise CorruptPacketError()
 
         return UDPPubPacketData(
-            filename=args[0]
+            filename=args[0],
+            manifest=UDPPubPacket.manifest_from_args(args[1:])
         )
 
+    @staticmethod
+    def manifest_to_args(manifest: FileManifestData | None) -> list[str]:
+        if manifest == None:
+            return []
+
+        return [str(manifest["size"]), str(manifest["chunk_size"]), manifest["root"]]
+
+    @staticmethod
+    def manifest_from_args(args: list[str]) -> FileManifestData | None:
+        # Empty fields mean no manifest, same as leaving them off
+        if len(args) == 0 or all(arg == "" for arg in args):
+            return None
+
+        if len(args) != 3 or not args[0].isnumeric() or not args[1].isnumeric() or int(args[1]) <= 0:
+            raise CorruptPacketError()
+
+        return FileManifestData(size=int(args[0]), chunk_size=int(args[1]), root=args[2])
+
 class UDPUnpPacket(UDPGenericPacket):
     """
-     A class to create and parse UDP LPF packets
+     A class to create and parse UDP UNP packets
     """
 
     NUM_ARGS: int = len(UDPUnpPacketData.__annotations__)
@@ -351,13 +615,13 @@ class UDPUnpPacket(UDPGenericPacket):
     def create_packet(
         src_ip: str, dst_ip: str, src_port: int, dst_port: int, filename: str
     ) -> bytes:
-        return UDPPacketHandling.create_udp_packet(
+        return UDPPacketCodec.encode(
             src_ip, dst_ip, src_port, dst_port, PacketTypes.UNP, filename.encode("utf-8")
         )
     
     @staticmethod
-    def get_data(packet: bytes) -> UDPUnpPacketData:
-        args: list[str] = UDPPacketHandling.get_payload_string_args(packet)
+    def get_data(packet: bytes | UDPPacketView) -> UDPUnpPacketData:
+        args: list[str] = UDPPacketCodec.decode(packet).get_payload_string_args()
 
         if len(args) != UDPUnpPacket.NUM_ARGS:
             raise CorruptPacketError()
@@ -377,17 +641,245 @@ class UDPSchPacket(UDPGenericPacket):
     def create_packet(
         src_ip: str, dst_ip: str, src_port: int, dst_port: int, substring: str
     ) -> bytes:
-        return UDPPacketHandling.create_udp_packet(
+        return UDPPacketCodec.encode(
             src_ip, dst_ip, src_port, dst_port, PacketTypes.SCH, substring.encode("utf-8")
         )
 
     @staticmethod
-    def get_data(packet: bytes) -> UDPSchPacketData:
-        args: list[str] = UDPPacketHandling.get_payload_string_args(packet)
+    def get_data(packet: bytes | UDPPacketView) -> UDPSchPacketData:
+        args: list[str] = UDPPacketCodec.decode(packet).get_payload_string_args()
 
         if args.__len__() != UDPSchPacket.NUM_ARGS:
             raise CorruptPacketError()
 
         return UDPSchPacketData(
             substring=args[0]
-        )
\ No newline at end of file
+        )
+
+class UDPSwmPacket(UDPGenericPacket):
+    """
+     A class to create and parse UDP SWM packets, a GET that asks for several sharers
+    """
+
+    NUM_ARGS: int = len(UDPSwmPacketData.__annotations__)
+
+    @staticmethod
+    def create_packet(
+        src_ip: str, dst_ip: str, src_port: int, dst_port: int, filename: str, max_sharers: int
+    ) -> bytes:
+        return UDPPacketCodec.encode(
+            src_ip, dst_ip, src_port, dst_port, PacketTypes.SWM, f"{filename},{max_sharers}".encode("utf-8")
+        )
+
+    @staticmethod
+    def get_data(packet: bytes | UDPPacketView) -> UDPSwmPacketData:
+        args: list[str] = UDPPacketCodec.decode(packet).get_payload_string_args()
+
+        if len(args) != UDPSwmPacket.NUM_ARGS or not args[1].isnumeric():
+            raise CorruptPacketError()
+
+        return UDPSwmPacketData(
+            filename=args[0],
+            max_sharers=int(args[1])
+        )
+
+    @staticmethod
+    def create_reply_payload(addresses: list[tuple[str, int]], manifest: FileManifestData | None) -> bytes:
+        # The manifest fields always come first (empty if there isn't one), then ip,port pairs
+        fields: list[str] = UDPPubPacket.manifest_to_args(manifest) if manifest != None else ["", "", ""]
+        for address in addresses:
+            fields += [address[0], str(address[1])]
+
+        return ",".join(fields).encode("utf-8")
+
+    @staticmethod
+    def get_reply_data(packet: bytes | UDPPacketView) -> UDPSwmReplyData:
+        args: list[str] = UDPPacketCodec.decode(packet).get_payload_string_args()
+
+        if len(args) < 3 or (len(args) - 3) % 2 != 0:
+            raise CorruptPacketError()
+
+        return UDPSwmReplyData(
+            addresses=[(args[i], int(args[i + 1])) for i in range(3, len(args), 2)],
+            manifest=UDPPubPacket.manifest_from_args(args[:3])
+        )
+
+class UDPPagePacket(UDPGenericPacket):
+    """
+     A class to create and parse UDP PAGE packets, one page of a LAP/LPF/SCH result.
+     The payload is a small binary prefix followed by the page's items joined by ","
+    """
+
+    # Structure: result token (I), page index (H), more pages flag (B), total items (I)
+    PREFIX = struct.Struct("!IHBI")
+    MAX_ITEMS_SIZE: int = UDPPacket.UDP_MAX_PAYLOAD_SIZE - PREFIX.size
+
+    @staticmethod
+    def create_payload(token: int, index: int, more: bool, total: int, items: list[str]) -> bytes:
+        return UDPPagePacket.PREFIX.pack(token, index, more, total) + ",".join(items).encode("utf-8")
+
+    @staticmethod
+    def create_packet(
+        src_ip: str, dst_ip: str, src_port: int, dst_port: int,
+        token: int, index: int, more: bool, total: int, items: list[str]
+    ) -> bytes:
+        return UDPPacketCodec.encode(
+            src_ip, dst_ip, src_port, dst_port, PacketTypes.PAGE,
+            UDPPagePacket.create_payload(token, index, more, total, items)
+        )
+
+    @staticmethod
+    def get_data(packet: bytes | UDPPacketView) -> UDPPagePacketData:
+        payload: memoryview = UDPPacketCodec.decode(packet).payload
+
+        if len(payload) < UDPPagePacket.PREFIX.size:
+            raise CorruptPacketError()
+
+        token, index, more, total = UDPPagePacket.PREFIX.unpack_from(payload)
+        items: str = str(payload[UDPPagePacket.PREFIX.size:], "utf-8")
+
+        return UDPPagePacketData(
+            token=token,
+            index=index,
+            more=bool(more),
+            total=total,
+            items=items.split(",") if items != "" else []
+        )
+
+class UDPNxtPacket(UDPGenericPacket):
+    """
+     A class to create and parse UDP NXT packets, a request for the next page of a result
+    """
+
+    NUM_ARGS: int = len(UDPNxtPacketData.__annotations__)
+
+    @staticmethod
+    def create_packet(
+        src_ip: str, dst_ip: str, src_port: int, dst_port: int, token: int, index: int
+    ) -> bytes:
+        return UDPPacketCodec.encode(
+            src_ip, dst_ip, src_port, dst_port, PacketTypes.NXT, f"{token},{index}".encode("utf-8")
+        )
+
+    @staticmethod
+    def get_data(packet: bytes | UDPPacketView) -> UDPNxtPacketData:
+        args: list[str] = UDPPacketCodec.decode(packet).get_payload_string_args()
+
+        if len(args) != UDPNxtPacket.NUM_ARGS or not args[0].isnumeric() or not args[1].isnumeric():
+            raise CorruptPacketError()
+
+        return UDPNxtPacketData(
+            token=int(args[0]),
+            index=int(args[1])
+        )
+
+class UDPBatchPacket:
+    """
+     Shared by the batch packets (BPUB, BUNP). A batch carries one item per line, each
+     the same as the payload of the single file packet, and is answered with an OK
+     whose payload is one BatchStatus byte per item, in the same order
+    """
+
+    ITEM_SEPARATOR: str = "\n"
+
+    @staticmethod
+    def split_batches(items: list[str]) -> list[list[str]]:
+        """
+        Groups items into batches that each fit in one datagram
+
+        Parameters
+        ----------
+        items: list[str]
+            the items, already formatted, in the order they should be sent
+        """
+
+        batches: list[list[str]] = []
+        batch: list[str] = []
+        size: int = 0
+
+        for item in items:
+            item_size: int = len(item.encode("utf-8")) + (1 if len(batch) > 0 else 0)
+            if len(batch) > 0 and size + item_size > UDPPacket.UDP_MAX_PAYLOAD_SIZE:
+                batches.append(batch)
+                batch, size, item_size = [], 0, item_size - 1
+
+            batch.append(item)
+            size += item_size
+
+        if len(batch) > 0:
+            batches.append(batch)
+
+        return batches
+
+    @staticmethod
+    def get_items(packet: bytes | UDPPacketView) -> list[str]:
+        payload: str = UDPPacketCodec.decode(packet).get_payload_string()
+
+        if payload == "":
+            return []
+
+        return payload.split(UDPBatchPacket.ITEM_SEPARATOR)
+
+    @staticmethod
+    def create_reply_payload(statuses: list[int]) -> bytes:
+        return bytes(statuses)
+
+    @staticmethod
+    def get_reply_data(packet: bytes | UDPPacketView) -> UDPBatchReplyData:
+        return UDPBatchReplyData(statuses=list(UDPPacketCodec.decode(packet).payload))
+
+class UDPBpubPacket(UDPGenericPacket):
+    """
+     A class to create and parse UDP BPUB packets, a PUB for a batch of files
+    """
+
+    @staticmethod
+    def create_item(filename: str, manifest: FileManifestData | None = None) -> str:
+        return ",".join([filename] + UDPPubPacket.manifest_to_args(manifest))
+
+    @staticmethod
+    def create_packet(
+        src_ip: str, dst_ip: str, src_port: int, dst_port: int, items: list[str]
+    ) -> bytes:
+        return UDPPacketCodec.encode(
+            src_ip, dst_ip, src_port, dst_port, PacketTypes.BPUB,
+            UDPBatchPacket.ITEM_SEPARATOR.join(items).encode("utf-8")
+        )
+
+    @staticmethod
+    def get_data(packet: bytes | UDPPacketView) -> UDPBpubPacketData:
+        items: list[UDPPubPacketData | None] = []
+
+        # A bad item only fails itself, the rest of the batch still goes through
+        for item in UDPBatchPacket.get_items(packet):
+            args: list[str] = item.split(",")
+            try:
+                if args[0] == "" or (len(args) != 1 and len(args) != 4):
+                    raise CorruptPacketError()
+
+                items.append(UDPPubPacketData(
+                    filename=args[0],
+                    manifest=UDPPubPacket.manifest_from_args(args[1:])
+                ))
+            except CorruptPacketError:
+                items.append(None)
+
+        return UDPBpubPacketData(items=items)
+
+class UDPBunpPacket(UDPGenericPacket):
+    """
+     A class to create and parse UDP BUNP packets, an UNP for a batch of files
+    """
+
+    @staticmethod
+    def create_packet(
+        src_ip: str, dst_ip: str, src_port: int, dst_port: int, filenames: list[str]
+    ) -> bytes:
+        return UDPPacketCodec.encode(
+            src_ip, dst_ip, src_port, dst_port, PacketTypes.BUNP,
+            UDPBatchPacket.ITEM_SEPARATOR.join(filenames).encode("utf-8")
+        )
+
+    @staticmethod
+    def get_data(packet: bytes | UDPPacketView) -> UDPBunpPacketData:
+        return UDPBunpPacketData(filenames=UDPBatchPacket.get_items(packet))
@@ -1,25 +1,202 @@
-from datetime import datetime
+import os
+import sys
+import json
+import time
+import atexit
+import struct
+import threading
+from collections import deque
+
 from utils.Globals import PacketTypes
 
+class LogLevel:
+    # Same numbers as the logging module, so they read the same
+    DEBUG = 10
+    INFO = 20
+    WARNING = 30
+    ERROR = 40
+    OFF = 100
+
+    LEVELS = {"debug": DEBUG, "info": INFO, "warning": WARNING, "error": ERROR, "off": OFF}
+
+class LogEvent:
+    RECEIVED = 0
+    SENT = 1
+    DROPPED = 2
+
+# (time.time(), level, event, message type, port, user or "ip:port")
+LogRecord = tuple[float, int, int, int, int, str]
+
+class TextSink:
+    # The original console format, one line per packet
+    def __init__(self, stream) -> None:
+        self.stream = stream
+
+    def write_batch(self, records: list[LogRecord]) -> None:
+        lines: list[str] = []
+        for timestamp, _, event, message_type, port, user in records:
+            local_time: time.struct_time = time.localtime(timestamp)
+            milliseconds: int = int(timestamp * 1000) % 1000
+            clock: str = f"{local_time.tm_hour}:{local_time.tm_min}:{local_time.tm_sec}:{milliseconds}"
+
+            if event == LogEvent.RECEIVED:
+                lines.append(f"{clock}: {port}: Received {PacketTypes.get_name(message_type)} from {user}\n")
+            elif event == LogEvent.DROPPED:
+                lines.append(f"{clock}: {port}: Dropped {PacketTypes.get_name(message_type)} ({message_type}) from {user}\n")
+            else:
+                lines.append(f"{clock}: {port}: Sent {PacketTypes.get_name(message_type)} to {user}\n")
+
+        self.stream.write("".join(lines))
+        self.stream.flush()
+
+class JsonLinesSink:
+    EVENTS = {LogEvent.RECEIVED: "received", LogEvent.SENT: "sent", LogEvent.DROPPED: "dropped"}
+
+    def __init__(self, stream) -> None:
+        self.stream = stream
+
+    def write_batch(self, records: list[LogRecord]) -> None:
+        lines: list[str] = [
+            json.dumps({
+                "time": timestamp, "level": level, "event": JsonLinesSink.EVENTS[event],
+                "type": PacketTypes.get_name(message_type), "port": port, "user": user
+            }) + "\n"
+            for timestamp, level, event, message_type, port, user in records
+        ]
+
+        self.stream.write("".join(lines))
+        self.stream.flush()
+
+class BinarySink:
+    # Structure: time (d), level (B), event (B), message type (H), port (H),
+    # user length (B), then the user in utf-8
+    RECORD = struct.Struct("!dBBHHB")
+
+    def __init__(self, stream) -> None:
+        self.stream = stream
+
+    def write_batch(self, records: list[LogRecord]) -> None:
+        data: bytearray = bytearray()
+        for timestamp, level, event, message_type, port, user in records:
+            encoded: bytes = user.encode("utf-8")[:255]
+            data += BinarySink.RECORD.pack(timestamp, level, event, message_type, port, len(encoded))
+            data += encoded
+
+        self.stream.write(data)
+        self.stream.flush()
+
 class NetworkLogger:
+    # Logging a packet only appends a small tuple to a queue, a background thread
+    # formats and writes whatever has built up in one go. The queue is bounded, and
+    # when it's full records are dropped (and counted) rather than making the packet
+    # path wait. Records below the level are never queued, and a message type can be
+    # sampled so only every Nth one is kept (e.g. HBT, which is most of the traffic).
+
+    SINKS = {"text": TextSink, "jsonl": JsonLinesSink, "binary": BinarySink}
+
+    # Most records held before new ones are dropped, and how often the writer wakes up
+    MAX_QUEUED = 65536
+    FLUSH_INTERVAL = 0.1
+
+    level: int = LogLevel.INFO
+    sampling: dict[int, int] = dict()
+    sample_counts: dict[tuple[int, int], int] = dict()
+
+    sink = TextSink(sys.stdout)
+    records: deque[LogRecord] = deque()
+    dropped: int = 0
+
+    # The writer thread belongs to whichever process started it, forked workers start their own
+    writer_pid: int | None = None
+    writer_lock: threading.Lock = threading.Lock()
+    flush_lock: threading.Lock = threading.Lock()
+
+    @staticmethod
+    def configure(
+        level: int = LogLevel.INFO, sink: str = "text", path: str | None = None,
+        sampling: dict[int, int] = {}
+    ) -> None:
+        NetworkLogger.level = level
+        NetworkLogger.sampling = dict(sampling)
+        NetworkLogger.sample_counts = dict()
+
+        if path == None:
+            stream = sys.stdout.buffer if sink == "binary" else sys.stdout
+        else:
+            stream = open(path, "ab" if sink == "binary" else "a")
+
+        NetworkLogger.sink = NetworkLogger.SINKS[sink](stream)
+
+    @staticmethod
+    def log_received_event(message_type: int, source_port: int, source: str, level: int = LogLevel.INFO) -> None:
+        NetworkLogger.log(level, LogEvent.RECEIVED, message_type, source_port, source, message_type)
+
     @staticmethod
-    def log_received_event(message_type: int, source_port: int, source: str) -> None:
-        print(f"{NetworkLogger.get_time()}: {source_port}: Received {PacketTypes.get_name(message_type)} from {source}")
+    def log_sent_event(
+        message_type: int, target_port: int, target: str, level: int = LogLevel.INFO, request_type: int | None = None
+    ) -> None:
+        # Replies are sampled by what they're replying to, so HBT=100 thins out their OKs too
+        NetworkLogger.log(
+            level, LogEvent.SENT, message_type, target_port, target,
+            message_type if request_type == None else request_type
+        )
 
     @staticmethod
-    def log_sent_event(message_type: int, target_port: int, target: str) -> None:
-        print(f"{NetworkLogger.get_time()}: {target_port}: Sent {PacketTypes.get_name(message_type)} to {target}")
+    def log_dropped_event(
+        message_type: int, source_port: int, source: str, level: int = LogLevel.WARNING
+    ) -> None:
+        # Requests nothing was sent back for, e.g. a message type we don't handle
+        NetworkLogger.log(level, LogEvent.DROPPED, message_type, source_port, source, message_type)
 
     @staticmethod
-    def get_time() -> str:
-        # time() returns number of seconds as float
-        current_time: datetime = datetime.now()
+    def log(level: int, event: int, message_type: int, port: int, user: str, sample_type: int) -> None:
+        if level < NetworkLogger.level:
+            return
 
-        # 24 hour time
-        hours = current_time.hour
-        minutes: int = current_time.minute
-        seconds: int = current_time.second
-        milliseconds: int = current_time.microsecond // 1000
+        every: int | None = NetworkLogger.sampling.get(sample_type)
+        if every != None:
+            count: int = NetworkLogger.sample_counts.get((event, sample_type), 0)
+            NetworkLogger.sample_counts[(event, sample_type)] = count + 1
+            if count % every != 0:
+                return
 
-        return f"{hours}:{minutes}:{seconds}:{milliseconds}"
+        if len(NetworkLogger.records) >= NetworkLogger.MAX_QUEUED:
+            NetworkLogger.dropped += 1
+            return
+
+        NetworkLogger.records.append((time.time(), level, event, message_type, port, user))
+
+        if NetworkLogger.writer_pid != os.getpid():
+            NetworkLogger.start_writer()
+
+    @staticmethod
+    def start_writer() -> None:
+        with NetworkLogger.writer_lock:
+            if NetworkLogger.writer_pid == os.getpid():
+                return
+
+            NetworkLogger.writer_pid = os.getpid()
+            threading.Thread(target=NetworkLogger.write_records, daemon=True).start()
+            atexit.register(NetworkLogger.flush)
+
+    @staticmethod
+    def write_records() -> None:
+        while True:
+            time.sleep(NetworkLogger.FLUSH_INTERVAL)
+            NetworkLogger.flush()
+
+    @staticmethod
+    def flush() -> None:
+        # popleft is atomic, so this is safe against the packet path appending.
+        # The lock only keeps an exit-time flush from interleaving with the writer.
+        with NetworkLogger.flush_lock:
+            batch: list[LogRecord] = []
+            records: deque[LogRecord] = NetworkLogger.records
+            while records:
+                batch.append(records.popleft())
 
+            if len(batch) > 0:
+                try:
+                    NetworkLogger.sink.write_batch(batch)
+                except (OSError, ValueError):
+                    pass
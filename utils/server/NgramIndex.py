@@ -0,0 +1,52 @@
+class NgramIndex:
+    # Inverted index from every n-character substring (gram) of a key to the keys
+    # containing it. Any key containing a query must contain all of the query's
+    # grams, so intersecting their posting sets gives a small set of candidates
+    # that only need the real substring check, instead of checking every key.
+
+    DEFAULT_GRAM_SIZE = 3
+
+    def __init__(self, gram_size: int = DEFAULT_GRAM_SIZE) -> None:
+        self.gram_size = gram_size
+        self.postings: dict[str, set[str]] = dict()
+
+    def get_grams(self, text: str) -> set[str]:
+        size: int = self.gram_size
+        return {text[i:i + size] for i in range(len(text) - size + 1)}
+
+    def add(self, key: str) -> None:
+        for gram in self.get_grams(key):
+            self.postings.setdefault(gram, set()).add(key)
+
+    def remove(self, key: str) -> None:
+        for gram in self.get_grams(key):
+            posting: set[str] | None = self.postings.get(gram)
+            if posting == None:
+                continue
+
+            posting.discard(key)
+            if len(posting) <= 0:
+                del self.postings[gram]
+
+    def get_candidates(self, query: str, max_candidates: int | None = None) -> set[str] | None:
+        # Too short to have a gram, caller has to fall back to a scan. The same goes
+        # if even the smallest posting has more than max_candidates keys in it.
+        if len(query) < self.gram_size:
+            return None
+
+        postings: list[set[str]] = []
+        for gram in self.get_grams(query):
+            posting: set[str] | None = self.postings.get(gram)
+
+            # No key has this gram, so no key can contain the query
+            if posting == None:
+                return set()
+
+            postings.append(posting)
+
+        # Start from the smallest posting so intersection does the least work
+        postings.sort(key=len)
+        if max_candidates != None and len(postings[0]) > max_candidates:
+            return None
+
+        return postings[0].intersection(*postings[1:])
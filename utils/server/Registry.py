@@ -0,0 +1,149 @@
+from utils.Exceptions import *
+from utils.networking.UDPHandler import FileManifestData
+from utils.server.UserSessionsHandler import UserSessionsHandler
+from utils.server.UserFilesHandler import UserFilesHandler
+from utils.server.SharerSelection import SharerSelection, SharerSelectionPolicy, SharerCandidate
+
+class Registry:
+    # Everything a request needs from the session and file registries, in one call.
+    # With workers this lives in its own process and every call is a round trip to
+    # it, so each packet type gets one method that does the auth check, the lookup
+    # and any change all at once, then hands back plain results for the worker to
+    # make the reply from. The username always comes first, and it's None (with
+    # nothing else done) if the request isn't from an active session.
+
+    def __init__(
+        self, files_handler: UserFilesHandler | None = None, users_handler: UserSessionsHandler | None = None,
+        sharer_policy: str = SharerSelection.DEFAULT_POLICY
+    ) -> None:
+        self.files_handler: UserFilesHandler = UserFilesHandler() if files_handler == None else files_handler
+        self.users_handler: UserSessionsHandler = UserSessionsHandler() if users_handler == None else users_handler
+
+        # Picked here rather than in each worker, so round robin goes round all of them together
+        self.sharer_policy: SharerSelectionPolicy = SharerSelection.create_policy(sharer_policy)
+
+    def authenticate(self, username: str, password: str, listening_port: int, address: tuple[str, int]) -> bool:
+        try:
+            self.users_handler.generate_session(username, password, listening_port, address)
+        except UserAuthError:
+            return False
+
+        return True
+
+    def heartbeat(self, address: tuple[str, int], active_uploads: int, queue_depth: int) -> str | None:
+        return self.users_handler.renew_from_address(address, active_uploads, queue_depth)
+
+    def identify(self, address: tuple[str, int]) -> str | None:
+        # Any request from an active session renews it, the same as a heartbeat would
+        return self.users_handler.get_active_user(address, renew=True)
+
+    # LAP, LPF and SCH are told the generation of the result the worker has cached,
+    # and only send the items back if it's out of date, so a cache hit is still one call
+
+    def get_active_peers(
+        self, address: tuple[str, int], known_generation: tuple | None
+    ) -> tuple[str | None, tuple | None, list[str] | None]:
+        username: str | None = self.identify(address)
+        if username == None:
+            return (None, None, None)
+
+        generation: tuple = (self.users_handler.get_generation(),)
+        if generation == known_generation:
+            return (username, generation, None)
+
+        peers: list[str] = self.users_handler.get_active_users()
+        peers.remove(username)
+
+        return (username, generation, peers)
+
+    def get_published(
+        self, address: tuple[str, int], known_generation: tuple | None
+    ) -> tuple[str | None, tuple | None, list[str] | None]:
+        username: str | None = self.identify(address)
+        if username == None:
+            return (None, None, None)
+
+        # Cached by address, so a different user logging in from it has to make it stale too
+        generation: tuple = (self.files_handler.get_generation(), self.users_handler.get_generation())
+        if generation == known_generation:
+            return (username, generation, None)
+
+        return (username, generation, self.files_handler.get_shared_by(username))
+
+    def search(
+        self, address: tuple[str, int], substring: str, known_generation: tuple | None
+    ) -> tuple[str | None, tuple | None, list[str] | None]:
+        username: str | None = self.identify(address)
+        if username == None:
+            return (None, None, None)
+
+        generation: tuple = (self.files_handler.get_generation(),)
+        if generation == known_generation:
+            return (username, generation, None)
+
+        return (username, generation, self.files_handler.get_matching(substring))
+
+    def publish(
+        self, address: tuple[str, int], files: list[tuple[str, FileManifestData | None]]
+    ) -> tuple[str | None, list[bool] | None]:
+        # PUB is just a batch of one, True for each file added
+        username: str | None = self.identify(address)
+        if username == None:
+            return (None, None)
+
+        return (username, self.files_handler.add_files(username, files))
+
+    def unpublish(self, address: tuple[str, int], filenames: list[str]) -> tuple[str | None, list[bool] | None]:
+        username: str | None = self.identify(address)
+        if username == None:
+            return (None, None)
+
+        return (username, self.files_handler.remove_files(username, filenames))
+
+    def get_sharers(
+        self, address: tuple[str, int], filename: str, count: int
+    ) -> tuple[str | None, list[tuple[str, int]] | None, FileManifestData | None]:
+        # Picks up to count sharers for GET (1) or SWM, only mixing ones that have the
+        # same content as the first pick. None for the addresses if nobody has the
+        # file at all, or an empty list if nobody who has it is active.
+        username: str | None = self.identify(address)
+        if username == None:
+            return (None, None, None)
+
+        try:
+            sharers: list[str] = self.files_handler.get_file_sharers(filename)
+        except FileNotExistent:
+            return (username, None, None)
+
+        candidates: list[SharerCandidate] = self.users_handler.get_sharer_candidates(sharers)
+        if len(candidates) <= 0:
+            return (username, [], None)
+
+        selected: list[SharerCandidate] = self.sharer_policy.select(filename, candidates, count)
+        manifest: FileManifestData | None = self.files_handler.get_manifest(filename, selected[0]["username"])
+
+        addresses: list[tuple[str, int]] = []
+        for sharer in selected:
+            if self.files_handler.get_manifest(filename, sharer["username"]) != manifest:
+                continue
+
+            self.users_handler.record_assignment(sharer["username"])
+            addresses.append(sharer["address"])
+
+        return (username, addresses, manifest)
+
+    def get_counts(self) -> dict[str, int]:
+        return {
+            "sessions": self.users_handler.get_session_count(),
+            "files": self.files_handler.get_catalog_size()
+        }
+
+    def get_stats(self, address: tuple[str, int]) -> tuple[str | None, dict[str, int] | None]:
+        username: str | None = self.identify(address)
+        if username == None:
+            return (None, None)
+
+        return (username, self.get_counts())
+
+    def remove_expired_sessions(self) -> None:
+        self.users_handler.remove_expired_sessions()
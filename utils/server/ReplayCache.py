@@ -0,0 +1,82 @@
+import time
+import hashlib
+from collections import OrderedDict
+
+from utils.Globals import PacketTypes, Transport
+
+class ReplayCache:
+    # Clients retransmit a request when its reply doesn't come back in time, but the
+    # request itself may have got through and only the reply was lost. Doing a PUB or
+    # AUTH twice gives a different answer the second time (already published, already
+    # logged in), so the reply to each tagged non-idempotent request is kept, keyed by
+    # who sent it and its request ID, and a retransmission just gets it sent again.
+    #
+    # A retransmission is the exact same datagram, so a digest of the request is kept
+    # with the reply and it's only replayed for a request that matches. Entries are
+    # also dropped once the client would have given up retrying, otherwise a new
+    # client that gets the same address and request ID could be sent someone else's
+    # reply.
+
+    DEFAULT_CAPACITY = 4096
+
+    # Requests that can't safely be handled twice
+    REPLAYED_TYPES: set[int] = {
+        PacketTypes.AUTH, PacketTypes.PUB, PacketTypes.UNP, PacketTypes.BPUB, PacketTypes.BUNP
+    }
+
+    def __init__(self, capacity: int = DEFAULT_CAPACITY, ttl: float = Transport.REQUEST_TIMEOUT) -> None:
+        self.capacity = capacity
+        self.ttl = ttl
+        self.entries: OrderedDict[tuple[tuple[str, int], int], tuple[float, bytes, bytes]] = OrderedDict()
+        self.replays: int = 0
+
+    @staticmethod
+    def is_replayed(message_type: int, request_id: int) -> bool:
+        # Untagged requests can't be told apart from a fresh one, so they're never replayed
+        return request_id != 0 and message_type in ReplayCache.REPLAYED_TYPES
+
+    @staticmethod
+    def get_digest(request: bytes | bytearray | memoryview) -> bytes:
+        return hashlib.blake2b(request, digest_size=16).digest()
+
+    def get(
+        self, source_address: tuple[str, int], request_id: int, request: bytes | bytearray | memoryview
+    ) -> bytes | None:
+        entry: tuple[float, bytes, bytes] | None = self.entries.get((source_address, request_id))
+        if entry == None:
+            return None
+
+        expires, digest, response = entry
+        if expires <= time.monotonic() or digest != ReplayCache.get_digest(request):
+            return None
+
+        self.replays += 1
+        return response
+
+    def put(
+        self, source_address: tuple[str, int], request_id: int, request: bytes | bytearray | memoryview,
+        response: bytes
+    ) -> None:
+        if self.capacity <= 0:
+            return
+
+        key: tuple[tuple[str, int], int] = (source_address, request_id)
+
+        # Moved to the end so the entries stay in expiry order
+        self.entries.pop(key, None)
+        self.entries[key] = (time.monotonic() + self.ttl, ReplayCache.get_digest(request), response)
+
+        # Request IDs only go up, so the oldest entry is the one least likely to be retried
+        while len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
+
+    def remove_expired(self) -> None:
+        # Every entry lives for the same ttl, so they're in expiry order and we can
+        # stop at the first live one
+        now: float = time.monotonic()
+        while self.entries:
+            key, entry = next(iter(self.entries.items()))
+            if entry[0] > now:
+                break
+
+            del self.entries[key]
@@ -0,0 +1,59 @@
+from collections import OrderedDict
+from typing import Callable
+
+class ResponseCache:
+    # LRU cache of encoded result payloads for read-only queries. Each entry is
+    # stamped with the generation counters of the registries it was built from,
+    # and since the registries bump those on every mutation, a stamp that no longer
+    # matches means the entry is stale. A hit is one dict lookup.
+
+    DEFAULT_CAPACITY = 4096
+
+    def __init__(self, capacity: int = DEFAULT_CAPACITY) -> None:
+        self.capacity = capacity
+        self.entries: OrderedDict[tuple, tuple[tuple, bytes]] = OrderedDict()
+        self.hits: int = 0
+        self.misses: int = 0
+
+    def get(
+        self, key: tuple, generation: tuple, is_valid: Callable[[bytes], bool] | None = None
+    ) -> bytes | None:
+        entry: tuple[tuple, bytes] | None = self.entries.get(key)
+
+        if (
+            entry == None or
+            entry[0] != generation or
+            (is_valid != None and is_valid(entry[1]) != True)
+        ):
+            self.misses += 1
+            return None
+
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def peek(self, key: tuple, is_valid: Callable[[bytes], bool] | None = None) -> tuple | None:
+        # The generation of the entry for key if there's a usable one, without counting
+        # it as a hit or miss. Lets the registry skip building a result we already have.
+        entry: tuple[tuple, bytes] | None = self.entries.get(key)
+        if entry == None or (is_valid != None and is_valid(entry[1]) != True):
+            return None
+
+        return entry[0]
+
+    def put(self, key: tuple, generation: tuple, payload: bytes) -> None:
+        if self.capacity <= 0:
+            return
+
+        self.entries[key] = (generation, payload)
+        self.entries.move_to_end(key)
+
+        while len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
+
+    def get_stats(self) -> dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": len(self.entries)
+        }
@@ -0,0 +1,115 @@
+import time
+import secrets
+from collections import OrderedDict
+
+from utils.Globals import Paging
+from utils.Exceptions import *
+from utils.networking.UDPHandler import UDPPagePacket
+
+class ResultSnapshot:
+    __slots__ = ("items", "page_starts", "expires")
+
+    def __init__(self, items: tuple[str, ...]) -> None:
+        self.items: tuple[str, ...] = items
+
+        # Where each page starts in items, worked out lazily as pages are asked for
+        self.page_starts: list[int] = [0]
+        self.expires: float = time.monotonic() + Paging.SNAPSHOT_TIMEOUT
+
+class ResultPager:
+    # Splits LAP/LPF/SCH results into pages that each fit in one datagram. Results
+    # that fit in a single page are sent straight away. Bigger ones are kept as a
+    # snapshot under a random token so the client can fetch the rest with NXT, and
+    # pages are only encoded when they're asked for.
+
+    def __init__(self) -> None:
+        self.snapshots: OrderedDict[int, ResultSnapshot] = OrderedDict()
+
+    @staticmethod
+    def get_page_end(items: tuple[str, ...], start: int) -> int:
+        # Greedily fit items (plus "," separators) into one page, at least one item
+        # per page so something oversized can't stall the whole result
+        size: int = 0
+        end: int = start
+        while end < len(items):
+            item_size: int = len(items[end].encode("utf-8")) + (1 if end > start else 0)
+            if end > start and size + item_size > UDPPagePacket.MAX_ITEMS_SIZE:
+                break
+
+            size += item_size
+            end += 1
+
+        return end
+
+    def get_first_page(self, items: list[str]) -> bytes:
+        snapshot = ResultSnapshot(tuple(items))
+        end: int = ResultPager.get_page_end(snapshot.items, 0)
+
+        if end >= len(snapshot.items):
+            return UDPPagePacket.create_payload(0, 0, False, len(snapshot.items), items)
+
+        token: int = self.store(snapshot)
+        snapshot.page_starts.append(end)
+
+        return UDPPagePacket.create_payload(token, 0, True, len(snapshot.items), list(snapshot.items[:end]))
+
+    def is_available(self, first_page: bytes) -> bool:
+        # Whether the rest of a result that was handed out before can still be fetched
+        token: int = UDPPagePacket.PREFIX.unpack_from(first_page)[0]
+        if token == 0:
+            return True
+
+        snapshot: ResultSnapshot | None = self.snapshots.get(token)
+        return snapshot != None and snapshot.expires > time.monotonic()
+
+    def get_page(self, token: int, index: int) -> bytes:
+        snapshot: ResultSnapshot | None = self.snapshots.get(token)
+        if snapshot == None or snapshot.expires <= time.monotonic() or index >= Paging.MAX_PAGES:
+            raise ResultExpired()
+
+        # Work out page boundaries up to the one asked for. Clients fetch in order,
+        # so this is normally just one more page.
+        while len(snapshot.page_starts) <= index + 1:
+            start: int = snapshot.page_starts[-1]
+            if start >= len(snapshot.items):
+                raise ResultExpired()
+
+            snapshot.page_starts.append(ResultPager.get_page_end(snapshot.items, start))
+
+        start: int = snapshot.page_starts[index]
+        end: int = snapshot.page_starts[index + 1]
+        # The last page that can be numbered says there's no more, rather than have the
+        # client ask for one whose index doesn't fit. The total still counts everything.
+        more: bool = end < len(snapshot.items) and index + 1 < Paging.MAX_PAGES
+
+        # Keep the snapshot alive while it's being read
+        snapshot.expires = time.monotonic() + Paging.SNAPSHOT_TIMEOUT
+        self.snapshots.move_to_end(token)
+
+        return UDPPagePacket.create_payload(
+            token, index, more, len(snapshot.items), list(snapshot.items[start:end])
+        )
+
+    def store(self, snapshot: ResultSnapshot) -> int:
+        token: int = secrets.randbits(32)
+        while token == 0 or token in self.snapshots:
+            token = secrets.randbits(32)
+
+        self.snapshots[token] = snapshot
+
+        # Oldest snapshots go first when there are too many
+        while len(self.snapshots) > Paging.MAX_SNAPSHOTS:
+            self.snapshots.popitem(last=False)
+
+        return token
+
+    def remove_expired(self) -> None:
+        # Snapshots are moved to the end whenever their expiry is pushed back, so
+        # they're in expiry order and we can stop at the first live one
+        now: float = time.monotonic()
+        while self.snapshots:
+            token, snapshot = next(iter(self.snapshots.items()))
+            if snapshot.expires > now:
+                break
+
+            del self.snapshots[token]
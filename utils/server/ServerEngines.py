@@ -0,0 +1,203 @@
+import asyncio
+import socket
+import selectors
+import time
+
+from utils.networking.UDPHandler import UDPPacket
+from utils.server.ServerPacketHandler import ServerPacketHandler
+
+class BlockingServerEngine:
+    # How often expired sessions etc. get cleaned up, in seconds
+    HOUSEKEEPING_INTERVAL = 1.0
+
+    def __init__(self, packet_handler: ServerPacketHandler, server_socket: socket.socket) -> None:
+        self.packet_handler = packet_handler
+        self.server_socket = server_socket
+
+    def run(self) -> None:
+        # Wake up at least once per interval so housekeeping still happens when idle
+        self.server_socket.settimeout(BlockingServerEngine.HOUSEKEEPING_INTERVAL)
+        next_housekeeping: float = time.monotonic() + BlockingServerEngine.HOUSEKEEPING_INTERVAL
+
+        while True:
+            try:
+                data: bytes = self.server_socket.recv(UDPPacket.UDP_PACKET_SIZE)
+            except socket.timeout:
+                data = None
+
+            if time.monotonic() >= next_housekeeping:
+                self.packet_handler.housekeeping()
+                next_housekeeping = time.monotonic() + BlockingServerEngine.HOUSEKEEPING_INTERVAL
+
+            if data == None:
+                continue
+
+            result = self.packet_handler.process_datagram(data)
+            if result == None:
+                continue
+
+            response, address = result
+            self.server_socket.sendto(response, address)
+
+class BatchedServerEngine:
+    # Drains the socket in batches instead of one blocking recv per datagram.
+    # Datagrams land in a ring of preallocated buffers with recvfrom_into, every
+    # pending one is handled, and then all the replies are flushed together.
+    HOUSEKEEPING_INTERVAL = 1.0
+    DEFAULT_BATCH_SIZE = 64
+
+    def __init__(
+        self, packet_handler: ServerPacketHandler, server_socket: socket.socket,
+        batch_size: int = DEFAULT_BATCH_SIZE
+    ) -> None:
+        self.packet_handler = packet_handler
+        self.server_socket = server_socket
+        self.batch_size = batch_size
+
+        self.buffers: list[memoryview] = [
+            memoryview(bytearray(UDPPacket.UDP_PACKET_SIZE)) for _ in range(batch_size)
+        ]
+        self.received_sizes: list[int] = [0] * batch_size
+
+        # Replies aren't sent until the whole batch is handled, so each slot gets its
+        # own buffer to build its reply in
+        self.reply_buffers: list[bytearray] = [
+            bytearray(UDPPacket.UDP_PACKET_SIZE) for _ in range(batch_size)
+        ]
+        self.selector = selectors.DefaultSelector()
+
+    def receive_batch(self) -> int:
+        count: int = 0
+        while count < self.batch_size:
+            try:
+                self.received_sizes[count], _ = self.server_socket.recvfrom_into(self.buffers[count])
+            except (BlockingIOError, InterruptedError):
+                break
+
+            count += 1
+
+        return count
+
+    def send(self, response: bytes | memoryview, address: tuple[str, int]) -> None:
+        while True:
+            try:
+                self.server_socket.sendto(response, address)
+                return
+            except (BlockingIOError, InterruptedError):
+                # Send buffer is full, wait for room rather than dropping the reply
+                self.selector.modify(self.server_socket, selectors.EVENT_WRITE)
+                self.selector.select()
+                self.selector.modify(self.server_socket, selectors.EVENT_READ)
+
+    def run(self) -> None:
+        self.server_socket.setblocking(False)
+        self.selector.register(self.server_socket, selectors.EVENT_READ)
+        next_housekeeping: float = time.monotonic() + BatchedServerEngine.HOUSEKEEPING_INTERVAL
+
+        while True:
+            ready = self.selector.select(timeout=BatchedServerEngine.HOUSEKEEPING_INTERVAL)
+
+            if time.monotonic() >= next_housekeeping:
+                self.packet_handler.housekeeping()
+                next_housekeeping = time.monotonic() + BatchedServerEngine.HOUSEKEEPING_INTERVAL
+
+            if not ready:
+                continue
+
+            count: int = self.receive_batch()
+
+            replies: list[tuple[bytes | memoryview, tuple[str, int]]] = []
+            for index in range(count):
+                result = self.packet_handler.process_datagram(
+                    self.buffers[index][:self.received_sizes[index]], self.reply_buffers[index]
+                )
+                if result != None:
+                    replies.append(result)
+
+            for response, address in replies:
+                self.send(response, address)
+
+class AsyncioServerProtocol(asyncio.DatagramProtocol):
+    def __init__(self, packet_handler: ServerPacketHandler) -> None:
+        self.packet_handler = packet_handler
+        self.transport: asyncio.DatagramTransport = None
+
+    def connection_made(self, transport: asyncio.DatagramTransport) -> None:
+        self.transport = transport
+
+    def datagram_received(self, data: bytes, addr: tuple[str, int]) -> None:
+        result = self.packet_handler.process_datagram(data)
+        if result == None:
+            return
+
+        # Reply to the address in the packet header, same as the blocking engine
+        response, address = result
+        self.transport.sendto(response, address)
+
+    def error_received(self, exc: Exception) -> None:
+        # e.g. ICMP port unreachable from a client that has gone away, nothing to do
+        pass
+
+class AsyncioServerEngine:
+    # Runs the server on an asyncio event loop. Datagrams are handled as they arrive
+    # and housekeeping runs as a scheduled task, so nothing sits in a blocking recv
+    HOUSEKEEPING_INTERVAL = 1.0
+
+    def __init__(self, packet_handler: ServerPacketHandler, server_socket: socket.socket) -> None:
+        self.packet_handler = packet_handler
+        self.server_socket = server_socket
+
+    def run(self) -> None:
+        asyncio.run(self.serve())
+
+    async def serve(self) -> None:
+        loop = asyncio.get_running_loop()
+        transport, _ = await loop.create_datagram_endpoint(
+            lambda: AsyncioServerProtocol(self.packet_handler),
+            sock=self.server_socket
+        )
+
+        try:
+            await self.housekeeping()
+        finally:
+            transport.close()
+
+    async def housekeeping(self) -> None:
+        while True:
+            await asyncio.sleep(AsyncioServerEngine.HOUSEKEEPING_INTERVAL)
+            self.packet_handler.housekeeping()
+
+class ServerEngines:
+    ENGINES = {
+        "blocking": BlockingServerEngine,
+        "asyncio": AsyncioServerEngine,
+        "batched": BatchedServerEngine
+    }
+
+    @staticmethod
+    def create_socket(
+        server_ip: str, server_port: int, reuse_port: bool = False,
+        receive_buffer: int | None = None, send_buffer: int | None = None
+    ) -> socket.socket:
+        server_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+        # Bigger kernel buffers ride out bursts (e.g. heartbeat storms) without drops.
+        # The kernel may clamp these to net.core.rmem_max / wmem_max.
+        if receive_buffer != None:
+            server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, receive_buffer)
+        if send_buffer != None:
+            server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, send_buffer)
+
+        # Lets several worker processes bind the same port, the kernel then
+        # spreads clients across them by hashing their address
+        if reuse_port:
+            server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+
+        server_socket.bind((server_ip, server_port))
+        return server_socket
+
+    @staticmethod
+    def run(
+        engine: str, packet_handler: ServerPacketHandler, server_socket: socket.socket, **engine_options
+    ) -> None:
+        ServerEngines.ENGINES[engine](packet_handler, server_socket, **engine_options).run()
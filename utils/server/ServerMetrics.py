@@ -0,0 +1,119 @@
+import os
+import time
+import bisect
+
+try:
+    import resource
+except ImportError:
+    # resource is Unix only, on Windows the memory gauge is just left out
+    resource = None
+
+from utils.Globals import PacketTypes
+
+class LatencyHistogram:
+    # Fixed buckets, so recording is a bisect and an increment, and histograms from
+    # different workers or dumps line up. Bounds are in microseconds.
+    BUCKETS = [50, 100, 250, 500, 1000, 2500, 5000, 10000, 25000, 50000, 100000, 250000]
+
+    def __init__(self) -> None:
+        # One extra bucket for anything slower than the last bound
+        self.counts: list[int] = [0] * (len(LatencyHistogram.BUCKETS) + 1)
+        self.count: int = 0
+        self.total: float = 0
+
+    def observe(self, seconds: float) -> None:
+        microseconds: float = seconds * 1000000
+        self.counts[bisect.bisect_left(LatencyHistogram.BUCKETS, microseconds)] += 1
+        self.count += 1
+        self.total += microseconds
+
+    def get_percentile(self, percentile: float) -> int | None:
+        # Upper bound of the bucket the percentile falls in, None if it's past the last one
+        if self.count <= 0:
+            return 0
+
+        target: float = self.count * percentile
+        seen: int = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= target:
+                return LatencyHistogram.BUCKETS[index] if index < len(LatencyHistogram.BUCKETS) else None
+
+        return None
+
+    def get_items(self, prefix: str) -> list[str]:
+        items: list[str] = [f"{prefix}.count={self.count}", f"{prefix}.mean_us={self.total / max(self.count, 1):.1f}"]
+
+        for percentile, name in ((0.5, "p50"), (0.99, "p99"), (0.999, "p999")):
+            bound: int | None = self.get_percentile(percentile)
+            items.append(f"{prefix}.{name}_us={'inf' if bound == None else bound}")
+
+        for bound, count in zip(LatencyHistogram.BUCKETS + ["inf"], self.counts):
+            items.append(f"{prefix}.le_{bound}us={count}")
+
+        return items
+
+class ServerMetrics:
+    # Counters and latency histograms for one server process. Every datagram that
+    # passes its checksum is counted under its type, along with how long it took to
+    # handle and, if it failed, the exception's name. Gauges (sessions, files, memory)
+    # are read when the stats are asked for rather than kept up to date.
+
+    # Where stats are appended when the server gets SIGUSR1
+    DEFAULT_DUMP_FILE = "server_stats.txt"
+
+    def __init__(self) -> None:
+        self.started: float = time.monotonic()
+        self.packets: dict[int, int] = dict()
+        self.errors: dict[int, int] = dict()
+        self.exceptions: dict[str, int] = dict()
+        self.latencies: dict[int, LatencyHistogram] = dict()
+
+    def record(self, message_type: int, seconds: float, exception: Exception | None = None) -> None:
+        self.packets[message_type] = self.packets.get(message_type, 0) + 1
+
+        histogram: LatencyHistogram | None = self.latencies.get(message_type)
+        if histogram == None:
+            histogram = self.latencies[message_type] = LatencyHistogram()
+        histogram.observe(seconds)
+
+        if exception != None:
+            self.errors[message_type] = self.errors.get(message_type, 0) + 1
+            name: str = type(exception).__name__
+            self.exceptions[name] = self.exceptions.get(name, 0) + 1
+
+    @staticmethod
+    def get_memory_items() -> list[str]:
+        if resource == None:
+            return []
+
+        # ru_maxrss is in KiB on Linux (bytes on macOS, but close enough for a gauge)
+        return [f"gauge.max_rss_kib={resource.getrusage(resource.RUSAGE_SELF).ru_maxrss}"]
+
+    def get_items(self, gauges: dict[str, int | float] = {}) -> list[str]:
+        items: list[str] = [
+            f"pid={os.getpid()}",
+            f"uptime_s={time.monotonic() - self.started:.1f}",
+        ]
+
+        for message_type, count in sorted(self.packets.items()):
+            items.append(f"packets.{PacketTypes.get_name(message_type)}={count}")
+        for message_type, count in sorted(self.errors.items()):
+            items.append(f"errors.{PacketTypes.get_name(message_type)}={count}")
+        for name, count in sorted(self.exceptions.items()):
+            items.append(f"exceptions.{name}={count}")
+
+        for name, value in gauges.items():
+            items.append(f"gauge.{name}={value}")
+        items += ServerMetrics.get_memory_items()
+
+        for message_type, histogram in sorted(self.latencies.items()):
+            items += histogram.get_items(f"latency.{PacketTypes.get_name(message_type)}")
+
+        return items
+
+    def dump(self, path: str, gauges: dict[str, int | float] = {}) -> None:
+        # Appended, so dumps from several workers (or several signals) all end up in one file
+        with open(path, "a") as f:
+            f.write(f"# {time.strftime('%Y-%m-%d %H:%M:%S')}\n")
+            f.write("\n".join(self.get_items(gauges)) + "\n")
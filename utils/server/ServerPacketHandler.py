@@ -1,44 +1,265 @@
+import time
+import signal
+from typing import Callable
+
 from utils.networking.UDPHandler import *
-from utils.server.UserSessionsHandler import UserSessionsHandler
-from utils.server.UserFilesHandler import UserFilesHandler
-from utils.Globals import PacketTypes
+from utils.server.Registry import Registry
+from utils.Globals import PacketTypes, Swarm, BatchStatus
 from utils.Exceptions import *
-from utils.server.Logger import NetworkLogger
+from utils.server.Logger import NetworkLogger, LogLevel
+from utils.server.ResultPager import ResultPager
+from utils.server.ResponseCache import ResponseCache
+from utils.server.ReplayCache import ReplayCache
+from utils.server.ServerMetrics import ServerMetrics
 
 class ServerPacketHandler:
-    def __init__(self, files_handler: UserFilesHandler, users_handler: UserSessionsHandler, 
-                 server_ip: str, server_port: int) -> None:
-        self.files_handler = files_handler
-        self.users_handler = users_handler
+    def __init__(self, registry: Registry, server_ip: str, server_port: int,
+                 cache_size: int = ResponseCache.DEFAULT_CAPACITY, admins: list[str] = [],
+                 stats_file: str = ServerMetrics.DEFAULT_DUMP_FILE) -> None:
+        # Either the registry itself, or with workers a proxy to the one they all share
+        self.registry = registry
         self.server_ip = server_ip
         self.server_port = server_port
 
-    def receive_packet(self, packet: bytes):
-        message_type: int = UDPPacketHandling.get_message_type(packet)
-        source_ip: str = UDPPacketHandling.get_source_ip(packet)
-        source_port: int = UDPPacketHandling.get_source_port(packet)
-
-        if message_type != PacketTypes.AUTH:
-            # If the user is no longer active, then return error (I guess?)
-            if self.users_handler.is_active_user(
-                (source_ip, source_port)
-            ) != True:
-                raise UserAuthError()
-            
-        username: str = self.users_handler.get_user_from_addr((source_ip, source_port))
-        source: str = f"{source_ip}:{source_port}" if username == None else username 
-
-        NetworkLogger.log_received_event(
-            message_type, 
-            source_port, 
-            source
+        # Number of datagrams dropped for failing the checksum
+        self.corrupt_packets: int = 0
+
+        # Number of datagrams dropped for having a message type we don't handle
+        self.unknown_packets: int = 0
+
+        self.result_pager: ResultPager = ResultPager()
+        self.response_cache: ResponseCache = ResponseCache(cache_size)
+        self.replay_cache: ReplayCache = ReplayCache()
+
+        # Replies are packed straight into a buffer rather than copied out to a new bytes
+        # each. Engines that hold onto several replies before sending pass their own.
+        self.default_reply_buffer: bytearray = bytearray(UDPPacket.UDP_PACKET_SIZE)
+        self.reply_buffer: bytearray = self.default_reply_buffer
+
+        # Who the request being handled is from, set by its handler once the registry
+        # has said, so the log records can name them
+        self.requester: str | None = None
+
+        # Only these users can ask for STATS
+        self.admins: set[str] = set(admins)
+        self.metrics: ServerMetrics = ServerMetrics()
+        self.stats_file = stats_file
+
+        # Set by SIGUSR1, the dump waits for the next housekeeping so it never runs
+        # in the middle of a request or a call to the registry. A plain flag rather
+        # than an Event, whose lock the handler could try to take while we hold it.
+        self.stats_requested: bool = False
+
+    def verify_packet(self, packet: bytes) -> bool:
+        if UDPPacketHandling.verify_checksum(packet, self.server_ip) != True:
+            self.corrupt_packets += 1
+            return False
+
+        return True
+
+    def require_user(self, username: str | None) -> str:
+        self.requester = username
+
+        # If the user is no longer active, then return error (I guess?)
+        if username == None:
+            raise UserAuthError()
+
+        return username
+
+    def get_result_page(
+        self, key: tuple, query: Callable[[tuple | None], tuple[str | None, tuple | None, list[str] | None]]
+    ) -> bytes:
+        # First page of a LAP/LPF/SCH result, straight from the cache if nothing it
+        # depends on has changed and any later pages can still be fetched. The query
+        # is told what generation we have, and only returns items if it's stale.
+        username, generation, items = query(self.response_cache.peek(key, self.result_pager.is_available))
+        self.require_user(username)
+
+        payload: bytes | None = self.response_cache.get(key, generation, self.result_pager.is_available)
+        if payload != None:
+            return payload
+
+        # The cached copy went away since we asked (its snapshot expired), so ask again
+        if items == None:
+            username, generation, items = query(None)
+            self.require_user(username)
+
+        payload = self.result_pager.get_first_page(items)
+        self.response_cache.put(key, generation, payload)
+
+        return payload
+
+    def create_response(
+        self, dst_address: tuple[str, int], message_type: int, payload: bytes, request_id: int = 0
+    ) -> memoryview:
+        # The request's ID is echoed back so the client can match the reply to it
+        length: int = UDPPacketCodec.encode_into(
+            self.reply_buffer, self.server_ip, dst_address[0],
+            self.server_port, dst_address[1],
+            message_type, payload, request_id
         )
 
+        return memoryview(self.reply_buffer)[:length]
+
+    def process_datagram(
+        self, data: bytes | memoryview, reply_buffer: bytearray | None = None
+    ) -> tuple[bytes | memoryview, tuple[str, int]] | None:
+        # Everything a server engine needs to do with one datagram, returns the
+        # response and where to send it, or None if nothing should be sent. The
+        # response is only good until the next datagram that uses the same reply buffer.
+        if self.verify_packet(data) != True:
+            return None
+
+        try:
+            packet: UDPPacketView = UDPPacketCodec.decode(data)
+        except CorruptPacketError:
+            self.corrupt_packets += 1
+            return None
+
+        self.reply_buffer = self.default_reply_buffer if reply_buffer == None else reply_buffer
+
+        # Heartbeats are most of what comes in, so they skip the general dispatch
+        if packet.message_type == PacketTypes.HBT:
+            return self.process_heartbeat(packet)
+
+        source_address: tuple[str, int] = packet.source_address
+
+        # A retransmitted PUB/UNP/AUTH gets the reply the first one got, instead of being done twice
+        replayed: bool = ReplayCache.is_replayed(packet.message_type, packet.request_id)
+        if replayed:
+            previous: bytes | None = self.replay_cache.get(source_address, packet.request_id, data)
+            if previous != None:
+                return (previous, source_address)
+
+        started: float = time.perf_counter()
+        failure: Exception | None = None
+        self.requester = None
+
+        try:
+            response: memoryview | None = self.receive_packet(packet)
+        except Exception as e:
+            failure = e
+
+        # Logged once the registry has said who it's from, requests from nobody logged
+        # in only get their ERR logged
+        target: str = f"{source_address[0]}:{source_address[1]}" if self.requester == None else self.requester
+        if self.requester != None or packet.message_type == PacketTypes.AUTH:
+            NetworkLogger.log_received_event(packet.message_type, source_address[1], target)
+
+        if failure == None and response == None:
+            # Nothing handles this type, so there's no reply to log or time
+            self.unknown_packets += 1
+            NetworkLogger.log_dropped_event(packet.message_type, source_address[1], target)
+            return None
+        elif failure == None:
+            NetworkLogger.log_sent_event(
+                UDPPacketHandling.get_message_type(response), source_address[1], target,
+                request_type=packet.message_type
+            )
+        elif isinstance(failure, CorruptPacketError):
+            response = None
+        else:
+            NetworkLogger.log_sent_event(
+                PacketTypes.ERR, source_address[1], target, LogLevel.WARNING, packet.message_type
+            )
+
+            response = self.create_response(
+                source_address, PacketTypes.ERR, "".encode("utf-8"), packet.request_id
+            )
+
+        self.metrics.record(packet.message_type, time.perf_counter() - started, failure)
+
+        if response == None:
+            return None
+
+        # Kept past the next datagram, so this one does need copying
+        if replayed:
+            self.replay_cache.put(source_address, packet.request_id, data, bytes(response))
+
+        return (response, source_address)
+
+    def process_heartbeat(self, packet: UDPPacketView) -> tuple[memoryview, tuple[str, int]] | None:
+        # One lookup by the address it came from, which is also what the session was
+        # made for at AUTH. Nothing is sent back unless the session is gone.
+        started: float = time.perf_counter()
+        source_address: tuple[str, int] = packet.source_address
+
+        try:
+            active_uploads, queue_depth = UDPHbtPacket.get_load(packet)
+        except CorruptPacketError as e:
+            self.metrics.record(PacketTypes.HBT, time.perf_counter() - started, e)
+            return None
+
+        username: str | None = self.registry.heartbeat(source_address, active_uploads, queue_depth)
+
+        if username == None:
+            target: str = f"{source_address[0]}:{source_address[1]}"
+            NetworkLogger.log_received_event(PacketTypes.HBT, source_address[1], target)
+            NetworkLogger.log_sent_event(
+                PacketTypes.ERR, source_address[1], target, LogLevel.WARNING, PacketTypes.HBT
+            )
+            self.metrics.record(PacketTypes.HBT, time.perf_counter() - started, UserAuthError())
+
+            response: memoryview = self.create_response(
+                source_address, PacketTypes.ERR, "".encode("utf-8"), packet.request_id
+            )
+            return (response, source_address)
+
+        NetworkLogger.log_received_event(PacketTypes.HBT, source_address[1], username)
+        self.metrics.record(PacketTypes.HBT, time.perf_counter() - started)
+
+        return None
+
+    def get_gauges(self, counts: dict[str, int] | None = None) -> dict[str, int]:
+        cache_stats: dict[str, int] = self.response_cache.get_stats()
+        counts = self.registry.get_counts() if counts == None else counts
+
+        return {
+            "sessions": counts["sessions"],
+            "files": counts["files"],
+            "corrupt_packets": self.corrupt_packets,
+            "unknown_packets": self.unknown_packets,
+            "cache_hits": cache_stats["hits"],
+            "cache_misses": cache_stats["misses"],
+            "cache_entries": cache_stats["entries"],
+            "result_snapshots": len(self.result_pager.snapshots),
+            "replayed_responses": self.replay_cache.replays,
+            "log_dropped": NetworkLogger.dropped
+        }
+
+    def dump_stats(self) -> None:
+        self.metrics.dump(self.stats_file, self.get_gauges())
+
+    def install_stats_signal(self) -> None:
+        # kill -USR1 <pid> appends the stats to stats_file within a housekeeping
+        # interval. SIGUSR1 doesn't exist on Windows.
+        if hasattr(signal, "SIGUSR1"):
+            signal.signal(signal.SIGUSR1, lambda signum, frame: self.request_stats())
+
+    def request_stats(self) -> None:
+        self.stats_requested = True
+
+    def housekeeping(self) -> None:
+        # Called periodically by whichever engine is running the server
+        self.registry.remove_expired_sessions()
+        self.result_pager.remove_expired()
+        self.replay_cache.remove_expired()
+
+        if self.stats_requested:
+            self.stats_requested = False
+            self.dump_stats()
+
+    def receive_packet(self, packet: bytes | UDPPacketView):
+        # Header is decoded once here, handlers all work off the same view. Each
+        # handler makes one call to the registry, which checks who the sender is too.
+        # HBT never gets here, process_datagram sends it down process_heartbeat.
+        packet: UDPPacketView = UDPPacketCodec.decode(packet)
+        message_type: int = packet.message_type
+        source_ip, source_port = packet.source_address
+
         match message_type:
             case PacketTypes.AUTH:
                 return self.handle_auth(packet, (source_ip, source_port))
-            case PacketTypes.HBT:
-                return self.handle_hbt(packet)
             case PacketTypes.LAP:
                 return self.handle_lap(packet, (source_ip, source_port))
             case PacketTypes.PUB:
@@ -51,115 +272,168 @@ class ServerPacketHandler:
                 return self.handle_get(packet, (source_ip, source_port))
             case PacketTypes.SCH:
                 return self.handle_sch(packet, (source_ip, source_port))
+            case PacketTypes.SWM:
+                return self.handle_swm(packet, (source_ip, source_port))
+            case PacketTypes.NXT:
+                return self.handle_nxt(packet, (source_ip, source_port))
+            case PacketTypes.STATS:
+                return self.handle_stats(packet, (source_ip, source_port))
+            case PacketTypes.BPUB:
+                return self.handle_bpub(packet, (source_ip, source_port))
+            case PacketTypes.BUNP:
+                return self.handle_bunp(packet, (source_ip, source_port))
             case _:
                 return None
     
-    def handle_auth(self, packet: bytes, src_address: tuple[str, int]) -> bytes:
+    def handle_auth(self, packet: UDPPacketView, src_address: tuple[str, int]) -> memoryview:
         data: UDPAuthPacketData = UDPAuthPacket.get_data(packet)
 
-        self.users_handler.generate_session(data["username"], data["password"], data["listening_port"], src_address)
+        if self.registry.authenticate(data["username"], data["password"], data["listening_port"], src_address) != True:
+            raise UserAuthError()
 
-        return UDPPacketHandling.create_udp_packet(
-            self.server_ip, src_address[0], 
-            self.server_port, src_address[1], 
-            PacketTypes.OK, "".encode("utf-8")
-        )
+        return self.create_response(src_address, PacketTypes.OK, "".encode("utf-8"), packet.request_id)
         
-    def handle_hbt(self, packet: bytes) -> None:
-        data: UDPHbtPacketData = UDPHbtPacket.get_data(packet)
-        self.users_handler.renew_session(data["username"])
+    def handle_lap(self, packet: UDPPacketView, src_address: tuple[str, int]) -> memoryview:
+        # Cached by address, the registry bumps the generation whenever who's on it changes
+        return self.create_response(
+            src_address, PacketTypes.PAGE, self.get_result_page(
+                (PacketTypes.LAP, src_address),
+                lambda known: self.registry.get_active_peers(src_address, known)
+            ), packet.request_id
+        )
+    
+    def handle_pub(self, packet: UDPPacketView, src_address: tuple[str, int]) -> memoryview:
+        data: UDPPubPacketData = UDPPubPacket.get_data(packet)
 
-        return None
-        
-    def handle_lap(self, packet: bytes, src_address: tuple[str, int]) -> bytes:
-        src_username: str = self.users_handler.get_user_from_addr(src_address)
+        username, added = self.registry.publish(src_address, [(data["filename"], data["manifest"])])
+        self.require_user(username)
 
-        active_users: list[str] = self.users_handler.get_active_users()
-        active_users.remove(src_username)
+        if added[0] != True:
+            raise FileAlreadyPublished()
 
-        return UDPPacketHandling.create_udp_packet(
-            self.server_ip, src_address[0], 
-            self.server_port, src_address[1],
-            PacketTypes.OK, ",".join(active_users).encode("utf-8")
-        )
+        return self.create_response(src_address, PacketTypes.OK, "".encode("utf-8"), packet.request_id)
     
-    def handle_pub(self, packet: bytes, src_address: tuple[str, int]) -> bytes:
-        src_username: str = self.users_handler.get_user_from_addr(src_address)
+    def handle_bpub(self, packet: UDPPacketView, src_address: tuple[str, int]) -> memoryview:
+        data: UDPBpubPacketData = UDPBpubPacket.get_data(packet)
+        valid: list[UDPPubPacketData] = [item for item in data["items"] if item != None]
 
-        data: UDPPubPacketData = UDPPubPacket.get_data(packet)
+        # Applied in one call, so it's one round trip to the registry when there are workers
+        username, added = self.registry.publish(
+            src_address, [(item["filename"], item["manifest"]) for item in valid]
+        )
+        self.require_user(username)
 
-        self.files_handler.add_file(src_username, data["filename"])
+        # Statuses go back in the order the items came in, invalid ones included
+        results = iter(added)
+        statuses: list[int] = []
+        for item in data["items"]:
+            if item == None:
+                statuses.append(BatchStatus.INVALID)
+            elif next(results):
+                statuses.append(BatchStatus.OK)
+            else:
+                statuses.append(BatchStatus.ALREADY_PUBLISHED)
 
-        return UDPPacketHandling.create_udp_packet(
-            self.server_ip, src_address[0],
-            self.server_port, src_address[1],
-            PacketTypes.OK, "".encode("utf-8")
+        return self.create_response(
+            src_address, PacketTypes.OK, UDPBatchPacket.create_reply_payload(statuses), packet.request_id
         )
-    
-    def handle_lpf(self, packet: bytes, src_address: tuple[str, int]) -> bytes:
-        src_username: str = self.users_handler.get_user_from_addr(src_address)
 
-        shared_files: list[str] = self.files_handler.get_shared_by(src_username)
-
-        return UDPPacketHandling.create_udp_packet(
-            self.server_ip, src_address[0], 
-            self.server_port, src_address[1],
-            PacketTypes.OK, ",".join(shared_files).encode("utf-8")
+    def handle_lpf(self, packet: UDPPacketView, src_address: tuple[str, int]) -> memoryview:
+        return self.create_response(
+            src_address, PacketTypes.PAGE, self.get_result_page(
+                (PacketTypes.LPF, src_address),
+                lambda known: self.registry.get_published(src_address, known)
+            ), packet.request_id
         )
     
-    def handle_unp(self, packet: bytes, src_address: tuple[str, int]) -> bytes:
-        src_username: str = self.users_handler.get_user_from_addr(src_address)
-
+    def handle_unp(self, packet: UDPPacketView, src_address: tuple[str, int]) -> memoryview:
         data: UDPUnpPacketData = UDPUnpPacket.get_data(packet)
 
-        self.files_handler.remove_file(src_username, data["filename"])
+        username, removed = self.registry.unpublish(src_address, [data["filename"]])
+        self.require_user(username)
 
-        return UDPPacketHandling.create_udp_packet(
-            self.server_ip, src_address[0],
-            self.server_port, src_address[1],
-            PacketTypes.OK, "".encode("utf-8")
-        )
+        if removed[0] != True:
+            raise FileNotExistent()
+
+        return self.create_response(src_address, PacketTypes.OK, "".encode("utf-8"), packet.request_id)
     
-    def handle_get(self, packet: bytes, src_address: tuple[str, int]) -> bytes:
-        src_username: str = self.users_handler.get_user_from_addr(src_address)
+    def handle_bunp(self, packet: UDPPacketView, src_address: tuple[str, int]) -> memoryview:
+        data: UDPBunpPacketData = UDPBunpPacket.get_data(packet)
 
-        data: UDPGetPacketData = UDPGetPacket.get_data(packet)
+        username, removed = self.registry.unpublish(src_address, data["filenames"])
+        self.require_user(username)
 
-        sharers: list[str] = self.files_handler.get_file_sharers(data["filename"])
+        statuses: list[int] = [BatchStatus.OK if ok else BatchStatus.NOT_PUBLISHED for ok in removed]
 
-        selected_sharer: tuple[str, int] = None
-        for sharer in sharers:
-            listening_address: tuple[str, int] = self.users_handler.get_listening_address(sharer)
-            if listening_address == None:
-                continue
+        return self.create_response(
+            src_address, PacketTypes.OK, UDPBatchPacket.create_reply_payload(statuses), packet.request_id
+        )
+
+    def get_sharers(
+        self, src_address: tuple[str, int], filename: str, count: int
+    ) -> tuple[list[tuple[str, int]], FileManifestData | None]:
+        username, addresses, manifest = self.registry.get_sharers(src_address, filename, count)
+        self.require_user(username)
 
-            selected_sharer = listening_address
-            break
+        if addresses == None:
+            raise FileNotExistent()
 
-        if selected_sharer == None:
+        if len(addresses) <= 0:
             raise NoActiveSharers()
 
-        return UDPPacketHandling.create_udp_packet(
-            self.server_ip, src_address[0],
-            self.server_port, src_address[1],
-            PacketTypes.OK, f"{selected_sharer[0]},{selected_sharer[1]}".encode("utf-8")
+        return (addresses, manifest)
+
+    def handle_get(self, packet: UDPPacketView, src_address: tuple[str, int]) -> memoryview:
+        data: UDPGetPacketData = UDPGetPacket.get_data(packet)
+
+        addresses, manifest = self.get_sharers(src_address, data["filename"], 1)
+
+        return self.create_response(
+            src_address, PacketTypes.OK, UDPGetPacket.create_reply_payload(addresses[0], manifest),
+            packet.request_id
         )
     
-    def handle_sch(self, packet: bytes, src_address: tuple[str, int]) -> bytes:
-        data: UDPSchPacketData = UDPSchPacket.get_data(packet)
+    def handle_swm(self, packet: UDPPacketView, src_address: tuple[str, int]) -> memoryview:
+        data: UDPSwmPacketData = UDPSwmPacket.get_data(packet)
+
+        # Only sharers with the same content as the first pick can be mixed in one download
+        addresses, manifest = self.get_sharers(
+            src_address, data["filename"], max(1, min(data["max_sharers"], Swarm.MAX_PEERS))
+        )
+
+        return self.create_response(
+            src_address, PacketTypes.OK, UDPSwmPacket.create_reply_payload(addresses, manifest),
+            packet.request_id
+        )
 
-        matching_files: list[str] = self.files_handler.get_matching(data["substring"])
+    def handle_sch(self, packet: UDPPacketView, src_address: tuple[str, int]) -> memoryview:
+        data: UDPSchPacketData = UDPSchPacket.get_data(packet)
 
-        return UDPPacketHandling.create_udp_packet(
-            self.server_ip, src_address[0],
-            self.server_port, src_address[1],
-            PacketTypes.OK, ",".join(matching_files).encode("utf-8")
+        return self.create_response(
+            src_address, PacketTypes.PAGE, self.get_result_page(
+                (PacketTypes.SCH, data["substring"]),
+                lambda known: self.registry.search(src_address, data["substring"], known)
+            ), packet.request_id
         )
 
+    def handle_nxt(self, packet: UDPPacketView, src_address: tuple[str, int]) -> memoryview:
+        data: UDPNxtPacketData = UDPNxtPacket.get_data(packet)
+        self.require_user(self.registry.identify(src_address))
 
+        return self.create_response(
+            src_address, PacketTypes.PAGE, self.result_pager.get_page(data["token"], data["index"]),
+            packet.request_id
+        )
 
-        
+    def handle_stats(self, packet: UDPPacketView, src_address: tuple[str, int]) -> memoryview:
+        username, counts = self.registry.get_stats(src_address)
 
+        if self.require_user(username) not in self.admins:
+            raise UserAuthError()
 
-            
-                
\ No newline at end of file
+        # Always fresh, so never cached, but paged like any other long result
+        return self.create_response(
+            src_address, PacketTypes.PAGE,
+            self.result_pager.get_first_page(self.metrics.get_items(self.get_gauges(counts))),
+            packet.request_id
+        )
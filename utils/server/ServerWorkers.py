@@ -0,0 +1,175 @@
+import os
+import sys
+import time
+import signal
+import threading
+import multiprocessing
+import multiprocessing.connection
+from functools import wraps
+from multiprocessing.managers import BaseManager
+
+from utils.server.ServerPacketHandler import ServerPacketHandler
+from utils.server.Registry import Registry
+from utils.server.ServerEngines import ServerEngines
+
+# The registry process serves every worker connection on its own thread, so calls
+# into the shared registry are serialized with one lock. It's re-entrant because the
+# registry calls its own methods. Each request is one small call, so one lock is
+# simpler than trying to be clever.
+_registry_lock = threading.RLock()
+
+def _synchronized(handler_class: type) -> type:
+    def locked(method):
+        @wraps(method)
+        def wrapper(*args, **kwargs):
+            with _registry_lock:
+                return method(*args, **kwargs)
+
+        return wrapper
+
+    methods: dict = {
+        name: locked(getattr(handler_class, name))
+        for name in dir(handler_class)
+        if not name.startswith("_") and callable(getattr(handler_class, name))
+    }
+
+    return type(f"Shared{handler_class.__name__}", (handler_class,), methods)
+
+SharedRegistry = _synchronized(Registry)
+
+class RegistryManager(BaseManager):
+    # Owns the one authoritative copy of the session and file registries. Workers
+    # talk to it through a proxy, so they only ever see method calls, one per request.
+    pass
+
+RegistryManager.register("Registry", SharedRegistry)
+
+class ServerWorkerPool:
+    # How often the pool checks whether it's been told to stop, and how long a worker
+    # has to have been up for it to be restarted when it dies. One that dies sooner
+    # (e.g. it couldn't bind the port) would only die again, so the pool stops instead.
+    MONITOR_INTERVAL = 1.0
+    MIN_UPTIME = 1.0
+
+    # How long workers get to exit once terminated before they're killed
+    STOP_TIMEOUT = 5.0
+
+    def __init__(
+        self, num_workers: int, engine: str, server_ip: str, server_port: int,
+        socket_options: dict = {}, engine_options: dict = {}, handler_options: dict = {},
+        registry_options: dict = {}
+    ) -> None:
+        self.num_workers = num_workers
+        self.engine = engine
+        self.server_ip = server_ip
+        self.server_port = server_port
+        self.socket_options = socket_options
+        self.engine_options = engine_options
+        self.handler_options = handler_options
+        self.registry_options = registry_options
+
+        # Set by SIGTERM, the pool's loop does the actual shutting down
+        self.stopping: threading.Event = threading.Event()
+        self.started_at: dict[int, float] = dict()
+
+    @staticmethod
+    def run_worker(
+        engine: str, server_ip: str, server_port: int,
+        registry: Registry, socket_options: dict, engine_options: dict, handler_options: dict
+    ) -> None:
+        # Restarted workers are forked after the pool set up its own SIGTERM handler,
+        # and need to go back to just exiting on it
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+
+        packet_handler = ServerPacketHandler(registry, server_ip, server_port, **handler_options)
+        server_socket = ServerEngines.create_socket(server_ip, server_port, reuse_port=True, **socket_options)
+        packet_handler.install_stats_signal()
+
+        try:
+            ServerEngines.run(engine, packet_handler, server_socket, **engine_options)
+        except KeyboardInterrupt:
+            pass
+
+    def start_worker(self, context, registry: Registry) -> multiprocessing.Process:
+        worker: multiprocessing.Process = context.Process(
+            target=ServerWorkerPool.run_worker,
+            args=(
+                self.engine, self.server_ip, self.server_port, registry,
+                self.socket_options, self.engine_options, self.handler_options
+            ),
+            daemon=True
+        )
+        worker.start()
+        self.started_at[worker.pid] = time.monotonic()
+
+        return worker
+
+    def stop(self, signum, frame) -> None:
+        self.stopping.set()
+
+    def monitor(self, context, registry: Registry, workers: list[multiprocessing.Process]) -> bool:
+        # Waits on the workers until the pool is told to stop, restarting any that die.
+        # Returns False if one died too soon after starting to be worth restarting.
+        while self.stopping.is_set() != True:
+            multiprocessing.connection.wait(
+                [worker.sentinel for worker in workers], timeout=ServerWorkerPool.MONITOR_INTERVAL
+            )
+
+            for index, worker in enumerate(workers):
+                if worker.is_alive():
+                    continue
+
+                uptime: float = time.monotonic() - self.started_at.pop(worker.pid)
+                if uptime < ServerWorkerPool.MIN_UPTIME:
+                    print(
+                        f"Worker {worker.pid} exited with code {worker.exitcode} right after starting, stopping",
+                        file=sys.stderr
+                    )
+                    return False
+
+                print(f"Worker {worker.pid} exited with code {worker.exitcode}, restarting it", file=sys.stderr)
+                workers[index] = self.start_worker(context, registry)
+
+        return True
+
+    def run(self) -> None:
+        context = multiprocessing.get_context("fork")
+
+        manager = RegistryManager(ctx=context)
+        manager.start()
+
+        registry: Registry = manager.Registry(**self.registry_options)
+
+        workers: list[multiprocessing.Process] = [
+            self.start_worker(context, registry) for _ in range(self.num_workers)
+        ]
+
+        # Stats are kept per worker, so a SIGUSR1 to the pool has each of them dump their own
+        if hasattr(signal, "SIGUSR1"):
+            signal.signal(signal.SIGUSR1, lambda signum, frame: [
+                os.kill(worker.pid, signal.SIGUSR1) for worker in workers if worker.is_alive()
+            ])
+
+        # Without this a SIGTERM would kill just the pool, and leave the workers and the
+        # registry process behind still holding the port
+        signal.signal(signal.SIGTERM, self.stop)
+
+        healthy: bool = True
+        try:
+            healthy = self.monitor(context, registry, workers)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            for worker in workers:
+                worker.terminate()
+
+            for worker in workers:
+                worker.join(ServerWorkerPool.STOP_TIMEOUT)
+                if worker.is_alive():
+                    worker.kill()
+                    worker.join()
+
+            manager.shutdown()
+
+        if healthy != True:
+            exit(1)
@@ -0,0 +1,100 @@
+import random
+from abc import ABC, abstractmethod
+from typing import TypedDict
+
+class SharerCandidate(TypedDict):
+    """Class to define an active sharer the server could send a peer to"""
+
+    username: str
+    address: tuple[str, int]
+    # Uploads in progress + queued, as last reported in a heartbeat, plus
+    # downloads the server has pointed at this sharer since then
+    load: int
+
+class SharerSelectionPolicy(ABC):
+    """
+     An abstract class inherited by all sharer selection policies
+    """
+
+    @abstractmethod
+    def select(self, filename: str, candidates: list[SharerCandidate], count: int = 1) -> list[SharerCandidate]:
+        """
+        A method to pick which sharers a GET should be sent to
+
+        Parameters
+        ----------
+        filename: str
+            the file being requested
+        candidates: list[SharerCandidate]
+            every active sharer of the file, never empty
+        count: int
+            the most sharers to return
+        """
+
+        pass
+
+class FirstActivePolicy(SharerSelectionPolicy):
+    """
+     Always picks the first active sharers found, which is how GET used to work
+    """
+
+    def select(self, filename: str, candidates: list[SharerCandidate], count: int = 1) -> list[SharerCandidate]:
+        return candidates[:count]
+
+class RoundRobinPolicy(SharerSelectionPolicy):
+    """
+     Cycles through a file's sharers, one step per GET
+    """
+
+    def __init__(self) -> None:
+        self.next_index: dict[str, int] = dict()
+
+    def select(self, filename: str, candidates: list[SharerCandidate], count: int = 1) -> list[SharerCandidate]:
+        # Sort so the rotation is stable while the set of sharers stays the same
+        ordered: list[SharerCandidate] = sorted(candidates, key=lambda candidate: candidate["username"])
+        start: int = self.next_index.get(filename, 0) % len(ordered)
+        self.next_index[filename] = start + 1
+
+        return [ordered[(start + i) % len(ordered)] for i in range(min(count, len(ordered)))]
+
+class LeastLoadedPolicy(SharerSelectionPolicy):
+    """
+     Picks the sharers with the lowest load, ties broken at random
+    """
+
+    def select(self, filename: str, candidates: list[SharerCandidate], count: int = 1) -> list[SharerCandidate]:
+        shuffled: list[SharerCandidate] = random.sample(candidates, len(candidates))
+        return sorted(shuffled, key=lambda candidate: candidate["load"])[:count]
+
+class PowerOfTwoChoicesPolicy(SharerSelectionPolicy):
+    """
+     Samples two sharers at random and takes the less loaded one. Nearly as good as
+     least loaded, but doesn't stampede the same sharer when load reports are stale
+    """
+
+    def select(self, filename: str, candidates: list[SharerCandidate], count: int = 1) -> list[SharerCandidate]:
+        remaining: list[SharerCandidate] = list(candidates)
+        selected: list[SharerCandidate] = []
+
+        while remaining and len(selected) < count:
+            choices: list[SharerCandidate] = random.sample(remaining, min(2, len(remaining)))
+            choice: SharerCandidate = min(choices, key=lambda candidate: candidate["load"])
+
+            selected.append(choice)
+            remaining.remove(choice)
+
+        return selected
+
+class SharerSelection:
+    POLICIES: dict[str, type[SharerSelectionPolicy]] = {
+        "first": FirstActivePolicy,
+        "round-robin": RoundRobinPolicy,
+        "least-loaded": LeastLoadedPolicy,
+        "power-of-two": PowerOfTwoChoicesPolicy
+    }
+
+    DEFAULT_POLICY = "power-of-two"
+
+    @staticmethod
+    def create_policy(name: str) -> SharerSelectionPolicy:
+        return SharerSelection.POLICIES[name]()
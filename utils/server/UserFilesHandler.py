@@ -1,58 +1,151 @@
+import itertools
+
 from utils.Exceptions import *
+from utils.server.NgramIndex import NgramIndex
+from utils.networking.UDPHandler import FileManifestData
 
 class UserFilesHandler:
+    # Putting index matches back in catalog order costs more per file than scanning
+    # the whole catalog does, so once the candidates are more than 1/SCAN_RATIO of
+    # it, SCH just scans
+    SCAN_RATIO = 10
+
     def __init__(self) -> None:
-        self.shared_files: dict[str, list[str]] = dict()
-    
-    def add_file(self, username: str, filename: str) -> None | FileAlreadyPublished:    
-        # If file hasn't been shared before, create list for it
-        if self.shared_files.get(filename) == None:
-            self.shared_files[filename] = []
-        
+        # Kept in sync both ways, so lookups by file or by user are both O(1).
+        # Entries are removed as soon as they empty, so churn doesn't leak. The inner
+        # dicts are only used as ordered sets, so sharers come back in publish order.
+        self.shared_files: dict[str, dict[str, None]] = dict()
+        self.user_files: dict[str, dict[str, None]] = dict()
+
+        # Where each filename sits in shared_files, so results that come from the
+        # other structures can still be put in the order the files were published
+        self.catalog_order: dict[str, int] = dict()
+        self.catalog_sequence = itertools.count()
+
+        # Trigram index over the filenames in shared_files, for SCH
+        self.filename_index: NgramIndex = NgramIndex()
+
+        # Manifest summary each sharer published its copy of a file with
+        self.file_manifests: dict[tuple[str, str], FileManifestData] = dict()
+
+        # Bumped on every change, so cached query results know when they're stale
+        self.generation: int = 0
+
+    def get_generation(self) -> int:
+        return self.generation
+
+    def add_file(
+        self, username: str, filename: str, manifest: FileManifestData | None = None
+    ) -> None | FileAlreadyPublished:
         # If user already sharing file, raise exception
         if self.is_sharer(filename, username):
             raise FileAlreadyPublished()
-        
-        self.shared_files[filename].append(username)
 
-    def remove_file(self, username: str, filename: str) -> None | FileNotExistent:
-        if self.shared_files[filename] == None:
-            raise FileNotExistent()
+        self.insert_file(username, filename, manifest)
+        self.generation += 1
+
+    def add_files(self, username: str, files: list[tuple[str, FileManifestData | None]]) -> list[bool]:
+        # A whole batch in one pass, True for each file added and False for each the
+        # user was already sharing. The generation only moves once for all of them.
+        added: list[bool] = []
+        for filename, manifest in files:
+            if self.is_sharer(filename, username):
+                added.append(False)
+                continue
+
+            self.insert_file(username, filename, manifest)
+            added.append(True)
+
+        if any(added):
+            self.generation += 1
+
+        return added
 
+    def insert_file(self, username: str, filename: str, manifest: FileManifestData | None) -> None:
+        if filename not in self.shared_files:
+            self.shared_files[filename] = dict()
+            self.catalog_order[filename] = next(self.catalog_sequence)
+            self.filename_index.add(filename)
+
+        self.shared_files[filename][username] = None
+        self.user_files.setdefault(username, dict())[filename] = None
+        if manifest != None:
+            self.file_manifests[(filename, username)] = manifest
+
+    def remove_file(self, username: str, filename: str) -> None | FileNotExistent:
         if self.is_sharer(filename, username) != True:
             raise FileNotExistent()
-        
-        self.shared_files[filename].remove(username)
+
+        self.delete_file(username, filename)
+        self.generation += 1
+
+    def remove_files(self, username: str, filenames: list[str]) -> list[bool]:
+        # Same as add_files, True for each file removed and False for each the user wasn't sharing
+        removed: list[bool] = []
+        for filename in filenames:
+            if self.is_sharer(filename, username) != True:
+                removed.append(False)
+                continue
+
+            self.delete_file(username, filename)
+            removed.append(True)
+
+        if any(removed):
+            self.generation += 1
+
+        return removed
+
+    def delete_file(self, username: str, filename: str) -> None:
+        sharers: dict[str, None] = self.shared_files[filename]
+        sharers.pop(username, None)
+        if len(sharers) <= 0:
+            del self.shared_files[filename]
+            del self.catalog_order[filename]
+            self.filename_index.remove(filename)
+
+        self.file_manifests.pop((filename, username), None)
+
+        published: dict[str, None] = self.user_files[username]
+        published.pop(filename, None)
+        if len(published) <= 0:
+            del self.user_files[username]
 
     def is_sharer(self, filename: str, username: str) -> bool:
-        if self.shared_files[filename].count(username) <= 0:
-            return False
-        
-        return True
-    
+        return username in self.shared_files.get(filename, ())
+
+    def get_catalog_size(self) -> int:
+        return len(self.shared_files)
+
+    def get_manifest(self, filename: str, username: str) -> FileManifestData | None:
+        return self.file_manifests.get((filename, username))
+
     def get_shared_by(self, username: str) -> list[str]:
-        published_files: list[str] = []
-        for file, sharers in self.shared_files.items():
-            if username in sharers:
-                published_files.append(file)
-        
-
-        return published_files
-    
+        # Catalog order, same as going through shared_files for the user's files would give
+        return sorted(self.user_files.get(username, ()), key=self.catalog_order.__getitem__)
+
     def get_file_sharers(self, filename: str) -> list[str]:
-        if self.shared_files[filename] == None:
-            raise FileNotExistent()
-        
-        if len(self.shared_files[filename]) <= 0:
+        sharers: dict[str, None] | None = self.shared_files.get(filename)
+
+        # Files with no sharers left are removed, so missing means nobody has it
+        if sharers == None:
             raise FileNotExistent()
-        
+
         # Return all sharers
-        return self.shared_files[filename]
-    
+        return list(sharers)
+
     def get_matching(self, substring: str) -> list[str]:
-        matching_files: list[str] = []
-        for filename in self.shared_files.keys():
-            if substring in filename:
-                matching_files.append(filename)
-        
-        return matching_files
\ No newline at end of file
+        candidates: set[str] | None = self.filename_index.get_candidates(
+            substring, len(self.shared_files) // UserFilesHandler.SCAN_RATIO
+        )
+
+        # Queries shorter than a gram (or too common) don't use the index, the scan is
+        # in catalog order already
+        if candidates == None or len(candidates) * UserFilesHandler.SCAN_RATIO > len(self.shared_files):
+            return [filename for filename in self.shared_files.keys() if substring in filename]
+
+        # Having all the grams doesn't guarantee the substring, so check each one. The
+        # candidates are a set, so the matches are put back in catalog order.
+        matching_files: list[str] = [filename for filename in candidates if substring in filename]
+        matching_files.sort(key=self.catalog_order.__getitem__)
+
+        return matching_files
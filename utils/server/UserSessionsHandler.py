@@ -1,6 +1,10 @@
 import time
 import os
+import heapq
+import itertools
 from utils.Exceptions import *
+from utils.Globals import Sessions
+from utils.server.SharerSelection import SharerCandidate
 
 class Authenticate:
     def __init__(self):
@@ -45,93 +49,210 @@ class Authenticate:
 
 class UserSession:
     def __init__(self, username: str, address: tuple[str, int], listening_port: int):
-        self.last_active: time = time.time()
+        # Monotonic time the session expires at, unless it's renewed before then
+        self.deadline: float = time.monotonic() + Sessions.INACTIVE_TIMEOUT
         self.username: str = username
         self.address: str = address
         self.listening_port = listening_port
+
+        # Upload load reported in the peer's last heartbeat, plus how many
+        # downloads we've pointed at it since then
+        self.reported_load: int = 0
+        self.assigned: int = 0
     
-    def renew(self):
+    def renew(self, now: float | None = None):
+        now = time.monotonic() if now == None else now
+
         # HBT was sent after already expired, don't renew
-        if (self.is_active() != True):
+        if self.deadline <= now:
             return
 
-        self.last_active: time = time.time()
+        self.deadline = now + Sessions.INACTIVE_TIMEOUT
     
-    def is_active(self):
-        if time.time() - self.last_active < 3:
-            return True
-        
-        return False
+    def is_active(self, now: float | None = None):
+        return self.deadline > (time.monotonic() if now == None else now)
     
     def get_username(self) -> str:
         return self.username
 
+    def report_load(self, active_uploads: int, queue_depth: int) -> None:
+        self.reported_load = active_uploads + queue_depth
+        self.assigned = 0
+
+    def get_load(self) -> int:
+        return self.reported_load + self.assigned
+
 class UserSessionsHandler:
-    # This is kinda gross, but if timers aren't stored in the sessions handler separately
-    # instead of within the session objects themselves, it becomes a hassle resetting the timer
-    # since it calls a method in this class
+    # Sessions are expired by a min-heap keyed on their deadline. Renewing a session
+    # only moves its deadline, the heap entry is fixed up lazily when it reaches the
+    # top, so there's only ever one entry per session. Expired sessions are removed
+    # under both their username and address keys, and active_users is kept up to date
+    # as sessions come and go, so LAP never has to look at expired sessions.
     def __init__(self):
         self.user_sessions: dict[str | tuple[str, int], UserSession] = dict()
+        self.active_users: dict[str, None] = dict()
+        self.expiry_heap: list[tuple[float, int, str, UserSession]] = []
+
+        # Tie breaker so the heap never has to compare sessions
+        self.expiry_sequence = itertools.count()
+
+        # Bumped whenever the set of active users changes. Renewals don't change
+        # anything a query can see, so they don't count.
+        self.generation: int = 0
         self.authenticator: Authenticate = Authenticate()
 
     def generate_session(self, username: str, password: str, port: int, user_address: tuple[str, int]) -> None | UserAuthError:
         if self.authenticator.isValidLogin(username, password) != True:
             raise UserAuthError()
 
+        self.remove_expired_sessions()
+
         if self.user_sessions.__contains__(username):
-            if self.user_sessions[username].is_active():
-                raise UserAuthError()
+            raise UserAuthError()
+
+        # A new login from an address another user was on replaces that session
+        previous: UserSession | None = self.user_sessions.get(user_address)
+        if previous != None:
+            self.remove_session(previous.get_username())
         
         new_session: UserSession = UserSession(username, user_address, port)
         self.user_sessions[username] = new_session
         self.user_sessions[user_address] = new_session
+        self.active_users[username] = None
+        self.generation += 1
+        heapq.heappush(
+            self.expiry_heap, (new_session.deadline, next(self.expiry_sequence), username, new_session)
+        )
+
+    def renew_session(self, username: str, active_uploads: int = 0, queue_depth: int = 0):
+        self.remove_expired_sessions()
 
-    def renew_session(self, username: str):
-        # If HBT sent but session doesn't exist for some reason, don't attempt renew
-        if self.user_sessions[username] == None:
+        # If HBT sent but session doesn't exist (e.g. already expired), don't attempt renew
+        session: UserSession | None = self.user_sessions.get(username)
+        if session == None:
             return
         
-        self.user_sessions[username].renew()
+        session.renew()
+        session.report_load(active_uploads, queue_depth)
 
     def remove_session(self, username: str):
-        self.user_sessions.pop(username, None)
+        session: UserSession | None = self.user_sessions.pop(username, None)
+        if session == None:
+            return
+
+        # Sessions are stored under the address too, only drop that if it's still ours
+        if self.user_sessions.get(session.address) is session:
+            self.user_sessions.pop(session.address)
+
+        # Its heap entry is left behind and skipped when it comes up
+        self.active_users.pop(username, None)
+        self.generation += 1
+
+    def remove_expired_sessions(self, now: float | None = None) -> None:
+        now = time.monotonic() if now == None else now
+
+        heap: list[tuple[float, int, str, UserSession]] = self.expiry_heap
+        while heap and heap[0][0] <= now:
+            _, _, username, session = heapq.heappop(heap)
+
+            # Session was removed or replaced already
+            if self.user_sessions.get(username) is not session:
+                continue
+
+            # Renewed since this entry was pushed, put it back with its new deadline
+            if session.deadline > now:
+                heapq.heappush(heap, (session.deadline, next(self.expiry_sequence), username, session))
+                continue
+
+            self.remove_session(username)
+
+    def get_generation(self) -> int:
+        self.remove_expired_sessions()
+
+        return self.generation
 
     def is_active_user(self, src_address: tuple[str, int]) -> bool:
-        username = self.get_user_from_addr(src_address)
+        self.remove_expired_sessions()
 
-        if username == None:
-            return False
-        
-        if (
-            self.user_sessions[username] == None or
-            self.user_sessions[username].is_active() != True
-        ):
-            return False
-        
-        return True
+        # Anything still in the table is active, expired sessions have been removed
+        return src_address in self.user_sessions
     
+    def get_active_user(self, src_address: tuple[str, int], renew: bool = False) -> str | None:
+        # is_active_user and get_user_from_addr in one call, which matters when
+        # every call is a round trip to the shared registry. With renew, the request
+        # counts as a sign of life too, the same as a heartbeat would.
+        self.remove_expired_sessions()
+
+        session: UserSession | None = self.user_sessions.get(src_address)
+        if session == None:
+            return None
+
+        if renew:
+            session.renew()
+
+        return session.get_username()
+
+    def renew_from_address(
+        self, src_address: tuple[str, int], active_uploads: int = 0, queue_depth: int = 0
+    ) -> str | None:
+        # The heartbeat fast path, one lookup by the address it came from. There's no
+        # expiry sweep, an expired session that's still in the table can't renew
+        # itself, and housekeeping (or the next request) will clear it out.
+        session: UserSession | None = self.user_sessions.get(src_address)
+        if session == None or session.is_active() != True:
+            return None
+
+        session.renew()
+        session.report_load(active_uploads, queue_depth)
+
+        return session.get_username()
+
     def get_user_from_addr(self, addr: tuple[str, int]) -> str | None:
-        if self.user_sessions.get(addr) == None:
+        session: UserSession | None = self.user_sessions.get(addr)
+        if session == None:
             return None
         
-        return self.user_sessions[addr].get_username()
+        return session.get_username()
     
     def get_active_users(self) -> list[str]:
-        active_users: list[str] = []
-        for session in set(self.user_sessions.values()):
-            if session.is_active():
-                active_users.append(session.get_username())
+        self.remove_expired_sessions()
 
-        return active_users
+        return list(self.active_users)
     
+    def get_session_count(self) -> int:
+        self.remove_expired_sessions()
+
+        return len(self.active_users)
+
     def get_listening_address(self, username: str) -> None | int:
-        if (
-            self.user_sessions[username] == None or
-            self.user_sessions[username].is_active() != True
-        ):
+        self.remove_expired_sessions()
+
+        # Expired sessions get cleaned up, so the sharer may not have one at all
+        session: UserSession | None = self.user_sessions.get(username)
+        if session == None:
             return None
 
-        return (
-            self.user_sessions[username].address[0],
-            self.user_sessions[username].listening_port
-        )
\ No newline at end of file
+        return (session.address[0], session.listening_port)
+
+    def get_sharer_candidates(self, usernames: list[str]) -> list[SharerCandidate]:
+        self.remove_expired_sessions()
+
+        candidates: list[SharerCandidate] = []
+        for username in usernames:
+            session: UserSession | None = self.user_sessions.get(username)
+            if session == None:
+                continue
+
+            candidates.append(SharerCandidate(
+                username=username,
+                address=(session.address[0], session.listening_port),
+                load=session.get_load()
+            ))
+
+        return candidates
+
+    def record_assignment(self, username: str) -> None:
+        # Counts towards the sharer's load until its next heartbeat reports the real figure
+        session: UserSession | None = self.user_sessions.get(username)
+        if session != None:
+            session.assigned += 1